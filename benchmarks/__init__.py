@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+"""
+Throughput benchmarks for v2srt that need no API key and cost nothing.
+
+`mock_server` is a local stand-in for an OpenAI-compatible
+chat-completions endpoint with configurable latency, 429/5xx injection
+and deliberately broken replies; `run` drives the real V2SrtProcessor
+against it over a grid of batch sizes and concurrency levels:
+
+    python -m benchmarks.run --sizes 500 2000 --batch-sizes 5 10 20 --concurrency 4 16
+"""
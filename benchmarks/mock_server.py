@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+"""
+A local stand-in for an OpenAI-compatible chat-completions endpoint.
+
+It understands the prompts v2srt sends (separator-joined subtitles, or a
+JSON object of subtitles keyed by id) and answers with pseudo-Chinese
+"translations" of the same shape, reporting token `usage` like a real
+provider. Latency follows a log-normal distribution, and a configurable
+share of requests is answered with a 429, a 5xx, a malformed reply (a
+lost separator or id) or a reply that leaves subtitles untranslated.
+Requests with `stream: true` are answered as server-sent events, a few
+characters per event; tokens the client hung up before receiving are
+not billed.
+
+Every decision is derived from a hash of the seed, the prompt and how
+often that prompt was seen, so a run injects the same faults into the
+same requests no matter in which order concurrent requests arrive.
+
+Run standalone with `python -m benchmarks.mock_server --port 8000`.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.batching import estimate_tokens
+from src.config import Config
+
+
+class FaultProfile:
+    """Latency and fault-injection settings of a MockServer."""
+    def __init__(self, latency_ms=300.0, latency_sigma=0.4, ms_per_output_token=0.0, rate_429=0.0, rate_5xx=0.0,
+                 malformed_rate=0.0, wrong_language_rate=0.0, retry_after=0.5, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.ms_per_output_token = ms_per_output_token
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.malformed_rate = malformed_rate
+        self.wrong_language_rate = wrong_language_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def pseudo_translate(text):
+    """Maps each word to a Han character, so the output passes as Chinese and keeps its line breaks."""
+    lines = []
+    for line in text.split('\n'):
+        chars = [chr(0x4E00 + int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=2).digest(), 'big') % 0x4000)
+                 for word in line.split()]
+        lines.append(''.join(chars) or line)
+    return '\n'.join(lines)
+
+
+def _separator_source(prompt, separator):
+    """The separator-joined subtitles: the last section of either prompt strategy."""
+    cut = max(prompt.rfind(':\n'), prompt.rfind('\n\n'))
+    body = prompt[cut + 2:].rstrip('\n')
+    return [part.strip() for part in body.split(f" {separator} ")]
+
+
+class MockServer:
+    """
+    A threaded chat-completions server on 127.0.0.1. `stats` counts
+    replies by kind and the tokens billed for each; call `reset` between
+    benchmark runs.
+    """
+    def __init__(self, profile, port=0, separator=Config.DEFAULT_SEPARATOR):
+        self.profile = profile
+        self.separator = separator
+        self._seen = {}
+        self._lock = threading.Lock()
+        self.stats = None
+        self.reset()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def reset(self):
+        with self._lock:
+            self._seen = {}
+            self.stats = {'requests': 0, 'ok': 0, '429': 0, '5xx': 0, 'malformed': 0, 'wrong_language': 0,
+                          'prompt_tokens': 0, 'completion_tokens': 0, 'wasted_tokens': 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serves in the calling thread until interrupted."""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _rng_for(self, prompt):
+        """A random generator seeded by the prompt and how many times it has been sent before."""
+        with self._lock:
+            seen = self._seen.get(prompt, 0)
+            self._seen[prompt] = seen + 1
+        digest = hashlib.blake2b(f"{self.profile.seed}\0{seen}\0{prompt}".encode('utf-8'), digest_size=8).digest()
+        return random.Random(int.from_bytes(digest, 'big'))
+
+    def respond(self, payload):
+        """Returns (status, headers, body_dict, latency_seconds, kind) for one request payload."""
+        profile = self.profile
+        prompt = payload['messages'][-1]['content']
+        rng = self._rng_for(prompt)
+        latency = profile.latency_ms / 1000.0 * math.exp(rng.gauss(0, profile.latency_sigma))
+        roll = rng.random()
+        if roll < profile.rate_429:
+            return self._count('429', 429, {'Retry-After': str(profile.retry_after)}, {'error': {'message': 'Rate limit exceeded'}}, latency / 10)
+        if roll < profile.rate_429 + profile.rate_5xx:
+            return self._count('5xx', 503, {}, {'error': {'message': 'Service unavailable'}}, latency)
+
+        kind = 'ok'
+        roll = rng.random()
+        if roll < profile.malformed_rate:
+            kind = 'malformed'
+        elif roll < profile.malformed_rate + profile.wrong_language_rate:
+            kind = 'wrong_language'
+        content = self._reply_content(prompt, kind, rng)
+        usage = {'prompt_tokens': estimate_tokens(prompt), 'completion_tokens': estimate_tokens(content)}
+        latency += profile.ms_per_output_token * usage['completion_tokens'] / 1000.0
+        body = {'choices': [{'message': {'role': 'assistant', 'content': content}}], 'usage': usage}
+        return self._count(kind, 200, {}, body, latency, usage)
+
+    def _count(self, kind, status, headers, body, latency, usage=None):
+        """Counts a reply; returns (status, headers, body, latency, kind) for the handler."""
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats[kind] += 1
+            if usage:
+                billed = usage['prompt_tokens'] + usage['completion_tokens']
+                self.stats['prompt_tokens'] += usage['prompt_tokens']
+                self.stats['completion_tokens'] += usage['completion_tokens']
+                if kind != 'ok':
+                    self.stats['wasted_tokens'] += billed
+        return status, headers, body, latency, kind
+
+    def refund(self, kind, completion_tokens):
+        """Takes back completion tokens a streaming client hung up before receiving."""
+        with self._lock:
+            self.stats['completion_tokens'] -= completion_tokens
+            if kind != 'ok':
+                self.stats['wasted_tokens'] -= completion_tokens
+
+    def _reply_content(self, prompt, kind, rng):
+        is_json = '"translations"' in prompt
+        if is_json:
+            source = json.loads(prompt[prompt.rindex('\n{'):])
+            keys, texts = list(source), list(source.values())
+        else:
+            texts = _separator_source(prompt, self.separator)
+        translated = [pseudo_translate(text) for text in texts]
+        if kind == 'wrong_language':
+            # About half of the subtitles (at least one) come back untranslated.
+            untranslated = [i for i in range(len(texts)) if rng.random() < 0.5] or [rng.randrange(len(texts))]
+            for i in untranslated:
+                translated[i] = texts[i]
+        if is_json:
+            result = dict(zip(keys, translated))
+            if kind == 'malformed' and len(result) > 1:
+                del result[rng.choice(keys)]
+            return json.dumps({'translations': result}, ensure_ascii=False)
+        if kind == 'malformed' and len(translated) > 1:
+            # Two subtitles merged into one or one split in two, as models tend to do.
+            i = rng.randrange(len(translated) - 1)
+            if rng.random() < 0.5:
+                translated[i:i + 2] = [translated[i] + ' ' + translated[i + 1]]
+            else:
+                half = len(translated[i]) // 2
+                translated[i:i + 1] = [translated[i][:half], translated[i][half:]]
+        return f" {self.separator} ".join(translated)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                status, headers, body, latency, kind = server.respond(payload)
+                if status == 200 and payload.get('stream'):
+                    self._stream(payload, body, latency, kind)
+                    return
+                time.sleep(latency)
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_event(self, event):
+                self._send_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+            def _stream(self, payload, body, latency, kind):
+                """Sends the reply as chat.completion.chunk events; generation time is spread over them."""
+                content, usage = body['choices'][0]['message']['content'], body['usage']
+                generation = server.profile.ms_per_output_token * usage['completion_tokens'] / 1000.0
+                time.sleep(latency - generation)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+                sent = 0
+                try:
+                    for piece in pieces:
+                        time.sleep(generation * len(piece) / max(1, len(content)))
+                        self._send_event({'choices': [{'index': 0, 'delta': {'content': piece}}]})
+                        sent += len(piece)
+                    if (payload.get('stream_options') or {}).get('include_usage'):
+                        self._send_event({'choices': [], 'usage': usage})
+                    self._send_chunk(b"data: [DONE]\n\n")
+                    self._send_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    server.refund(kind, usage['completion_tokens'] - estimate_tokens(content[:sent]))
+                    self.close_connection = True
+
+        return Handler
+
+
+def add_profile_arguments(parser):
+    """Adds the FaultProfile options to an argument parser."""
+    group = parser.add_argument_group("Mock server")
+    group.add_argument('--latency-ms', type=float, default=300.0, metavar="<ms>", help="Median response latency. Default: 300")
+    group.add_argument('--latency-sigma', type=float, default=0.4, metavar="<x>", help="Log-normal spread of the latency (0 = constant). Default: 0.4")
+    group.add_argument('--ms-per-output-token', type=float, default=0.0, metavar="<ms>", help="Extra latency per completion token. Default: 0")
+    group.add_argument('--rate-429', type=float, default=0.0, metavar="<p>", help="Share of requests answered with 429. Default: 0")
+    group.add_argument('--rate-5xx', type=float, default=0.0, metavar="<p>", help="Share of requests answered with 503. Default: 0")
+    group.add_argument('--malformed-rate', type=float, default=0.0, metavar="<p>", help="Share of replies with a lost separator or JSON id. Default: 0")
+    group.add_argument('--wrong-language-rate', type=float, default=0.0, metavar="<p>", help="Share of replies leaving about half the subtitles untranslated. Default: 0")
+    group.add_argument('--retry-after', type=float, default=0.5, metavar="<sec>", help="Retry-After sent with 429 replies. Default: 0.5")
+    group.add_argument('--seed', type=int, default=0, help="Seed for latencies and injected faults. Default: 0")
+
+
+def profile_from_args(args):
+    return FaultProfile(args.latency_ms, args.latency_sigma, args.ms_per_output_token, args.rate_429, args.rate_5xx,
+                        args.malformed_rate, args.wrong_language_rate, args.retry_after, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock chat-completions server for v2srt benchmarks.")
+    parser.add_argument('--port', type=int, default=8000, help="Port to listen on. Default: 8000")
+    parser.add_argument('-s', '--separator', type=str, default=Config.DEFAULT_SEPARATOR, help="Separator the client uses.")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    server = MockServer(profile_from_args(args), args.port, args.separator)
+    print(f"Mock chat-completions server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs the real V2SrtProcessor against the local mock server over a grid of
+file sizes, batch sizes and concurrency levels, and reports per cell:
+subtitles per second, p50/p99 batch latency, retries by cause and the
+tokens billed for replies that had to be thrown away.
+
+Results can be saved with --json-out and compared with a previous run
+via --baseline, so a change to the translation hot path can be measured
+against the code before it.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from src.cli import setup_arg_parser
+from src.main import V2SrtProcessor
+from src.srt_handler import Cue
+from src.utils import cprint, Colors
+
+from .mock_server import MockServer, add_profile_arguments, profile_from_args
+
+_WORDS = ("the time we have left is not enough to finish what they started here so listen carefully "
+          "before anyone else comes back tonight because nothing about this place makes sense anymore "
+          "and you know it as well as I do").split()
+
+
+def write_synthetic_srt(path, count, seed=0):
+    """Writes `count` English cues of 4-14 words, two seconds apart with an occasional scene gap."""
+    rng = random.Random(seed)
+    start_ms = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for index in range(1, count + 1):
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(4, 14))]
+            words[0] = words[0].capitalize()
+            words[-1] += rng.choice(".?!")
+            if len(words) > 9:
+                # Long cues are split over two lines, as subtitle editors do.
+                half = len(words) // 2
+                text = " ".join(words[:half]) + "\n" + " ".join(words[half:])
+            else:
+                text = " ".join(words)
+            cue = Cue(index, start_ms, start_ms + 1800, text)
+            f.write(f"{index}\n{cue.timestamp}\n{text}\n\n")
+            start_ms += 2000 + (5000 if rng.random() < 0.05 else 0)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def run_cell(server, srt_path, workdir, batch_size, concurrency, options):
+    """Translates `srt_path` once with the given settings and returns the cell's results."""
+    server.reset()
+    metrics_path = workdir / f"metrics-{srt_path.stem}-b{batch_size}-c{concurrency}"
+    argv = ['-i', str(srt_path), '-il', 'en', '-ol', 'zh-cn', '-od', str(workdir / 'out'),
+            '--api-url', server.url, '-k', 'benchmark', '--no-cache', '--no-transcript-cache',
+            '-b', str(batch_size), '-c', str(concurrency), '-e', options.engine,
+            '--response-format', options.response_format, '--prompt-strategy', options.prompt_strategy,
+            '--metrics-out', str(metrics_path)] + options.extra_args
+    args = setup_arg_parser().parse_args(argv)
+
+    started = time.monotonic()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        V2SrtProcessor(args).run()
+    elapsed = time.monotonic() - started
+
+    batches, run_end = [], {}
+    with open(metrics_path.with_suffix('.jsonl'), encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['event'] == 'batch':
+                batches.append(record)
+            elif record['event'] == 'run_end':
+                run_end = record
+    durations = [batch['duration'] for batch in batches] or [0.0]
+    return {
+        'subtitles': run_end.get('subtitles', 0),
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'cues_per_sec': round(run_end.get('subtitles', 0) / elapsed, 2) if elapsed else 0.0,
+        'p50': round(percentile(durations, 0.50), 4),
+        'p99': round(percentile(durations, 0.99), 4),
+        'requests': server.stats['requests'],
+        'retries': run_end.get('retries', {}),
+        'tokens': server.stats['prompt_tokens'] + server.stats['completion_tokens'],
+        'wasted_tokens': server.stats['wasted_tokens'],
+        'unvalidated_batches': run_end.get('unvalidated_batches', 0),
+        'failed_batches': run_end.get('failed_batches', 0),
+        'stream_aborts': run_end.get('stream_aborts', 0),
+    }
+
+
+def _cell_key(result):
+    return (result['subtitles'], result['batch_size'], result['concurrency'])
+
+
+def print_header():
+    cprint(Colors.BOLD, f"{'cues':>6} {'batch':>5} {'conc':>4} {'cues/s':>9} {'p50 s':>7} {'p99 s':>7} {'reqs':>6} "
+                        f"{'net':>4} {'429':>4} {'sep':>4} {'lang':>4} {'tokens':>9} {'wasted':>8} {'fail':>4}")
+
+
+def print_row(result, before=None):
+    """Prints one cell, with the change against the same cell of a baseline run when one is given."""
+    retries = result['retries']
+    row = (f"{result['subtitles']:>6} {result['batch_size']:>5} {result['concurrency']:>4} {result['cues_per_sec']:>9.1f} "
+           f"{result['p50']:>7.3f} {result['p99']:>7.3f} {result['requests']:>6} {retries.get('network', 0):>4} "
+           f"{retries.get('rate_limit', 0):>4} {retries.get('separator', 0):>4} {retries.get('language', 0):>4} "
+           f"{result['tokens']:>9,} {result['wasted_tokens']:>8,} {result['failed_batches']:>4}")
+    if before and before['cues_per_sec']:
+        change = result['cues_per_sec'] / before['cues_per_sec'] - 1
+        color = Colors.OKGREEN if change >= 0 else Colors.FAIL
+        cprint(color, f"{row}  {change:+.1%} cues/s, p99 {before['p99']:.3f} -> {result['p99']:.3f}")
+    else:
+        cprint(Colors.INFO, row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks v2srt translation throughput against a local mock API.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500], metavar="<N>", help="Synthetic SRT sizes in subtitles. Default: 500")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[5, 10, 20], metavar="<N>", help="Values of -b to try. Default: 5 10 20")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16], metavar="<N>", help="Values of -c to try. Default: 4 16")
+    parser.add_argument('-e', '--engine', type=str, default='thread', choices=['thread', 'async'], help="Concurrency engine. Default: thread")
+    parser.add_argument('--response-format', type=str, default='separator', choices=['separator', 'json'], help="Default: separator")
+    parser.add_argument('--prompt-strategy', type=str, default='template', choices=['compact', 'template'], help="Default: template")
+    parser.add_argument('--json-out', type=Path, metavar="<file>", help="Save the results (and the mock settings) as JSON.")
+    parser.add_argument('--baseline', type=Path, metavar="<file>", help="A previous --json-out file to compare against.")
+    parser.add_argument('--keep', type=Path, metavar="<dir>", help="Keep the synthetic inputs, outputs and metrics in this directory.")
+    parser.add_argument('extra_args', nargs=argparse.REMAINDER, help="Further v2srt options after '--', passed to every run.")
+    add_profile_arguments(parser)
+    options = parser.parse_args()
+    options.extra_args = [arg for arg in options.extra_args if arg != '--']
+
+    baseline = {}
+    if options.baseline:
+        with open(options.baseline, encoding='utf-8') as f:
+            baseline = {_cell_key(result): result for result in json.load(f)['results']}
+
+    server = MockServer(profile_from_args(options)).start()
+    with contextlib.ExitStack() as stack:
+        if options.keep:
+            workdir = options.keep
+            workdir.mkdir(parents=True, exist_ok=True)
+        else:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='v2srt-bench-')))
+        cprint(Colors.INFO, f"Mock server at {server.url}; {len(options.sizes) * len(options.batch_sizes) * len(options.concurrency)} run(s).")
+        print_header()
+        results = []
+        for size in options.sizes:
+            srt_path = workdir / f"synthetic-{size}.srt"
+            write_synthetic_srt(srt_path, size, options.seed)
+            for batch_size, concurrency in itertools.product(options.batch_sizes, options.concurrency):
+                results.append(run_cell(server, srt_path, workdir, batch_size, concurrency, options))
+                print_row(results[-1], baseline.get(_cell_key(results[-1])))
+    server.stop()
+
+    if options.json_out:
+        report = {'profile': server.profile.as_dict(), 'engine': options.engine, 'response_format': options.response_format,
+                  'prompt_strategy': options.prompt_strategy, 'results': results}
+        with open(options.json_out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        cprint(Colors.OKGREEN, f"Results saved to '{options.json_out}'.")
+
+
+if __name__ == '__main__':
+    main()
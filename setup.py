@@ -10,7 +10,7 @@ with open("requirements.txt", "r", encoding="utf-8") as f:
 
 setuptools.setup(
     name="v2srt",
-    version="2.3.0",
+    version="2.5.0",
     author="abysmli", 
     author_email="abysmli@gmail.com", 
     description="AI-Powered Subtitle Transcription and Translation Tool",
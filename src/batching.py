@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+Plans how subtitle cues are grouped into translation batches.
+
+'fixed' batching cuts every --batch-size cues. 'adaptive' batching packs
+cues by estimated token count instead, and prefers to end a batch at a
+scene change (a long pause between cues) so each request carries
+self-contained context.
+"""
+
+# Code points from here up (CJK, Kana, Hangul, ...) cost roughly one token each.
+_WIDE_SCRIPT_START = 0x2E80
+
+# Prompt overhead per cue (separator, line break) in tokens.
+_PER_CUE_OVERHEAD = 2
+
+
+def estimate_tokens(text):
+    """
+    A cheap token estimate that needs no tokenizer: ~1 token per CJK/Kana/
+    Hangul character and ~1 token per 4 characters of other scripts.
+    """
+    wide = sum(1 for ch in text if ord(ch) >= _WIDE_SCRIPT_START)
+    return wide + (len(text) - wide + 3) // 4 + _PER_CUE_OVERHEAD
+
+
+def fixed_batches(positions, batch_size):
+    """Splits positions into consecutive groups of `batch_size`."""
+    return [positions[i:i + batch_size] for i in range(0, len(positions), batch_size)]
+
+
+def adaptive_batches(cues, positions, max_input_tokens, max_output_tokens, output_ratio,
+                     min_cues, max_cues, scene_gap_ms):
+    """
+    Greedily packs the cues at `positions` into batches whose estimated
+    input and output tokens stay within budget, holding between `min_cues`
+    and `max_cues` cues (a single oversized cue still gets its own batch).
+
+    When a batch fills up, it is cut at the longest pause of at least
+    `scene_gap_ms` in its second half, if there is one, and the cues after
+    the pause carry over to the next batch.
+    """
+    batches = []
+    current, current_tokens = [], []
+    total = 0
+
+    def fits(tokens):
+        new_total = total + tokens
+        return new_total <= max_input_tokens and new_total * output_ratio <= max_output_tokens
+
+    for pos in positions:
+        tokens = estimate_tokens(cues[pos].text)
+        while current and (len(current) >= max_cues or (len(current) >= min_cues and not fits(tokens))):
+            cut = _scene_cut(cues, current, min_cues, scene_gap_ms)
+            batches.append(current[:cut])
+            current, current_tokens = current[cut:], current_tokens[cut:]
+            total = sum(current_tokens)
+        current.append(pos)
+        current_tokens.append(tokens)
+        total += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _scene_cut(cues, batch, min_cues, scene_gap_ms):
+    """
+    Returns how many cues of a full `batch` to keep: up to the longest pause
+    in its second half if that pause is a scene change, else all of them.
+    """
+    if not scene_gap_ms:
+        return len(batch)
+    best_cut, best_gap = len(batch), scene_gap_ms - 1
+    for i in range(max(min_cues, len(batch) // 2), len(batch)):
+        # The pause is before the cue itself; cues between batch members
+        # (cached or repeated ones) still play in it.
+        gap = cues[batch[i]].start_ms - cues[batch[i] - 1].end_ms
+        if gap > best_gap:
+            best_cut, best_gap = i, gap
+    return best_cut
+
+
+def plan_batches(cues, positions, args):
+    """Groups the cue positions to translate according to the --batching options."""
+    if args.batching == 'adaptive':
+        return adaptive_batches(
+            cues, positions,
+            max_input_tokens=args.max_batch_tokens,
+            max_output_tokens=args.max_output_tokens,
+            output_ratio=args.output_token_ratio,
+            min_cues=max(1, args.min_batch_cues),
+            max_cues=max(args.min_batch_cues, args.max_batch_cues),
+            scene_gap_ms=int(args.scene_gap * 1000),
+        )
+    return fixed_batches(positions, args.batch_size)
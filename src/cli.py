@@ -8,6 +8,7 @@ import argparse
 import os
 from pathlib import Path
 from .config import Config
+from .prompts import PROMPT_STRATEGIES
 from .utils import Colors
 
 def setup_arg_parser():
@@ -22,9 +23,19 @@ def setup_arg_parser():
   {Colors.INFO}# Translate a Japanese SRT file to Chinese using the default AI model{Colors.ENDC}
   python -m src.main -i subtitles.srt -il ja -ol zh-cn
 
+  {Colors.INFO}# Translate every SRT file of a season through one shared pool{Colors.ENDC}
+  python -m src.main -i season1/ -ol en -od season1_en/ -c 20
+
+  {Colors.INFO}# Transcribe a video once and translate it into three languages{Colors.ENDC}
+  python -m src.main -v video.mp4 -ol zh-cn en ko
+
   {Colors.INFO}# Transcribe a video and translate using a specific model and 10 parallel threads{Colors.ENDC}
   python -m src.main -v video.mp4 -ol en -m 'some-other-model' -c 10
 
+  {Colors.INFO}# Run as a service and submit jobs over HTTP{Colors.ENDC}
+  python -m src.main --serve --listen 127.0.0.1:8765 -c 20 --whisper-backend python
+  curl -d '{{"input": "/media/ep1.srt", "output_lang": ["en"]}}' http://127.0.0.1:8765/jobs
+
   {Colors.INFO}# Connect to a different, OpenAI-compatible LLM service{Colors.ENDC}
   python -m src.main -v video.mp4 -ol de --api-url "https://api.openai.com/v1/chat/completions" --api-key "YOUR_OPENAI_KEY" -m "gpt-4"
 """
@@ -32,27 +43,75 @@ def setup_arg_parser():
     io_group = parser.add_argument_group(f"{Colors.BOLD}Input/Output{Colors.ENDC}")
     lang_group = parser.add_argument_group(f"{Colors.BOLD}Language & AI Model{Colors.ENDC}")
     api_group = parser.add_argument_group(f"{Colors.BOLD}API & Performance{Colors.ENDC}")
+    cache_group = parser.add_argument_group(f"{Colors.BOLD}Translation Memory{Colors.ENDC}")
+    transcript_group = parser.add_argument_group(f"{Colors.BOLD}Transcript Cache{Colors.ENDC}")
+    service_group = parser.add_argument_group(f"{Colors.BOLD}Service Mode{Colors.ENDC}")
     misc_group = parser.add_argument_group(f"{Colors.BOLD}Miscellaneous{Colors.ENDC}")
 
     input_group = io_group.add_mutually_exclusive_group(required=True)
-    input_group.add_argument('-i', '--input-srt', type=Path, metavar="<file>", help="Path to an existing SRT file to translate.")
+    input_group.add_argument('-i', '--input-srt', type=Path, nargs='+', metavar="<file>", help="SRT file(s) to translate. Directories (their *.srt files) and glob patterns\nare accepted; all files share one worker pool.")
     input_group.add_argument('-v', '--input-video', type=Path, metavar="<file>", help="Path to a video file to transcribe and then translate.")
     input_group.add_argument('-a', '--input-audio', type=Path, metavar="<file>", help="Path to an audio file to transcribe and then translate.")
+    input_group.add_argument('--serve', action='store_true', help="Run as a service taking jobs over a local HTTP API (see Service Mode).")
     io_group.add_argument('-o', '--output-srt', type=Path, metavar="<file>", help="Path to save the generated (untranslated) SRT file from transcription.")
-    io_group.add_argument('-ot', '--output-translated', type=Path, metavar="<file>", help="Path to save the final translated SRT file.")
+    io_group.add_argument('-ot', '--output-translated', type=Path, metavar="<file>", help="Path to save the final translated SRT file (single input only).")
+    io_group.add_argument('-od', '--output-dir', type=Path, metavar="<dir>", help="Directory for translated SRT files. Default: next to each source file.")
+    io_group.add_argument('-p', '--pipeline', action='store_true', help="With -v/-a, translate segments while Whisper is still transcribing instead\nof waiting for the finished SRT (not journaled, so --resume does not apply).")
+    io_group.add_argument('-r', '--resume', action='store_true', help="Resume an interrupted job from the journal next to the translated output,\nonly translating batches that did not complete. Stale journals are ignored.")
 
     lang_group.add_argument('-il', '--input-lang', type=str, default=Config.DEFAULT_INPUT_LANG, metavar="<code>", help=f"Input language code (e.g., 'en', 'ja'). Default: {Config.DEFAULT_INPUT_LANG}")
-    lang_group.add_argument('-ol', '--output-lang', type=str, default=Config.DEFAULT_OUTPUT_LANG, metavar="<code>", help=f"Output language code (e.g., 'en', 'zh-cn'). Default: {Config.DEFAULT_OUTPUT_LANG}")
+    lang_group.add_argument('-ol', '--output-lang', type=str, nargs='+', default=[Config.DEFAULT_OUTPUT_LANG], metavar="<code>", help=f"Output language code(s) (e.g., 'en', 'zh-cn', or 'zh-cn en ko'). With several targets\nthe source is parsed/transcribed once and each output is named '<name>.<code>.srt'.\nDefault: {Config.DEFAULT_OUTPUT_LANG}")
     lang_group.add_argument('-m', '--model', type=str, default=Config.DEFAULT_MODEL, metavar="<name>", help=f"The AI model to use for translation. Default: {Config.DEFAULT_MODEL}")
     lang_group.add_argument('-wm', '--whisper-model', type=str, default=Config.DEFAULT_WHISPER_MODEL, choices=['tiny', 'base', 'small', 'medium', 'large', 'large-v2', 'large-v3'], help=f"Whisper model for transcription. Default: {Config.DEFAULT_WHISPER_MODEL}")
+    lang_group.add_argument('--whisper-backend', type=str, default=Config.DEFAULT_WHISPER_BACKEND, choices=['cli', 'python'], help=f"'cli' runs the whisper command; 'python' runs Whisper in-process (openai-whisper\npackage) and loads each model only once per process. Default: {Config.DEFAULT_WHISPER_BACKEND}")
+    lang_group.add_argument('-ww', '--whisper-workers', type=int, default=Config.DEFAULT_WHISPER_WORKERS, metavar="<N>", help=f"Transcribe media as up to N chunks cut at silences, in parallel Whisper\nprocesses, then merge them (needs ffmpeg/ffprobe; not used with --pipeline).\nDefault: {Config.DEFAULT_WHISPER_WORKERS}")
 
     api_group.add_argument('--api-url', type=str, default=Config.DEFAULT_API_URL, metavar="<url>", help="The API endpoint for the translation service.")
     api_group.add_argument('-k', '--api-key', type=str, default=os.getenv('LLM_API_KEY'), metavar="<key>", help="Your translation service API key. Defaults to LLM_API_KEY env var.")
+    api_group.add_argument('--endpoints', type=str, metavar="<file>", help="JSON list of endpoints to spread requests over instead of --api-url, each an\nobject with 'url' and optionally 'name', 'key' or 'key_env', 'model', 'weight',\n'rpm' and 'tpm'. Requests are routed by weight, latency and error rate.")
+    api_group.add_argument('--eject-seconds', type=float, default=Config.DEFAULT_EJECT_SECONDS, metavar="<sec>", help=f"An endpoint failing 3 requests in a row is left out this long (doubling while it\nkeeps failing, up to 5 minutes). Default: {Config.DEFAULT_EJECT_SECONDS}")
+    api_group.add_argument('--hedge-percentile', type=float, default=Config.DEFAULT_HEDGE_PERCENTILE, metavar="<p>", help=f"Send a duplicate of a request still running after this percentile of recent\nlatencies (e.g. 95) to another endpoint and keep the first good reply; costs\nextra tokens on slow requests. Not applied to --stream (0 = off). Default: {Config.DEFAULT_HEDGE_PERCENTILE}")
     api_group.add_argument('-b', '--batch-size', type=int, default=Config.DEFAULT_BATCH_SIZE, metavar="<N>", help=f"Number of subtitles to send in each API request. Default: {Config.DEFAULT_BATCH_SIZE}")
+    api_group.add_argument('--batching', type=str, default=Config.DEFAULT_BATCHING, choices=['fixed', 'adaptive'], help=f"'fixed' sends --batch-size subtitles per request; 'adaptive' packs subtitles by\nestimated tokens and prefers to split at scene gaps. Default: {Config.DEFAULT_BATCHING}")
+    api_group.add_argument('--max-batch-tokens', type=int, default=Config.DEFAULT_MAX_BATCH_TOKENS, metavar="<N>", help=f"Adaptive batching: estimated source tokens per request. Default: {Config.DEFAULT_MAX_BATCH_TOKENS}")
+    api_group.add_argument('--max-output-tokens', type=int, default=Config.DEFAULT_MAX_OUTPUT_TOKENS, metavar="<N>", help=f"Adaptive batching: estimated translated tokens per request. Default: {Config.DEFAULT_MAX_OUTPUT_TOKENS}")
+    api_group.add_argument('--output-token-ratio', type=float, default=Config.DEFAULT_OUTPUT_TOKEN_RATIO, metavar="<x>", help=f"Adaptive batching: expected output/input token ratio. Default: {Config.DEFAULT_OUTPUT_TOKEN_RATIO}")
+    api_group.add_argument('--min-batch-cues', type=int, default=Config.DEFAULT_MIN_BATCH_CUES, metavar="<N>", help=f"Adaptive batching: minimum subtitles per request. Default: {Config.DEFAULT_MIN_BATCH_CUES}")
+    api_group.add_argument('--max-batch-cues', type=int, default=Config.DEFAULT_MAX_BATCH_CUES, metavar="<N>", help=f"Adaptive batching: maximum subtitles per request. Default: {Config.DEFAULT_MAX_BATCH_CUES}")
+    api_group.add_argument('--scene-gap', type=float, default=Config.DEFAULT_SCENE_GAP, metavar="<sec>", help=f"Adaptive batching: a pause this long counts as a scene change (0 = ignore). Default: {Config.DEFAULT_SCENE_GAP}")
+    api_group.add_argument('--dedup-min-chars', type=int, default=Config.DEFAULT_DEDUP_MIN_CHARS, metavar="<N>", help=f"Subtitles whose text repeats within a file are translated once and the result\nreused; lines shorter than N characters are left out, as their meaning often\ndepends on context. Default: {Config.DEFAULT_DEDUP_MIN_CHARS}")
+    api_group.add_argument('--no-dedup', action='store_true', help="Translate every occurrence of a repeated subtitle separately.")
     api_group.add_argument('-c', '--concurrency', type=int, default=Config.DEFAULT_CONCURRENCY, metavar="<N>", help=f"Number of parallel API requests to make. Default: {Config.DEFAULT_CONCURRENCY}")
+    api_group.add_argument('--adaptive-concurrency', action='store_true', help="Adapt the number of in-flight requests to latency and 429/5xx responses,\nstarting at (and never exceeding) --concurrency.")
+    api_group.add_argument('--min-concurrency', type=int, default=Config.DEFAULT_MIN_CONCURRENCY, metavar="<N>", help=f"Lower bound for --adaptive-concurrency. Default: {Config.DEFAULT_MIN_CONCURRENCY}")
+    api_group.add_argument('--rpm', type=int, default=Config.DEFAULT_RPM, metavar="<N>", help=f"Requests-per-minute quota shared by all workers (0 = unlimited). Default: {Config.DEFAULT_RPM}")
+    api_group.add_argument('--tpm', type=int, default=Config.DEFAULT_TPM, metavar="<N>", help=f"Tokens-per-minute quota shared by all workers (0 = unlimited). Requests are\npre-charged with their estimated prompt size and corrected from API usage. Default: {Config.DEFAULT_TPM}")
+    api_group.add_argument('-e', '--engine', type=str, default=Config.DEFAULT_ENGINE, choices=['thread', 'async'], help=f"Concurrency engine: 'thread' uses a worker thread per request, 'async' runs all requests\non one event loop (suited to high --concurrency). Default: {Config.DEFAULT_ENGINE}")
+    api_group.add_argument('--reorder-window', type=int, default=Config.DEFAULT_REORDER_WINDOW, metavar="<N>", help=f"Max batches dispatched ahead of the first unwritten one; bounds memory held\nfor out-of-order results (never below --concurrency). Default: {Config.DEFAULT_REORDER_WINDOW}")
+    api_group.add_argument('--connect-timeout', type=float, default=Config.DEFAULT_CONNECT_TIMEOUT, metavar="<sec>", help=f"Seconds to wait when opening a connection to the API. Default: {Config.DEFAULT_CONNECT_TIMEOUT}")
+    api_group.add_argument('--read-timeout', type=float, default=Config.DEFAULT_READ_TIMEOUT, metavar="<sec>", help=f"Seconds to wait for an API response. Default: {Config.DEFAULT_READ_TIMEOUT}")
+    api_group.add_argument('--response-format', type=str, default=Config.DEFAULT_RESPONSE_FORMAT, choices=['separator', 'json'], help=f"'separator' asks for subtitles joined by --separator; 'json' sends subtitles keyed\nby id and expects a JSON object back (using the API's JSON mode when supported),\nso only missing ids are re-requested. Default: {Config.DEFAULT_RESPONSE_FORMAT}")
+    api_group.add_argument('--prompt-strategy', type=str, default=Config.DEFAULT_PROMPT_STRATEGY, choices=sorted(PROMPT_STRATEGIES), help=f"Prompt used with the separator format: 'template' sends each batch twice (as\nlines and as a separator template); 'compact' sends each subtitle once, using\nroughly half the input tokens. Default: {Config.DEFAULT_PROMPT_STRATEGY}")
+    api_group.add_argument('--mismatch-recovery', type=str, default=Config.DEFAULT_MISMATCH_RECOVERY, choices=['retry', 'bisect'], help=f"On a separator mismatch, 'retry' re-sends the whole batch with a stricter prompt;\n'bisect' splits it in half and recurses down to single subtitles, keeping\nevery part that aligns. Default: {Config.DEFAULT_MISMATCH_RECOVERY}")
+    api_group.add_argument('--stream', action='store_true', help="Stream replies (SSE) and stop a generation as soon as it is bound to fail (too\nmany subtitles, unknown ids, runaway length). With --response-format json,\neach subtitle is written as soon as it arrives and passes validation.")
     api_group.add_argument('-s', '--separator', type=str, default=Config.DEFAULT_SEPARATOR, metavar="<str>", help=f"Unique separator for batching subtitles. Default: '{Config.DEFAULT_SEPARATOR}'")
 
+    cache_group.add_argument('--cache-path', type=Path, default=Config.DEFAULT_CACHE_PATH, metavar="<file>", help=f"SQLite file storing previously validated translations. Default: {Config.DEFAULT_CACHE_PATH}")
+    cache_group.add_argument('--no-cache', action='store_true', help="Bypass the translation memory entirely (no lookups, nothing stored).")
+    cache_group.add_argument('--rebuild-cache', action='store_true', help="Ignore cached translations and overwrite them with fresh ones.")
+    cache_group.add_argument('--cache-max-entries', type=int, default=Config.DEFAULT_CACHE_MAX_ENTRIES, metavar="<N>", help=f"Evict least recently used entries above this count (0 = unlimited). Default: {Config.DEFAULT_CACHE_MAX_ENTRIES}")
+    cache_group.add_argument('--cache-max-age-days', type=float, default=Config.DEFAULT_CACHE_MAX_AGE_DAYS, metavar="<N>", help=f"Evict entries not used for this many days (0 = never). Default: {Config.DEFAULT_CACHE_MAX_AGE_DAYS}")
+
+    transcript_group.add_argument('--transcript-cache-dir', type=Path, default=Config.DEFAULT_TRANSCRIPT_CACHE_DIR, metavar="<dir>", help=f"Directory of cached transcripts, keyed by media content hash, Whisper model\nand input language. Default: {Config.DEFAULT_TRANSCRIPT_CACHE_DIR}")
+    transcript_group.add_argument('--no-transcript-cache', action='store_true', help="Always run Whisper, and do not store the transcript.")
+
+    service_group.add_argument('--listen', type=str, default=Config.DEFAULT_LISTEN, metavar="<host:port>", help=f"Address the service's HTTP API listens on. Default: {Config.DEFAULT_LISTEN}")
+    service_group.add_argument('--socket', type=Path, metavar="<path>", help="Listen on this Unix socket instead of --listen.")
+    service_group.add_argument('--queue-dir', type=Path, default=Config.DEFAULT_QUEUE_DIR, metavar="<dir>", help=f"Directory holding the job queue, so queued and interrupted jobs survive a\nrestart (interrupted ones resume from their journal). Default: {Config.DEFAULT_QUEUE_DIR}")
+    service_group.add_argument('--max-jobs', type=int, default=Config.DEFAULT_MAX_JOBS, metavar="<N>", help=f"Jobs run at the same time; their requests share --concurrency, --rpm and --tpm.\nDefault: {Config.DEFAULT_MAX_JOBS}")
+
+    misc_group.add_argument('--metrics-out', type=Path, metavar="<path>", help="Write per-batch metrics (queue wait, request latency, tokens, retries by\ncause, validation and write time) to '<path>.jsonl', appending one run per call,\nand the run totals as a Prometheus textfile to '<path>.prom'. With --serve,\neach job writes '<path>-<job id>.jsonl' and '.prom'.")
     misc_group.add_argument('-d', '--debug', action='store_true', help="Enable debug mode for verbose request/response logging.")
-    misc_group.add_argument('--version', action='version', version='%(prog)s 2.4')
+    misc_group.add_argument('--version', action='version', version='%(prog)s 2.5.0')
     
     return parser
\ No newline at end of file
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+Adaptive (AIMD) control of how many API requests are in flight.
+
+The limit grows by about one request per round-trip while latency stays
+close to the best observed, and is cut multiplicatively on 429/5xx
+responses, network failures or sustained latency growth. A Retry-After
+header pauses new requests for the requested time. Without
+--adaptive-concurrency the limit is a fixed RequestGate.
+"""
+
+import asyncio
+import threading
+import time
+from .utils import cprint, Colors
+
+# Smoothed latency this many times the baseline counts as queueing at the provider.
+LATENCY_TOLERANCE = 2.0
+# Weight of each new sample in the smoothed latency; LLM latency is noisy per request.
+LATENCY_SMOOTHING = 0.2
+# Multiplicative decrease on throttling/errors, and the milder one on slow responses.
+ERROR_BACKOFF = 0.5
+LATENCY_BACKOFF = 0.9
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class RequestGate:
+    """
+    Caps the API requests in flight at `limit`, across all the threads
+    (`acquire`) and event loops (`acquire_async`) that share it; both are
+    paired with `release`. A service runs each job on its own event loop,
+    so no loop-bound primitive is kept: every waiting task has a future of
+    its own, woken through its loop's thread-safe callback.
+    """
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        # (loop, future) of each task waiting in acquire_async.
+        self._waiters = set()
+
+    def _try_acquire(self):
+        """Takes a slot if possible. Returns 0 on success, else seconds to wait (None = until a release)."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return 0
+        return None
+
+    def try_acquire(self):
+        """Takes a slot only if one is free right now; returns whether it did."""
+        with self._cond:
+            return self._try_acquire() == 0
+
+    def acquire(self):
+        """Blocks the calling thread until a request may be sent."""
+        with self._cond:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    return
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self):
+        """Waits (without blocking the event loop) until a request may be sent."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                wait = self._try_acquire()
+                if wait == 0:
+                    return
+                # Registered under the lock, so a release in between cannot be missed.
+                waiter = loop.create_future()
+                self._waiters.add((loop, waiter))
+            try:
+                await asyncio.wait({waiter}, timeout=wait)
+            finally:
+                with self._cond:
+                    self._waiters.discard((loop, waiter))
+
+    def release(self, latency, error=None):
+        """
+        Frees a slot. `latency` is the request's duration and `error` the
+        HttpError it failed with, or None on success.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self._on_release(latency, error)
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, set()
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # The waiter's loop has been closed; nobody is left to wake.
+                pass
+
+    def _on_release(self, latency, error):
+        pass
+
+
+class AimdController(RequestGate):
+    """
+    A RequestGate whose limit follows additive-increase/multiplicative-
+    decrease between `minimum` and `maximum`.
+    """
+    def __init__(self, initial, maximum, minimum=1, debug=False):
+        super().__init__(1)
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.debug = debug
+        self.smoothed_latency = None
+        self.baseline_latency = None
+        self._last_decrease = 0.0
+
+    def _on_release(self, latency, error):
+        """Adapts the limit to the outcome of a request."""
+        sent_at = time.monotonic() - latency
+        if error is None:
+            self._on_success(latency, sent_at)
+        elif error.status is None or error.status == 429 or error.status >= 500:
+            if error.retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + error.retry_after)
+            self._decrease(ERROR_BACKOFF, sent_at, f"HTTP {error.status}" if error.status else "network error")
+
+    def _on_success(self, latency, sent_at):
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        else:
+            self.smoothed_latency += (latency - self.smoothed_latency) * LATENCY_SMOOTHING
+        if self.baseline_latency is None or self.smoothed_latency < self.baseline_latency:
+            self.baseline_latency = self.smoothed_latency
+        else:
+            # Let the baseline drift up slowly so a permanently slower provider is not punished forever.
+            self.baseline_latency += (self.smoothed_latency - self.baseline_latency) * 0.01
+
+        if self.smoothed_latency > self.baseline_latency * LATENCY_TOLERANCE:
+            self._decrease(LATENCY_BACKOFF, sent_at, f"latency {self.smoothed_latency:.2f}s vs baseline {self.baseline_latency:.2f}s")
+        elif self.limit < self.maximum:
+            old = int(self.limit)
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            if self.debug and int(self.limit) != old:
+                cprint(Colors.INFO, f"Debug: Concurrency raised to {int(self.limit)} (latency {latency:.2f}s)")
+
+    def _decrease(self, factor, sent_at, reason):
+        # Requests sent before the last decrease report on the old limit; back off once per window.
+        if sent_at < self._last_decrease:
+            return
+        old = self.limit
+        self.limit = max(self.minimum, self.limit * factor)
+        self._last_decrease = time.monotonic()
+        if self.debug and int(self.limit) != int(old):
+            cprint(Colors.WARNING, f"Debug: Concurrency lowered from {int(old)} to {int(self.limit)} ({reason})")
@@ -5,17 +5,52 @@ Configuration for the v2srt application.
 Stores constants, language mappings, and API settings.
 """
 
+import os
+from pathlib import Path
+
 class Config:
     """Stores all script-wide configuration constants."""
     DEFAULT_MODEL = "grok-3-mini"
     DEFAULT_BATCH_SIZE = 10
+    DEFAULT_BATCHING = "fixed"
+    DEFAULT_MAX_BATCH_TOKENS = 800
+    DEFAULT_MAX_OUTPUT_TOKENS = 2000
+    DEFAULT_OUTPUT_TOKEN_RATIO = 1.5
+    DEFAULT_MIN_BATCH_CUES = 3
+    DEFAULT_MAX_BATCH_CUES = 50
+    DEFAULT_SCENE_GAP = 2.0
+    DEFAULT_DEDUP_MIN_CHARS = 4
     DEFAULT_SEPARATOR = "[|||]"
     DEFAULT_INPUT_LANG = "ja"
     DEFAULT_OUTPUT_LANG = "zh-cn"
     DEFAULT_WHISPER_MODEL = "large"
+    DEFAULT_WHISPER_WORKERS = 1
+    DEFAULT_WHISPER_BACKEND = "cli"
     DEFAULT_CONCURRENCY = 5
+    DEFAULT_MIN_CONCURRENCY = 1
+    DEFAULT_RPM = 0
+    DEFAULT_TPM = 0
+    DEFAULT_ENGINE = "thread"
+    DEFAULT_REORDER_WINDOW = 64
     MAX_VALIDATION_RETRIES = 3
+    DEFAULT_MISMATCH_RECOVERY = "retry"
+    DEFAULT_RESPONSE_FORMAT = "separator"
+    DEFAULT_PROMPT_STRATEGY = "template"
     DEFAULT_API_URL = "https://api.x.ai/v1/chat/completions"
+    DEFAULT_EJECT_SECONDS = 30
+    DEFAULT_HEDGE_PERCENTILE = 0
+    DEFAULT_CONNECT_TIMEOUT = 10
+    DEFAULT_READ_TIMEOUT = 120
+    MAX_NETWORK_RETRIES = 1
+    MAX_RATE_LIMIT_RETRIES = 5
+    MAX_RETRY_AFTER = 60
+    DEFAULT_CACHE_PATH = Path(os.getenv('XDG_CACHE_HOME') or Path.home() / '.cache') / 'v2srt' / 'translation_memory.sqlite3'
+    DEFAULT_CACHE_MAX_ENTRIES = 500000
+    DEFAULT_CACHE_MAX_AGE_DAYS = 180
+    DEFAULT_TRANSCRIPT_CACHE_DIR = DEFAULT_CACHE_PATH.parent / 'transcripts'
+    DEFAULT_LISTEN = "127.0.0.1:8765"
+    DEFAULT_QUEUE_DIR = DEFAULT_CACHE_PATH.parent / 'queue'
+    DEFAULT_MAX_JOBS = 2
 
 LANG_MAP = {
     'en': 'English', 'zh': 'Chinese', 'ja': 'Japanese', 'es': 'Spanish',
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+"""
+A pool of interchangeable chat-completions endpoints (--endpoints).
+
+Every request goes to one endpoint picked at random in proportion to its
+configured weight, scaled down by its smoothed latency and recent error
+rate, so a slow or failing region gets less traffic without being cut
+off from the requests that show it has recovered. After
+EJECT_AFTER_FAILURES consecutive failures an endpoint is ejected for
+--eject-seconds (doubling with every ejection in a row); if every
+endpoint is ejected, they are all used again rather than none.
+
+The pool also keeps the latencies of recent successful requests; their
+--hedge-percentile is how long a request may run before a duplicate is
+sent to another endpoint. Tokens are counted per endpoint for every
+request it answered, duplicates included.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .rate_limit import RateLimiter
+from .utils import cprint, Colors
+
+# Consecutive failures (network errors, 429 and 5xx) that eject an endpoint.
+EJECT_AFTER_FAILURES = 3
+# Upper bound of the doubling ejection time.
+MAX_EJECT_SECONDS = 300
+# Weight of each new sample in the smoothed latency and success rate.
+SMOOTHING = 0.2
+# Successful request latencies kept for the hedging percentile, and the fewest it is computed from.
+LATENCY_WINDOW = 200
+MIN_HEDGE_SAMPLES = 20
+
+
+def is_endpoint_failure(error):
+    """True for errors that say something about the endpoint rather than the request."""
+    return error is not None and (error.status is None or error.status == 429 or error.status >= 500)
+
+
+class Endpoint:
+    """One URL/key/model combination, with its routing state and token counts."""
+    def __init__(self, name, url, api_key, model=None, weight=1.0, rpm=0, tpm=0):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.weight = weight
+        # Quotas of this key alone; the --rpm/--tpm limiter still applies to the sum.
+        self.rate_limiter = RateLimiter(rpm, tpm)
+        self.smoothed_latency = None
+        self.success_rate = 1.0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        # Ejections without a success in between; each one doubles the time.
+        self.eject_streak = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def payload_for(self, payload):
+        """The request with this endpoint's model, if it has one of its own."""
+        return {**payload, "model": self.model} if self.model else payload
+
+    def summary(self):
+        return {'name': self.name, 'url': self.url, 'model': self.model, 'weight': self.weight, 'requests': self.requests,
+                'failures': self.failures, 'ejections': self.ejections, 'input_tokens': self.input_tokens,
+                'output_tokens': self.output_tokens, 'hedges': self.hedges, 'hedges_won': self.hedges_won,
+                'latency': round(self.smoothed_latency, 4) if self.smoothed_latency is not None else None}
+
+
+def load_endpoints(path, default_key):
+    """
+    Reads an --endpoints file: a JSON list of objects with 'url' and
+    optionally 'name', 'key' (or 'key_env', the name of an environment
+    variable holding it), 'model', 'weight', 'rpm' and 'tpm'. Endpoints
+    without a key use --api-key. Raises ValueError for an unusable file.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not read endpoints file '{path}': {e}") from e
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"Endpoints file '{path}' must hold a non-empty JSON list.")
+
+    endpoints = []
+    for n, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict) or not isinstance(entry.get('url'), str):
+            raise ValueError(f"Endpoint #{n} in '{path}' needs a 'url'.")
+        key = entry.get('key') or (os.getenv(entry['key_env']) if entry.get('key_env') else None) or default_key
+        if not key:
+            raise ValueError(f"Endpoint #{n} in '{path}' has no API key ('key', 'key_env' or --api-key).")
+        weight = entry.get('weight', 1.0)
+        if not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError(f"Endpoint #{n} in '{path}' needs a positive 'weight'.")
+        name = entry.get('name') or urlsplit(entry['url']).netloc or f"endpoint-{n}"
+        if any(endpoint.name == name for endpoint in endpoints):
+            name = f"{name}#{n}"
+        endpoints.append(Endpoint(name, entry['url'], key, entry.get('model'), float(weight), entry.get('rpm', 0), entry.get('tpm', 0)))
+    return endpoints
+
+
+class EndpointPool:
+    """Routes requests over a list of endpoints and tracks their health. Thread-safe."""
+    def __init__(self, endpoints, eject_seconds):
+        self.endpoints = endpoints
+        self.eject_seconds = eject_seconds
+        self._latencies = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args):
+        """The --endpoints pool, or a pool of just --api-url. Raises ValueError for a bad --endpoints file."""
+        if args.endpoints:
+            endpoints = load_endpoints(args.endpoints, args.api_key)
+        else:
+            endpoints = [Endpoint(urlsplit(args.api_url).netloc or args.api_url, args.api_url, args.api_key)]
+        return cls(endpoints, args.eject_seconds)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def models(self, default):
+        """The models requests may be answered by, where `default` is the request's own."""
+        return sorted({endpoint.model or default for endpoint in self.endpoints})
+
+    def choose(self, avoid=()):
+        """
+        Picks the endpoint for a request, preferring healthy ones not in
+        `avoid` (those that already failed the batch).
+        """
+        if len(self.endpoints) == 1:
+            return self.endpoints[0]
+        now = time.monotonic()
+        with self._lock:
+            candidates = ([e for e in self.endpoints if e not in avoid and e.ejected_until <= now]
+                          or [e for e in self.endpoints if e.ejected_until <= now]
+                          or self.endpoints)
+            known = [e.smoothed_latency for e in candidates if e.smoothed_latency is not None]
+            # Endpoints without samples yet are assumed as fast as the best, so they get tried.
+            unknown_latency = min(known) if known else 1.0
+            scores = [e.weight * e.success_rate ** 2 / max(e.smoothed_latency or unknown_latency, 0.001) for e in candidates]
+            if not any(scores):
+                scores = [e.weight for e in candidates]
+            return random.choices(candidates, weights=scores)[0]
+
+    def record(self, endpoint, latency, error, reply, hedge=False):
+        """Accounts one finished request: latency, health and the tokens in `reply`'s usage."""
+        usage = reply.get('usage') if isinstance(reply, dict) else None
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.hedges += hedge
+            if usage:
+                endpoint.input_tokens += usage.get('prompt_tokens', 0)
+                endpoint.output_tokens += usage.get('completion_tokens', 0)
+            if is_endpoint_failure(error):
+                endpoint.failures += 1
+                endpoint.success_rate -= endpoint.success_rate * SMOOTHING
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= EJECT_AFTER_FAILURES and len(self.endpoints) > 1:
+                    self._eject(endpoint, f"{endpoint.consecutive_failures} failures in a row")
+                elif error.status == 429 and error.retry_after and len(self.endpoints) > 1:
+                    # A throttled key is left alone for as long as it asked.
+                    endpoint.ejected_until = max(endpoint.ejected_until, time.monotonic() + min(error.retry_after, MAX_EJECT_SECONDS))
+                return
+            if error is not None:
+                # A rejected request (400 and the like) says nothing about the endpoint's health.
+                return
+            endpoint.success_rate += (1.0 - endpoint.success_rate) * SMOOTHING
+            endpoint.consecutive_failures = 0
+            endpoint.eject_streak = 0
+            if endpoint.smoothed_latency is None:
+                endpoint.smoothed_latency = latency
+            else:
+                endpoint.smoothed_latency += (latency - endpoint.smoothed_latency) * SMOOTHING
+            self._latencies.append(latency)
+            if len(self._latencies) > LATENCY_WINDOW:
+                del self._latencies[0]
+
+    def _eject(self, endpoint, reason):
+        endpoint.ejections += 1
+        endpoint.eject_streak += 1
+        seconds = min(MAX_EJECT_SECONDS, self.eject_seconds * 2 ** (endpoint.eject_streak - 1))
+        endpoint.ejected_until = time.monotonic() + seconds
+        endpoint.consecutive_failures = 0
+        cprint(Colors.WARNING, f"Endpoint '{endpoint.name}' ejected for {seconds:.0f}s after {reason}.")
+
+    def record_hedge_won(self, endpoint):
+        with self._lock:
+            endpoint.hedges_won += 1
+
+    def hedge_delay(self, percentile):
+        """Seconds after which a request is duplicated, or None while there are too few samples."""
+        with self._lock:
+            if len(self._latencies) < MIN_HEDGE_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100.0))]
+
+    def summary(self):
+        with self._lock:
+            return [endpoint.summary() for endpoint in self.endpoints]
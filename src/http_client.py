@@ -0,0 +1,523 @@
+# -*- coding: utf-8 -*-
+
+"""
+Small keep-alive HTTP clients (threaded and asyncio) for talking to the
+translation API.
+
+Connections are pooled per origin so concurrent workers reuse their
+TCP/TLS sessions instead of paying a fresh handshake for every request.
+Both clients can also read a server-sent event stream and abandon it
+midway, which closes the connection instead of returning it to the pool.
+"""
+
+import asyncio
+import http.client
+import json
+import queue
+import ssl
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Status codes worth another attempt: throttling, timeouts and server-side failures.
+RETRYABLE_STATUS = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+# Errors raised when a pooled connection was closed by the server while idle.
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class HttpError(Exception):
+    """
+    Raised for transport failures and non-2xx responses.
+    `status` is None when no HTTP response was received at all.
+    """
+    def __init__(self, message, status=None, body=None, retry_after=None, retryable=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+        if retryable is None:
+            retryable = status is None or status in RETRYABLE_STATUS
+        self.retryable = retryable
+
+
+def parse_retry_after(value):
+    """Parses a Retry-After header (seconds or HTTP-date) into seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _split_url(url):
+    """Returns (scheme, host, port, path) for a request URL."""
+    parts = urlsplit(url)
+    scheme = parts.scheme or 'https'
+    port = parts.port or (443 if scheme == 'https' else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    return scheme, parts.hostname, port, path
+
+
+def _json_request(payload, headers):
+    """Encodes a JSON payload and merges the default request headers."""
+    request_headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+    if headers:
+        request_headers.update(headers)
+    return json.dumps(payload).encode('utf-8'), request_headers
+
+
+def decode_json_response(status, headers, body):
+    """
+    Turns a raw response into parsed JSON, raising HttpError for
+    non-2xx statuses and undecodable bodies.
+    """
+    text = body.decode('utf-8', errors='replace')
+    if not 200 <= status < 300:
+        raise HttpError(
+            f"HTTP {status} from API", status=status, body=text,
+            retry_after=parse_retry_after(headers.get('retry-after')),
+        )
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise HttpError(f"Invalid JSON in API response: {e}", status=status, body=text, retryable=True) from e
+
+
+def _is_event_stream(response_headers):
+    return response_headers.get('content-type', '').split(';', 1)[0].strip().lower() == 'text/event-stream'
+
+
+class _EventStreamParser:
+    """
+    Splits a text/event-stream body into events and hands each event's
+    JSON `data` to `on_event`. The OpenAI-style '[DONE]' sentinel is
+    skipped; other fields and comments are ignored.
+    """
+    def __init__(self, on_event):
+        self.on_event = on_event
+        self._data = []
+
+    def feed_line(self, raw_line):
+        """Processes one line; returns False once `on_event` asked to stop."""
+        line = raw_line.decode('utf-8', errors='replace').rstrip('\r\n')
+        if line:
+            if line.startswith('data:'):
+                value = line[5:]
+                self._data.append(value[1:] if value.startswith(' ') else value)
+            return True
+        return self.flush()
+
+    def flush(self):
+        """Dispatches the pending event, if any (also used at the end of the body)."""
+        if not self._data:
+            return True
+        data, self._data = '\n'.join(self._data), []
+        if data == '[DONE]':
+            return True
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError as e:
+            raise HttpError(f"Invalid JSON in event stream: {e}", body=data, retryable=True) from e
+        return self.on_event(event) is not False
+
+
+class _ConnectionPool:
+    """A bounded LIFO pool of keep-alive connections to a single origin."""
+    def __init__(self, scheme, host, port, max_connections, connect_timeout, read_timeout):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._ssl_context = ssl.create_default_context() if scheme == 'https' else None
+
+    def _new_connection(self):
+        if self.scheme == 'https':
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        # The connect timeout only covers the handshake; responses get the (longer) read timeout.
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    @staticmethod
+    def _send(conn, method, path, body, headers):
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response, response.read()
+
+    def request(self, method, path, body, headers):
+        """Sends a request and returns (status, headers, body_bytes)."""
+        with self._slots:
+            conn, reused = self._checkout()
+            try:
+                try:
+                    response, data = self._send(conn, method, path, body, headers)
+                except _STALE_CONNECTION_ERRORS:
+                    if not reused:
+                        raise
+                    # The server dropped an idle keep-alive connection; retry once on a fresh one.
+                    conn.close()
+                    conn = self._new_connection()
+                    response, data = self._send(conn, method, path, body, headers)
+            except BaseException:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            response_headers = {k.lower(): v for k, v in response.getheaders()}
+            return response.status, response_headers, data
+
+    @staticmethod
+    def _send_head(conn, method, path, body, headers):
+        conn.request(method, path, body=body, headers=headers)
+        return conn.getresponse()
+
+    def stream(self, method, path, body, headers, on_event):
+        """
+        Sends a request and feeds a 2xx event-stream response to `on_event`.
+        Returns False if `on_event` stopped it early; non-2xx responses are
+        read whole and raised as HttpError, and any other 2xx response is
+        passed to `on_event` as a single decoded JSON body.
+        """
+        with self._slots:
+            conn, reused = self._checkout()
+            try:
+                try:
+                    response = self._send_head(conn, method, path, body, headers)
+                except _STALE_CONNECTION_ERRORS:
+                    if not reused:
+                        raise
+                    conn.close()
+                    conn = self._new_connection()
+                    response = self._send_head(conn, method, path, body, headers)
+                response_headers = {k.lower(): v for k, v in response.getheaders()}
+                if not 200 <= response.status < 300 or not _is_event_stream(response_headers):
+                    # Errors, and servers that ignore `stream`, answer with one JSON body.
+                    completed = on_event(decode_json_response(response.status, response_headers, response.read())) is not False
+                else:
+                    parser = _EventStreamParser(on_event)
+                    completed = True
+                    while completed:
+                        line = response.readline()
+                        if not line:
+                            completed = parser.flush()
+                            break
+                        completed = parser.feed_line(line)
+            except BaseException:
+                conn.close()
+                raise
+
+            if not completed or response.will_close:
+                # An abandoned response leaves unread data on the connection.
+                conn.close()
+            else:
+                self._idle.put(conn)
+            return completed
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class HttpClient:
+    """
+    Thread-safe HTTP client with one keep-alive connection pool per origin,
+    each capped at `max_connections` concurrent connections.
+    """
+    def __init__(self, max_connections, connect_timeout, read_timeout):
+        self.max_connections = max(1, max_connections)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool_for(self, url):
+        scheme, host, port, path = _split_url(url)
+        key = (scheme, host, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = _ConnectionPool(scheme, host, port, self.max_connections, self.connect_timeout, self.read_timeout)
+                self._pools[key] = pool
+        return pool, path
+
+    def post_json(self, url, payload, headers=None):
+        """
+        POSTs `payload` as JSON and returns the decoded JSON response.
+        Raises HttpError on transport failures and non-2xx responses.
+        """
+        pool, path = self._pool_for(url)
+        body, request_headers = _json_request(payload, headers)
+        try:
+            status, response_headers, data = pool.request('POST', path, body, request_headers)
+        except (OSError, http.client.HTTPException) as e:
+            raise HttpError(f"Request to {url} failed: {e!r}") from e
+        return decode_json_response(status, response_headers, data)
+
+    def post_stream(self, url, payload, on_event, headers=None):
+        """
+        POSTs `payload` as JSON and reads the server-sent event stream it
+        answers with, calling `on_event(data)` for every event until the
+        stream ends or `on_event` returns False. Returns True if the stream
+        was read to the end. Raises HttpError like post_json.
+        """
+        pool, path = self._pool_for(url)
+        body, request_headers = _json_request(payload, headers)
+        request_headers['Accept'] = 'text/event-stream'
+        try:
+            return pool.stream('POST', path, body, request_headers, on_event)
+        except (OSError, http.client.HTTPException) as e:
+            raise HttpError(f"Request to {url} failed: {e!r}") from e
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+
+class _AsyncConnectionPool:
+    """
+    The asyncio counterpart of _ConnectionPool: a bounded LIFO pool of
+    keep-alive HTTP/1.1 connections built on asyncio streams.
+    """
+    def __init__(self, scheme, host, port, max_connections, connect_timeout, read_timeout):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+        self._ssl_context = ssl.create_default_context() if scheme == 'https' else None
+        default_port = 443 if scheme == 'https' else 80
+        self._host_header = host if port == default_port else f"{host}:{port}"
+
+    async def _new_connection(self):
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self._ssl_context),
+            self.connect_timeout,
+        )
+
+    async def _checkout(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+        return await self._new_connection(), False
+
+    async def _send_head(self, conn, method, path, body, headers):
+        """Sends the request and reads the status line and headers; returns (status, headers, keep_alive)."""
+        reader, writer = conn
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self._host_header}", f"Content-Length: {len(body)}"]
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before a response was received")
+        version, status, _ = (status_line.decode('latin-1').rstrip('\r\n') + '  ').split(' ', 2)
+        status = int(status)
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+        if not ('chunked' in response_headers.get('transfer-encoding', '').lower() or 'content-length' in response_headers):
+            # The body runs until the server closes the connection.
+            keep_alive = False
+        return status, response_headers, keep_alive
+
+    @staticmethod
+    async def _body_pieces(reader, response_headers):
+        """Yields the response body as it arrives, undoing chunked transfer encoding."""
+        if 'chunked' in response_headers.get('transfer-encoding', '').lower():
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip any trailers up to the terminating blank line.
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif 'content-length' in response_headers:
+            remaining = int(response_headers['content-length'])
+            while remaining:
+                piece = await reader.read(min(remaining, 1 << 16))
+                if not piece:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                remaining -= len(piece)
+                yield piece
+        else:
+            while True:
+                piece = await reader.read(1 << 16)
+                if not piece:
+                    return
+                yield piece
+
+    async def _send(self, conn, method, path, body, headers):
+        status, response_headers, keep_alive = await self._send_head(conn, method, path, body, headers)
+        data = b''.join([piece async for piece in self._body_pieces(conn[0], response_headers)])
+        return status, response_headers, data, keep_alive
+
+    async def request(self, method, path, body, headers):
+        """Sends a request and returns (status, headers, body_bytes)."""
+        async with self._slots:
+            conn, reused = await self._checkout()
+            try:
+                try:
+                    result = await asyncio.wait_for(self._send(conn, method, path, body, headers), self.read_timeout)
+                except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    # The server dropped an idle keep-alive connection; retry once on a fresh one.
+                    conn[1].close()
+                    conn = await self._new_connection()
+                    result = await asyncio.wait_for(self._send(conn, method, path, body, headers), self.read_timeout)
+            except BaseException:
+                conn[1].close()
+                raise
+
+            status, response_headers, data, keep_alive = result
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                conn[1].close()
+            return status, response_headers, data
+
+    async def stream(self, method, path, body, headers, on_event):
+        """
+        Sends a request and feeds a 2xx event-stream response to `on_event`.
+        Returns False if `on_event` stopped it early; non-2xx responses are
+        read whole and raised as HttpError, and any other 2xx response is
+        passed to `on_event` as a single decoded JSON body. `read_timeout`
+        applies to each wait for more data rather than to the whole response.
+        """
+        async with self._slots:
+            conn, reused = await self._checkout()
+            try:
+                try:
+                    head = await asyncio.wait_for(self._send_head(conn, method, path, body, headers), self.read_timeout)
+                except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    conn[1].close()
+                    conn = await self._new_connection()
+                    head = await asyncio.wait_for(self._send_head(conn, method, path, body, headers), self.read_timeout)
+                status, response_headers, keep_alive = head
+                pieces = self._body_pieces(conn[0], response_headers)
+                if not 200 <= status < 300 or not _is_event_stream(response_headers):
+                    # Errors, and servers that ignore `stream`, answer with one JSON body.
+                    data = b''.join([piece async for piece in pieces])
+                    completed = on_event(decode_json_response(status, response_headers, data)) is not False
+                else:
+                    completed = await self._read_events(pieces, _EventStreamParser(on_event))
+            except BaseException:
+                conn[1].close()
+                raise
+
+            if completed and keep_alive:
+                self._idle.append(conn)
+            else:
+                # An abandoned response leaves unread data on the connection.
+                conn[1].close()
+            return completed
+
+    async def _read_events(self, pieces, parser):
+        """Feeds the body to `parser` line by line; returns False if it stopped early."""
+        buffered = b''
+        while True:
+            try:
+                piece = await asyncio.wait_for(pieces.__anext__(), self.read_timeout)
+            except StopAsyncIteration:
+                return (not buffered or parser.feed_line(buffered)) and parser.flush()
+            lines = (buffered + piece).split(b'\n')
+            buffered = lines.pop()
+            for line in lines:
+                if not parser.feed_line(line + b'\n'):
+                    return False
+
+    def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+class AsyncHttpClient:
+    """
+    asyncio HTTP client with one keep-alive connection pool per origin.
+    Pools are created lazily so they bind to the running event loop.
+    """
+    def __init__(self, max_connections, connect_timeout, read_timeout):
+        self.max_connections = max(1, max_connections)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._pools = {}
+
+    def _pool_for(self, url):
+        scheme, host, port, path = _split_url(url)
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = _AsyncConnectionPool(scheme, host, port, self.max_connections, self.connect_timeout, self.read_timeout)
+            self._pools[key] = pool
+        return pool, path
+
+    async def post_json(self, url, payload, headers=None):
+        """
+        POSTs `payload` as JSON and returns the decoded JSON response.
+        Raises HttpError on transport failures and non-2xx responses.
+        """
+        pool, path = self._pool_for(url)
+        body, request_headers = _json_request(payload, headers)
+        try:
+            status, response_headers, data = await pool.request('POST', path, body, request_headers)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+            raise HttpError(f"Request to {url} failed: {e!r}") from e
+        return decode_json_response(status, response_headers, data)
+
+    async def post_stream(self, url, payload, on_event, headers=None):
+        """Coroutine version of HttpClient.post_stream."""
+        pool, path = self._pool_for(url)
+        body, request_headers = _json_request(payload, headers)
+        request_headers['Accept'] = 'text/event-stream'
+        try:
+            return await pool.stream('POST', path, body, request_headers, on_event)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+            raise HttpError(f"Request to {url} failed: {e!r}") from e
+
+    def close(self):
+        pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+"""
+A translation job: one source SRT translated into one target language.
+
+A job owns everything that is per output file (its batches, journal,
+reorder buffer and ordered writer), so several jobs can be fed through one
+shared worker pool and each output is finalized as soon as its own
+batches are done.
+
+Cues whose text repeats within the file (interjections, song lyrics,
+sign text) are only translated once; the translation of the first
+occurrence is written for all of them.
+
+A job either gets all of its cues up front or reads them from a feed that
+is still growing (such as a running transcription); batches are then
+planned as cues arrive.
+"""
+
+import time
+
+from .batching import plan_batches
+from .journal import JobJournal
+from .reorder_buffer import ReorderBuffer
+from .srt_handler import OrderedSrtWriter, open_srt_output
+from .translation_memory import normalize_source
+from .utils import cprint, Colors
+
+
+def dedup_key(text, min_chars):
+    """
+    The text a cue is deduplicated by, normalized as for the translation
+    memory. None if it is shorter than `min_chars`, as short lines often
+    depend on their context.
+    """
+    key = normalize_source(text)
+    return key if len(key) >= min_chars else None
+
+
+class TranslationJob:
+    """
+    Translates the parsed `blocks` of `source_path` into `output_lang`,
+    written to `output_path`. Call `prepare` and `open` before dispatching
+    batches, then hand every finished batch to `on_result`; the job closes
+    itself once complete.
+
+    With a `feed` (an object with a growing `cues` list and a `snapshot()`
+    method returning (cue_count, closed)), `blocks` is ignored and cues
+    are batched as they arrive. Such jobs are not journaled, because their
+    source does not exist until the feed is done.
+
+    `models` lists the models that may answer the job's requests when
+    --endpoints overrides the model of some endpoints.
+    """
+    def __init__(self, source_path, output_path, output_lang, blocks, args, memory=None, label=None, feed=None, models=None):
+        self.source_path = source_path
+        self.output_path = output_path
+        self.output_lang = output_lang
+        self.feed = feed
+        self.blocks = feed.cues if feed else blocks
+        self.input_complete = feed is None
+        self.args = args
+        self.memory = memory
+        self.models = models
+        # Prefixed to batch numbers in messages when several jobs share the pool.
+        self.label = label
+        self.batches = []
+        self.text_batches = []
+        self.prefilled = {}
+        # Positions seen so far, and those not yet assigned to a batch.
+        self._planned = 0
+        self._unbatched = []
+        # In-file deduplication (None if disabled): the first position planned
+        # with each text, later positions waiting for it, and finished texts.
+        self.dedup_min_chars = None if args.no_dedup else args.dedup_min_chars
+        self._first_by_key = {}
+        self._duplicates = {}
+        self._translated_by_key = {}
+        self.deduplicated = 0
+        # This job's share of the translation memory's statistics, which a service's jobs share.
+        self.memory_hits = 0
+        self.memory_misses = 0
+        self.memory_stored = 0
+        self.journal = None
+        self.restored = None
+        self.reorder_buffer = ReorderBuffer()
+        self.next_submit = 0
+        self.writer = None
+        self._outfile = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.failed_batches = 0
+        self.started_at = None
+        self.finished_at = None
+        self.completed = False
+
+    @property
+    def name(self):
+        return self.label or self.source_path.name
+
+    def prepare(self):
+        """
+        Restores journaled progress (with --resume) and translation-memory
+        hits, then plans batches for the remaining subtitles.
+        """
+        if self.feed:
+            return
+        args = self.args
+        self.journal = JobJournal.for_output(self.output_path, self.source_path, self.journal_settings(args, self.output_lang, self.models))
+        self.restored = self.journal.load() if args.resume else None
+        if self.restored is not None:
+            self.prefilled, self.input_tokens, self.output_tokens = self.restored
+            cprint(Colors.INFO, f"Resuming: {len(self.prefilled)} of {len(self.blocks)} subtitles restored from '{self.journal.path}'.")
+        elif args.resume and self.journal.path.is_file():
+            cprint(Colors.WARNING, f"Ignoring journal '{self.journal.path}': it belongs to a different source file or settings.")
+
+        cached_count = self._plan_new_cues(len(self.blocks), final=True)
+        if cached_count:
+            cprint(Colors.INFO, f"Translation memory: {cached_count} of {len(self.blocks)} subtitles of '{self.name}' already translated.")
+
+    def _plan_new_cues(self, available, final):
+        """
+        Batches the cues from the last planned position up to `available`.
+        Unless `final`, the last (possibly short) batch is held back until
+        more cues arrive. Returns how many new cues the translation memory
+        already had.
+        """
+        args = self.args
+        new_positions = [pos for pos in range(self._planned, available) if pos not in self.prefilled]
+        self._planned = available
+
+        # Cues already in the translation memory are filled in up front; only the rest are batched.
+        cached_count = 0
+        if self.memory and not args.rebuild_cache and new_positions:
+            # Batches are stored under the model that answered them; --model is preferred.
+            models = [args.model] + [model for model in self.models or () if model != args.model]
+            texts = {self.blocks[pos].text for pos in new_positions}
+            cached = self.memory.lookup(texts, args.input_lang, self.output_lang, models)
+            self.memory_hits += len(cached)
+            self.memory_misses += len(texts) - len(cached)
+            for pos in new_positions:
+                if self.blocks[pos].text in cached:
+                    self.prefilled[pos] = cached[self.blocks[pos].text]
+                    cached_count += 1
+        self._unbatched.extend(self._deduplicate(available, new_positions))
+
+        batches = plan_batches(self.blocks, self._unbatched, args)
+        self._unbatched = batches.pop() if batches and not final else []
+        for batch in batches:
+            self.text_batches.append((self._batch_label(len(self.batches)), [self.blocks[pos].text for pos in batch]))
+            self.batches.append(batch)
+        if self.writer:
+            self._write_prefilled()
+        return cached_count
+
+    def _deduplicate(self, available, new_positions):
+        """
+        Returns the `new_positions` that still need translating, leaving out
+        repeats of a text already seen in this file: those are filled in
+        right away if that text is translated, else once it is.
+        """
+        if self.dedup_min_chars is None:
+            return [pos for pos in new_positions if pos not in self.prefilled]
+        # Restored and cached cues can stand in for later repeats of their text.
+        for pos, translated_text in self.prefilled.items():
+            key = dedup_key(self.blocks[pos].text, self.dedup_min_chars)
+            if key is not None:
+                self._translated_by_key.setdefault(key, translated_text)
+        unique = []
+        for pos in new_positions:
+            if pos in self.prefilled:
+                continue
+            key = dedup_key(self.blocks[pos].text, self.dedup_min_chars)
+            if key is None:
+                unique.append(pos)
+            elif key in self._translated_by_key:
+                self.prefilled[pos] = self._translated_by_key[key]
+                self.deduplicated += 1
+            elif key in self._first_by_key:
+                self._duplicates.setdefault(self._first_by_key[key], []).append(pos)
+                self.deduplicated += 1
+            else:
+                self._first_by_key[key] = pos
+                unique.append(pos)
+        return unique
+
+    def poll(self):
+        """Plans batches for cues that have arrived on the feed since the last call."""
+        if self.input_complete:
+            return
+        available, closed = self.feed.snapshot()
+        if available > self._planned or closed:
+            self._plan_new_cues(available, final=closed)
+        if closed:
+            self.input_complete = True
+            self._finish_if_done()
+
+    @staticmethod
+    def journal_settings(args, output_lang, models=None):
+        """Settings that change what a translation looks like; a journal is only reused if they match."""
+        settings = {
+            'input_lang': args.input_lang,
+            'output_lang': output_lang,
+            'model': args.model,
+            'separator': args.separator,
+            'response_format': args.response_format,
+            'prompt_strategy': args.prompt_strategy,
+        }
+        if models and models != [args.model]:
+            settings['models'] = models
+        return settings
+
+    def _batch_label(self, i):
+        return f"{self.label}:{i + 1}" if self.label else i + 1
+
+    def open(self):
+        """Starts the journal and the output file, writing any restored or cached cues."""
+        self.started_at = time.monotonic()
+        if self.journal:
+            self.journal.start(keep_existing=self.restored is not None)
+        self._outfile = open_srt_output(self.output_path)
+        self.writer = OrderedSrtWriter(self._outfile, self.blocks)
+        self._write_prefilled()
+        self._finish_if_done()
+
+    def _write_prefilled(self):
+        for pos, translated_text in self.prefilled.items():
+            self.writer.set(pos, translated_text)
+        self.prefilled = {}
+        self.writer.flush_ready()
+
+    def _finish_if_done(self):
+        if self.input_complete and self.reorder_buffer.next_index == len(self.batches):
+            self.finish(True)
+
+    def next_batch(self, window):
+        """
+        Returns the next (batch_number, indexed_batch) to dispatch, or None if
+        every batch is dispatched or the job is `window` batches ahead of its
+        first unwritten one (which bounds buffered out-of-order results).
+        """
+        self.poll()
+        i = self.next_submit
+        if i >= len(self.batches) or i >= self.reorder_buffer.next_index + window:
+            return None
+        self.next_submit += 1
+        return i, self.text_batches[i]
+
+    @property
+    def exhausted(self):
+        """True once every batch has been dispatched and no more cues can arrive."""
+        return self.input_complete and self.next_submit >= len(self.batches)
+
+    def add_tokens(self, input_tokens, output_tokens):
+        """Counts tokens billed outside of a batch's result, such as those of a hedged request that lost."""
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+    def on_result(self, i, result_data):
+        """Journals, caches and writes one finished batch, in completion order."""
+        positions = self.batches[i]
+        self.input_tokens += result_data['input_tokens']
+        self.output_tokens += result_data['output_tokens']
+        self._remember_batch(positions, result_data)
+        if not result_data.get('failed') and len(result_data['translations']) == len(positions):
+            if self.journal:
+                self.journal.record(positions, result_data['translations'], result_data['input_tokens'], result_data['output_tokens'])
+        else:
+            self.failed_batches += 1
+        for ready_index, ready_result in self.reorder_buffer.push(i, result_data):
+            self._fill_batch(self.batches[ready_index], ready_result['translations'], reusable=not ready_result.get('failed'))
+        self.writer.flush_ready()
+        self._finish_if_done()
+
+    def on_partial(self, i, k, translated_text):
+        """Writes subtitle `k` of batch `i` ahead of its batch, as soon as a streamed reply delivers it."""
+        if self.finished:
+            return
+        pos = self.batches[i][k]
+        self.writer.set(pos, translated_text)
+        for duplicate in self._duplicates.get(pos, ()):
+            self.writer.set(duplicate, translated_text)
+        self.writer.flush_ready()
+
+    def _fill_batch(self, positions, translated_texts, reusable=True):
+        """
+        Hands one translated batch to the writer, substituting error markers
+        on a size mismatch. Repeats of the batch's texts get the same
+        translation, which is kept for later repeats only if `reusable`.
+        """
+        if len(translated_texts) != len(positions):
+            cprint(Colors.FAIL, "Error: Mismatch in batch sizes. Writing error messages.")
+            translated_texts = [f"---TRANSLATION_ERROR---\n{self.blocks[pos].text}" for pos in positions]
+            reusable = False
+        for pos, translated_text in zip(positions, translated_texts):
+            self.writer.set(pos, translated_text)
+            for duplicate in self._duplicates.pop(pos, ()):
+                self.writer.set(duplicate, translated_text)
+            key = dedup_key(self.blocks[pos].text, self.dedup_min_chars) if self.dedup_min_chars is not None else None
+            if key is None:
+                continue
+            if reusable:
+                self._translated_by_key[key] = translated_text
+            elif self._first_by_key.get(key) == pos:
+                # Later repeats are translated on their own instead.
+                del self._first_by_key[key]
+
+    def _remember_batch(self, positions, result_data):
+        """
+        Stores a fully validated batch in the translation memory, under the
+        model that answered it; a batch answered by several models (through
+        --endpoints) is not stored.
+        """
+        if not self.memory or not result_data.get('validated') or len(result_data['translations']) != len(positions):
+            return
+        model = result_data.get('model', self.args.model)
+        if model is None:
+            return
+        pairs = [(self.blocks[pos].text, text) for pos, text in zip(positions, result_data['translations'])]
+        self.memory.store(pairs, self.args.input_lang, self.output_lang, model)
+        self.memory_stored += len(pairs)
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def finish(self, completed):
+        """
+        Closes the output file. A complete job without failures drops its
+        journal; otherwise the journal is kept for --resume.
+        """
+        if self.finished:
+            return
+        self.finished_at = time.monotonic()
+        self.completed = completed
+        if self._outfile:
+            self._outfile.close()
+        if not self.journal:
+            return
+        if completed and not self.failed_batches:
+            self.journal.discard()
+        else:
+            self.journal.close()
+            if self.failed_batches:
+                cprint(Colors.WARNING, f"\n{self.failed_batches} batch(es) of '{self.name}' failed. Re-run with --resume to retry only those.")
+            else:
+                cprint(Colors.WARNING, f"\nProgress on '{self.name}' saved to '{self.journal.path}'. Re-run with --resume to continue.")
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+Crash-safe job journal used to resume interrupted translations.
+
+The journal is a JSON-lines file next to the output. The first line
+identifies the job (a hash of the source SRT and of the settings that
+affect translations); every following line records one completed batch.
+Each record is flushed and fsync'ed before the batch counts as done, and
+a torn final line from a crash is simply ignored on load.
+"""
+
+import hashlib
+import json
+import os
+
+JOURNAL_VERSION = 1
+
+
+def file_sha256(path):
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_hash(settings):
+    """Hashes a dict of translation-affecting settings in a stable way."""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class JobJournal:
+    """
+    Records completed batches for one (source file, settings) job so a
+    later `--resume` run only dispatches what is still missing.
+    """
+    def __init__(self, path, source_hash, settings_digest):
+        self.path = path
+        self.header = {'version': JOURNAL_VERSION, 'source_sha256': source_hash, 'settings_sha256': settings_digest}
+        self._file = None
+
+    @classmethod
+    def for_output(cls, output_path, source_path, settings):
+        journal_path = output_path.with_name(output_path.name + '.journal')
+        return cls(journal_path, file_sha256(source_path), settings_hash(settings))
+
+    def load(self):
+        """
+        Reads an existing journal. Returns (translations_by_position,
+        input_tokens, output_tokens), or None if there is no journal or it
+        belongs to a different source file or settings.
+        """
+        if not self.path.is_file():
+            return None
+        translations = {}
+        input_tokens = output_tokens = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = iter(f)
+            try:
+                if json.loads(next(lines)) != self.header:
+                    return None
+            except (StopIteration, json.JSONDecodeError):
+                return None
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write from a crash can only affect the last line.
+                    break
+                translations.update(zip(record['positions'], record['translations']))
+                input_tokens += record['input_tokens']
+                output_tokens += record['output_tokens']
+        return translations, input_tokens, output_tokens
+
+    def start(self, keep_existing):
+        """
+        Opens the journal for appending. Unless `keep_existing` is set, any
+        previous journal is replaced by a fresh one for this job.
+        """
+        if not keep_existing or not self.path.is_file():
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(self.header) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, positions, translations, input_tokens, output_tokens):
+        """Durably appends one completed batch."""
+        record = {'positions': positions, 'translations': translations, 'input_tokens': input_tokens, 'output_tokens': output_tokens}
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Closes and deletes the journal once the job has completed."""
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
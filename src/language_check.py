@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+Checks that translated subtitles are in the target language.
+
+Validation is tiered. A Unicode-script histogram settles most cues on its
+own: Chinese vs Japanese vs Korean vs Latin-script text, untranslated
+source text in another script, and so on. Only cues whose script cannot
+tell the two languages apart (e.g. English -> French) go to the
+statistical detector, which is seeded so results are repeatable.
+"""
+
+from bisect import bisect_right
+import threading
+
+from .utils import cprint, Colors
+
+try:
+    from langdetect import DetectorFactory, detect_langs, LangDetectException
+    from langdetect.detector_factory import init_factory
+    # langdetect is randomized; a fixed seed makes its verdicts repeatable.
+    DetectorFactory.seed = 0
+    LANGDETECT_AVAILABLE = True
+except ImportError:
+    LANGDETECT_AVAILABLE = False
+
+# (first code point, script) for every range that starts a new script; None is "not a letter".
+_SCRIPT_RANGES = [
+    (0x0000, None), (0x0041, 'Latin'), (0x005B, None), (0x0061, 'Latin'), (0x007B, None),
+    (0x00C0, 'Latin'), (0x0250, None), (0x0370, 'Greek'), (0x0400, 'Cyrillic'), (0x0530, None),
+    (0x0590, 'Hebrew'), (0x0600, 'Arabic'), (0x0700, None), (0x0750, 'Arabic'), (0x0780, None),
+    (0x0900, 'Devanagari'), (0x0980, None), (0x0E00, 'Thai'), (0x0E80, None),
+    (0x1100, 'Hangul'), (0x1200, None), (0x1E00, 'Latin'), (0x1F00, 'Greek'), (0x2000, None),
+    (0x3040, 'Kana'), (0x3100, None), (0x3130, 'Hangul'), (0x3190, None), (0x31F0, 'Kana'), (0x3200, None),
+    (0x3400, 'Han'), (0x4DC0, None), (0x4E00, 'Han'), (0xA000, None), (0xAC00, 'Hangul'), (0xD7B0, None),
+    (0xF900, 'Han'), (0xFB00, None), (0xFF21, 'Latin'), (0xFF3B, None), (0xFF41, 'Latin'), (0xFF5B, None),
+    (0xFF66, 'Kana'), (0xFFA0, None), (0x20000, 'Han'), (0x32000, None),
+]
+_RANGE_STARTS = [start for start, _ in _SCRIPT_RANGES]
+_RANGE_SCRIPTS = [script for _, script in _SCRIPT_RANGES]
+
+# Scripts a language is written in, by base language code; anything else is Latin.
+_LANGUAGE_SCRIPTS = {
+    'zh': {'Han'},
+    'ja': {'Kana', 'Han'},
+    'ko': {'Hangul'},
+    'ru': {'Cyrillic'}, 'uk': {'Cyrillic'}, 'bg': {'Cyrillic'}, 'be': {'Cyrillic'},
+    'mk': {'Cyrillic'}, 'kk': {'Cyrillic'}, 'mn': {'Cyrillic'},
+    'el': {'Greek'},
+    'he': {'Hebrew'}, 'yi': {'Hebrew'},
+    'ar': {'Arabic'}, 'fa': {'Arabic'}, 'ur': {'Arabic'},
+    'hi': {'Devanagari'}, 'mr': {'Devanagari'}, 'ne': {'Devanagari'},
+    'th': {'Thai'},
+}
+
+# Up to this many letters in another script are not by themselves a failure:
+# names, brands and interjections are often left untranslated on purpose.
+SHORT_CUE_LETTERS = 12
+# The statistical detector is unreliable on less text than this.
+MIN_DETECT_LETTERS = 20
+
+PASS, FAIL, AMBIGUOUS = 'pass', 'fail', 'ambiguous'
+
+
+def script_histogram(text):
+    """Counts the letters of `text` per script."""
+    counts = {}
+    for ch in text:
+        code = ord(ch)
+        if code < 0x80:
+            if not ch.isalpha():
+                continue
+            script = 'Latin'
+        else:
+            script = _RANGE_SCRIPTS[bisect_right(_RANGE_STARTS, code) - 1]
+            if script is None:
+                continue
+        counts[script] = counts.get(script, 0) + 1
+    return counts
+
+
+def language_scripts(lang):
+    return _LANGUAGE_SCRIPTS.get(lang.split('-')[0].lower(), {'Latin'})
+
+
+class LanguageValidator:
+    """
+    Finds the translated cues that are not in the target language. Safe to
+    share between threads; the detector's language profiles are loaded once
+    when the validator is created.
+    """
+    def __init__(self, input_lang, debug=False):
+        self.input_lang = input_lang
+        self.input_scripts = language_scripts(input_lang)
+        self.debug = debug
+        self.cues_checked = 0
+        self.detector_calls = 0
+        self._lock = threading.Lock()
+        if LANGDETECT_AVAILABLE:
+            init_factory()
+
+    def classify(self, text, output_lang):
+        """Returns PASS, FAIL or AMBIGUOUS for one cue from its script histogram alone."""
+        counts = script_histogram(text)
+        letters = sum(counts.values())
+        if not letters:
+            return PASS
+        target_scripts = language_scripts(output_lang)
+        # Chinese never uses Kana, so any real amount of it means Japanese.
+        if target_scripts == {'Han'} and counts.get('Kana', 0) >= 2:
+            return FAIL
+        in_target = sum(counts.get(script, 0) for script in target_scripts)
+        if in_target * 2 >= letters:
+            if not target_scripts & self.input_scripts:
+                return PASS
+            # Japanese and Chinese share Han, but Kana is Japanese only.
+            if 'Kana' in target_scripts and counts.get('Kana'):
+                return PASS
+            return AMBIGUOUS
+        if letters - in_target > SHORT_CUE_LETTERS:
+            return FAIL
+        # A short aside (a name, a brand) inside a translated cue is fine;
+        # a short cue with no target-script letters at all may be untranslated.
+        return PASS if in_target else AMBIGUOUS
+
+    def failing_cues(self, texts, output_lang, batch_index):
+        """Returns the positions in `texts` that are not in `output_lang`."""
+        verdicts = [self.classify(text, output_lang) for text in texts]
+        with self._lock:
+            self.cues_checked += len(texts)
+        failing = [i for i, verdict in enumerate(verdicts) if verdict == FAIL]
+        ambiguous = [i for i, verdict in enumerate(verdicts) if verdict == AMBIGUOUS]
+        if self.debug and failing:
+            cprint(Colors.FAIL, f"Language validation: {len(failing)} subtitle(s) of Batch #{batch_index} are in the wrong script: {[i + 1 for i in failing]}")
+        if ambiguous and LANGDETECT_AVAILABLE:
+            failing += self._detect_failing([texts[i] for i in ambiguous], ambiguous, output_lang, batch_index)
+        return sorted(failing)
+
+    def _detect(self, text):
+        with self._lock:
+            self.detector_calls += 1
+        try:
+            return detect_langs(text)
+        except LangDetectException:
+            return []
+
+    def _is_target(self, results, output_lang):
+        """Applies the batch-level rules to a detector result; None means no verdict."""
+        if not results:
+            return None
+        top_lang = results[0].lang
+        # The model returned the original language.
+        if top_lang.startswith(self.input_lang):
+            return False
+        if top_lang.startswith(output_lang):
+            return True
+        # For CJK confusion, a 'zh' variant anywhere in the list is good enough.
+        if output_lang.startswith('zh') and top_lang in ['ko', 'ja']:
+            if {result.lang for result in results} & {'zh-cn', 'zh-tw'}:
+                return True
+        return False
+
+    def _detect_failing(self, texts, positions, output_lang, batch_index):
+        """
+        Runs the detector on the ambiguous cues together, and only if that
+        fails looks at them one by one to find the culprits.
+        """
+        combined_text = " ".join(texts).strip()
+        if len(combined_text) < MIN_DETECT_LETTERS:
+            return []
+        results = self._detect(combined_text)
+        verdict = self._is_target(results, output_lang)
+        if verdict is not False:
+            if self.debug: cprint(Colors.OKGREEN, f"Language validation PASSED for Batch #{batch_index} (Top Guess: '{results[0].lang if results else '?'}')")
+            return []
+        if self.debug:
+            cprint(Colors.FAIL, f"Language validation FAILED for Batch #{batch_index}! (Expected: '{output_lang}', Top Guess: '{results[0].lang}')")
+            cprint(Colors.FAIL, f"Full detection list: {results}")
+
+        failing = [pos for pos, text in zip(positions, texts)
+                   if len(text) >= MIN_DETECT_LETTERS and self._is_target(self._detect(text), output_lang) is False]
+        # If no single cue is long enough to blame, all of them are suspect.
+        return failing or list(positions)
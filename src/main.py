@@ -8,30 +8,86 @@ This is the main entry point for the v2str application. It orchestrates
 the process of transcription and translation based on user commands.
 """
 
+import asyncio
+import glob
+import os
+import queue
 import time
-from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
 
 from .cli import setup_arg_parser
 from .config import LANG_MAP
-from .srt_handler import parse_srt, write_srt_block
-from .transcription import run_whisper
+from .endpoints import load_endpoints
+from .job import TranslationJob
+from .metrics import MetricsRecorder
+from .scheduler import FairScheduler
+from .srt_handler import parse_srt
+from .transcription import TranscriptCache, TranscriptionFeed, run_transcription
 from .translation import Translator
+from .translation_memory import TranslationMemory
 from .utils import cprint, Colors, TQDM_AVAILABLE
 
 if TQDM_AVAILABLE:
     from tqdm import tqdm
 
+# Seconds between checks for new cues while a transcription is still running.
+INPUT_POLL_INTERVAL = 0.2
+# Seconds between checks for streamed subtitles while batches are in flight.
+STREAM_POLL_INTERVAL = 0.05
+
 class V2SrtProcessor:
     """
-    Orchestrates the transcription and translation workflow.
+    Orchestrates the transcription and translation workflow. A service
+    passes in its long-lived `translator` and `memory`, which the
+    processor then uses without closing them.
     """
-    def __init__(self, args):
+    def __init__(self, args, translator=None, memory=None):
         self.args = args
-        self.translator = Translator(args)
-        self.source_srt_path = None
-        self.translated_srt_path = None
+        self.owns_resources = translator is None
+        self.translator = translator or Translator(args)
+        self.memory = memory
+        if self.owns_resources and not args.no_cache:
+            self.memory = TranslationMemory.open(args.cache_path, args.cache_max_entries, args.cache_max_age_days)
+        # -ol takes one or more codes, separated by spaces or commas.
+        self.output_langs = list(dict.fromkeys(code for value in args.output_lang for code in value.split(',') if code))
+        self.jobs = []
+        # Per source, an --output-dir subdirectory that keeps same-named outputs apart.
+        self.output_dirs = {}
+        self.metrics = None
+        if args.metrics_out:
+            self.metrics = MetricsRecorder(args.metrics_out, self._metrics_settings())
+        self.transcription_feed = None
+        self.transcript_cache = None
+        self.transcript_key = None
         self.total_input_tokens = 0
         self.total_output_tokens = 0
+        # Per prompt strategy: batches, subtitles, answered requests, tokens and unvalidated batches.
+        self.prompt_stats = {}
+        # (job, Future or task) of hedged requests that lost their race but still bill tokens.
+        self.hedge_losers = []
+
+    def _metrics_settings(self):
+        """The settings recorded at the start of each run in the --metrics-out file."""
+        args = self.args
+        return {
+            'model': args.model,
+            'input_lang': args.input_lang,
+            'output_langs': self.output_langs,
+            'batching': args.batching,
+            'batch_size': args.batch_size,
+            'max_batch_tokens': args.max_batch_tokens,
+            'concurrency': args.concurrency,
+            'adaptive_concurrency': args.adaptive_concurrency,
+            'engine': args.engine,
+            'response_format': args.response_format,
+            'stream': args.stream,
+            'prompt': self.translator.prompt_label,
+            'whisper_model': args.whisper_model,
+            'whisper_backend': args.whisper_backend,
+            'whisper_workers': args.whisper_workers,
+        }
 
     def run(self):
         """
@@ -39,107 +95,358 @@ class V2SrtProcessor:
         """
         cprint(Colors.BOLD, "Starting v2str process...")
         
-        if not self._determine_paths():
+        try:
+            self._run()
+        finally:
+            if self.metrics:
+                self.metrics.close(self.translator.endpoints)
+                cprint(Colors.INFO, f"Metrics written to '{self.metrics.jsonl_path}' and '{self.metrics.prom_path}'.")
+
+    def _run(self):
+        sources = self._determine_paths()
+        if not sources:
             return
 
-        cprint(Colors.INFO, f"\nSource SRT: '{self.source_srt_path}'")
-        cprint(Colors.INFO, f"Translated output: '{self.translated_srt_path}'")
-        
-        all_blocks = parse_srt(self.source_srt_path)
-        if not all_blocks:
+        multiple_files = len(sources) > 1
+        multiple_langs = len(self.output_langs) > 1
+        models = self.translator.endpoints.models(self.args.model)
+        for source_srt_path in sources:
+            cprint(Colors.INFO, f"\nSource SRT: '{source_srt_path}'")
+            translated_paths = {lang: self._translated_path(source_srt_path, lang) for lang in self.output_langs}
+            for translated_srt_path in translated_paths.values():
+                cprint(Colors.INFO, f"Translated output: '{translated_srt_path}'")
+            # Parsed once and shared by the jobs for every target language.
+            feed = self.transcription_feed
+            all_blocks = None if feed else parse_srt(source_srt_path)
+            if not feed and not all_blocks:
+                cprint(Colors.FAIL, f"No subtitle blocks found in '{source_srt_path}'. Skipping.")
+                continue
+            for lang, translated_srt_path in translated_paths.items():
+                label_parts = ([source_srt_path.name] if multiple_files else []) + ([lang] if multiple_langs else [])
+                label = "/".join(label_parts) or None
+                self.jobs.append(TranslationJob(source_srt_path, translated_srt_path, lang, all_blocks, self.args, self.memory, label, feed, models))
+        if not self.jobs:
             cprint(Colors.FAIL, "No subtitle blocks found in the source file. Exiting.")
             return
 
-        self._translate_and_write_srt(all_blocks)
+        try:
+            if self.transcription_feed:
+                self.transcription_feed.start()
+            self._translate_and_write_srt(self.jobs)
+        finally:
+            if self.owns_resources:
+                self.translator.close()
+                if self.memory:
+                    self.memory.close()
+
+        if self.transcription_feed and not self.transcription_feed.srt_path:
+            cprint(Colors.FAIL, f"\nWhisper failed; only the {len(self.transcription_feed.cues)} segment(s) transcribed before the failure were translated.")
+        elif self.transcription_feed and self.transcript_cache:
+            self.transcript_cache.store(self.transcript_key, self.transcription_feed.srt_path)
+        if self.transcription_feed and self.metrics:
+            self.metrics.record_transcription(self.transcription_feed.input_file, self.args.whisper_backend, 1, self.transcription_feed.elapsed)
         
-        cprint(Colors.OKGREEN, f"\n{Colors.BOLD}Batch SRT translation complete. Output saved to '{self.translated_srt_path}'")
+        if len(self.jobs) > 1:
+            cprint(Colors.OKGREEN, f"\n{Colors.BOLD}Batch SRT translation complete. {len(self.jobs)} translated file(s) written.")
+        else:
+            cprint(Colors.OKGREEN, f"\n{Colors.BOLD}Batch SRT translation complete. Output saved to '{self.jobs[0].output_path}'")
         
         self._print_token_summary()
+        if len(self.jobs) > 1:
+            self._print_file_summary()
+        self._print_dedup_summary()
+        self._print_cache_summary()
+        self._print_endpoint_summary()
 
     def _determine_paths(self):
         """
-        Determines the source and destination paths for SRT files.
+        Determines the source SRT paths.
         If input is a media file, it runs transcription first.
         """
         media_file = self.args.input_video or self.args.input_audio
 
         if self.args.input_srt:
-            if not self.args.input_srt.is_file():
-                cprint(Colors.FAIL, f"Error: Input SRT file not found at '{self.args.input_srt}'")
-                return False
-            self.source_srt_path = self.args.input_srt
+            source_paths = self._expand_srt_inputs(self.args.input_srt)
+            if not source_paths:
+                return []
         elif media_file:
             if not media_file.is_file():
                 cprint(Colors.FAIL, f"Error: Input media file not found at '{media_file}'")
-                return False
+                return []
             
             output_srt_path = self.args.output_srt or media_file.with_suffix('.srt')
-            self.source_srt_path = run_whisper(
-                media_file, 
-                output_srt_path, 
-                self.args.whisper_model, 
-                self.args.input_lang,
-                self.args.debug
-            )
-            if not self.source_srt_path:
-                cprint(Colors.FAIL, "Exiting due to Whisper failure.")
-                return False
-        
-        self.translated_srt_path = self.args.output_translated or \
-            self.source_srt_path.with_suffix(f'.tr{self.source_srt_path.suffix}')
-            
-        return True
+            if not self.args.no_transcript_cache:
+                self.transcript_cache = TranscriptCache(self.args.transcript_cache_dir)
+                self.transcript_key = TranscriptCache.key(media_file, self.args.whisper_model, self.args.input_lang)
+            if self.transcript_cache and self.transcript_cache.fetch(self.transcript_key, output_srt_path):
+                cprint(Colors.INFO, f"\nReusing cached transcript of '{media_file}' ({self.args.whisper_model}, {self.args.input_lang}): '{output_srt_path}'")
+                source_srt_path = output_srt_path
+                if self.metrics:
+                    self.metrics.record_transcription(media_file, self.args.whisper_backend, self.args.whisper_workers, 0.0, cached=True)
+            elif self.args.pipeline:
+                # Segments are translated while Whisper is still running.
+                if self.args.resume:
+                    cprint(Colors.WARNING, "Warning: --resume is not available with --pipeline; translating from the start.")
+                if self.args.whisper_backend == 'python':
+                    cprint(Colors.WARNING, "Warning: --whisper-backend python reports no segments until the whole file is transcribed, so --pipeline cannot overlap transcription and translation; use --whisper-backend cli.")
+                self.transcription_feed = TranscriptionFeed(media_file, output_srt_path, self.args.whisper_model, self.args.input_lang, self.args.debug, self.args.whisper_backend)
+                source_paths = [output_srt_path]
+            else:
+                transcription_started = time.monotonic()
+                source_srt_path = run_transcription(
+                    media_file,
+                    output_srt_path,
+                    self.args.whisper_model,
+                    self.args.input_lang,
+                    self.args.whisper_backend,
+                    self.args.whisper_workers,
+                    self.args.debug
+                )
+                if self.metrics:
+                    self.metrics.record_transcription(media_file, self.args.whisper_backend, self.args.whisper_workers, time.monotonic() - transcription_started)
+                if source_srt_path and self.transcript_cache:
+                    self.transcript_cache.store(self.transcript_key, source_srt_path)
+            if not self.transcription_feed:
+                if not source_srt_path:
+                    cprint(Colors.FAIL, "Exiting due to Whisper failure.")
+                    return []
+                source_paths = [source_srt_path]
+
+        if self.args.output_translated and (len(source_paths) > 1 or len(self.output_langs) > 1):
+            cprint(Colors.FAIL, "Error: -ot/--output-translated names a single file; use --output-dir with several inputs or target languages.")
+            return []
+        if self.args.output_dir:
+            self.output_dirs = self._output_dirs(source_paths)
+            for directory in {self.args.output_dir, *self.output_dirs.values()}:
+                directory.mkdir(parents=True, exist_ok=True)
+        return source_paths
+
+    def _output_dirs(self, source_paths):
+        """
+        With --output-dir, the directories of sources that share a file name
+        (such as 'a/ep.srt' and 'b/ep.srt'): they keep their directory
+        relative to the sources' common parent, so their outputs and
+        journals do not collide. Other sources are written to --output-dir.
+        """
+        names = Counter(path.name for path in source_paths)
+        clashing = [path for path in source_paths if names[path.name] > 1]
+        if not clashing:
+            return {}
+        root = Path(os.path.commonpath([path.resolve().parent for path in clashing]))
+        return {path: self.args.output_dir / path.resolve().parent.relative_to(root) for path in clashing}
 
-    def _translate_and_write_srt(self, all_blocks):
+    def _expand_srt_inputs(self, inputs):
         """
-        Manages the batching, concurrent translation, and writing of results.
+        Expands the -i arguments (files, directories and glob patterns) into
+        a de-duplicated list of SRT files. Directories and patterns leave out
+        previous translated outputs (*.tr.srt, *.<lang>.srt); files named
+        explicitly are always taken.
+        """
+        output_suffixes = tuple(f'.{suffix}' for suffix in ['tr'] + self.output_langs)
+        paths = []
+        for item in inputs:
+            if item.is_dir():
+                matches = [path for path in sorted(item.glob('*.srt')) if not path.stem.endswith(output_suffixes)]
+            elif item.is_file():
+                matches = [item]
+            else:
+                # Patterns may reach us unexpanded (quoted, or on Windows).
+                matches = [Path(match) for match in sorted(glob.glob(str(item)))
+                           if Path(match).is_file() and not Path(match).stem.endswith(output_suffixes)]
+            if not matches:
+                cprint(Colors.FAIL, f"Error: No SRT files found at '{item}'")
+                return []
+            paths.extend(matches)
+        seen = set()
+        return [path for path in paths if not (path.resolve() in seen or seen.add(path.resolve()))]
+
+    def _translated_path(self, source_srt_path, output_lang):
+        """Output path for one target: '<name>.tr.srt', or '<name>.<lang>.srt' with several targets."""
+        if self.args.output_translated:
+            return self.args.output_translated
+        tag = output_lang if len(self.output_langs) > 1 else 'tr'
+        translated_name = source_srt_path.with_suffix(f'.{tag}{source_srt_path.suffix}').name
+        if self.args.output_dir:
+            return self.output_dirs.get(source_srt_path, self.args.output_dir) / translated_name
+        return source_srt_path.with_name(translated_name)
+
+    def _translate_and_write_srt(self, jobs):
+        """
+        Manages the batching, concurrent translation, and writing of results
+        for every job through one shared worker pool.
         """
         from_lang_name = LANG_MAP.get(self.args.input_lang, self.args.input_lang)
-        to_lang_name = LANG_MAP.get(self.args.output_lang, self.args.output_lang)
-        cprint(Colors.INFO, f"\nTranslating {len(all_blocks)} subtitles from {from_lang_name} to {to_lang_name}...")
-        cprint(Colors.INFO, f"Using model '{self.args.model}' with a concurrency of {self.args.concurrency}.")
+        to_lang_names = ", ".join(LANG_MAP.get(lang, lang) for lang in self.output_langs)
+        source_count = len({job.source_path for job in jobs})
+        total_subtitles = sum(len(job.blocks) for job in jobs) // len(self.output_langs)
+        files_info = f" in {source_count} files" if source_count > 1 else ""
+        if self.transcription_feed:
+            cprint(Colors.INFO, f"\nTranslating subtitles from {from_lang_name} to {to_lang_names} as Whisper transcribes them...")
+        else:
+            cprint(Colors.INFO, f"\nTranslating {total_subtitles} subtitles{files_info} from {from_lang_name} to {to_lang_names}...")
+        cprint(Colors.INFO, f"Using model '{self.args.model}' with a concurrency of {self.args.concurrency} ({self.args.engine} engine).")
 
-        batches = [all_blocks[i:i + self.args.batch_size] for i in range(0, len(all_blocks), self.args.batch_size)]
-        text_batches_with_indices = [(i + 1, [block['text'] for block in batch]) for i, batch in enumerate(batches)]
+        for job in jobs:
+            job.prepare()
+            self.total_input_tokens += job.input_tokens
+            self.total_output_tokens += job.output_tokens
+        total_batches = sum(len(job.batches) for job in jobs)
         
         progress_bar = None
-        if TQDM_AVAILABLE:
-            progress_bar = tqdm(total=len(batches), desc="Translating Batches", unit="batch")
-
-        with open(self.translated_srt_path, 'w', encoding='utf-8') as outfile:
-            with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
-                future_translations = executor.map(self.translator.translate_batch, text_batches_with_indices)
-                
-                for i, result_data in enumerate(future_translations):
-                    translated_texts = result_data['translations']
-                    self.total_input_tokens += result_data['input_tokens']
-                    self.total_output_tokens += result_data['output_tokens']
-                    
-                    original_batch_blocks = batches[i]
-                    
-                    if len(translated_texts) == len(original_batch_blocks):
-                        for block, translated_text in zip(original_batch_blocks, translated_texts):
-                            write_srt_block(outfile, block, translated_text)
-                    else:
-                        cprint(Colors.FAIL, "Error: Mismatch in batch sizes. Writing error messages.")
-                        for block in original_batch_blocks:
-                            write_srt_block(outfile, block, f"---TRANSLATION_ERROR---\n{block['text']}")
-                    
-                    outfile.flush()
-                    
-                    token_info = f" | Tokens (In: {result_data['input_tokens']:,}, Out: {result_data['output_tokens']:,})"
-                    
-                    if progress_bar:
-                        progress_bar.set_postfix_str(token_info)
-                        progress_bar.update(1)
-                    else:
-                        cprint(Colors.INFO, f"Completed batch {i+1}/{len(batches)}{token_info}")
-
-                    # A small delay might still be useful in concurrent mode to avoid overwhelming APIs
-                    time.sleep(0.1)
+        # A service runs several jobs at once; their bars would garble its log.
+        if TQDM_AVAILABLE and self.owns_resources:
+            # The number of batches is unknown while a transcription is still running.
+            progress_bar = tqdm(total=None if self.transcription_feed else total_batches, desc="Translating Batches", unit="batch")
+
+        # Results may finish out of order; at most `window` batches are in
+        # flight, and per file at most `window` past its first unwritten one,
+        # which bounds buffered results.
+        window = max(self.args.reorder_window, self.args.concurrency)
+
+        def on_partial(job, i, k, translated_text):
+            job.on_partial(i, k, translated_text)
+
+        def on_result(job, i, result_data, submitted):
+            self.hedge_losers.extend((job, loser) for loser in result_data['metrics']['hedge_losers'])
+            self._record_batch_result(job, i, result_data, progress_bar)
+            write_started = time.monotonic()
+            job.on_result(i, result_data)
+            if self.metrics:
+                self.metrics.record_batch(job, i, result_data, result_data['metrics']['started'] - submitted, time.monotonic() - write_started)
+
+        try:
+            for job in jobs:
+                job.open()
+            scheduler = FairScheduler(jobs, window)
+            if self.args.engine == 'async':
+                asyncio.run(self._translate_async(scheduler, on_result, on_partial))
+            else:
+                self._translate_threaded(scheduler, on_result, on_partial)
+            self._count_hedge_losers()
+        finally:
+            if progress_bar:
+                progress_bar.close()
+            # Anything still open was interrupted; its journal is kept for --resume.
+            for job in jobs:
+                job.finish(False)
+
+    def _translate_threaded(self, scheduler, on_result, on_partial):
+        """
+        Thread engine: batches run on a thread pool and are handed to
+        `on_result` in completion order. Streamed subtitles are queued by
+        the workers and handed to `on_partial` from this thread.
+        """
+        partials = queue.SimpleQueue()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            pending = {}
+            try:
+                while True:
+                    item = scheduler.next_batch()
+                    while item is not None:
+                        job, i, indexed_batch = item
+                        on_cue = (lambda k, text, job=job, i=i: partials.put((job, i, k, text))) if self.args.stream else None
+                        future = executor.submit(self.translator.translate_batch, indexed_batch, job.output_lang, on_cue)
+                        pending[future] = (job, i, time.monotonic())
+                        item = scheduler.next_batch()
+                    if not pending:
+                        if not scheduler.waiting_for_input:
+                            break
+                        time.sleep(INPUT_POLL_INTERVAL)
+                        continue
+
+                    timeout = INPUT_POLL_INTERVAL if scheduler.waiting_for_input else None
+                    if self.args.stream:
+                        timeout = STREAM_POLL_INTERVAL
+                    done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    while not partials.empty():
+                        on_partial(*partials.get())
+                    for future in done:
+                        job, i, submitted = pending.pop(future)
+                        scheduler.batch_done()
+                        on_result(job, i, future.result(), submitted)
+            finally:
+                for future in pending:
+                    future.cancel()
+        wait([loser for _, loser in self.hedge_losers])
+
+    async def _translate_async(self, scheduler, on_result, on_partial):
+        """
+        Async engine: every batch is a task, a semaphore bounds how many are
+        talking to the API at once, and results are handed to `on_result`
+        in completion order; streamed subtitles go to `on_partial` as they
+        arrive.
+        """
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def translate(job, i, indexed_batch):
+            on_cue = (lambda k, text: on_partial(job, i, k, text)) if self.args.stream else None
+            async with semaphore:
+                return await self.translator.translate_batch_async(indexed_batch, job.output_lang, on_cue)
+
+        pending = {}
+        try:
+            while True:
+                item = scheduler.next_batch()
+                while item is not None:
+                    job, i, indexed_batch = item
+                    task = asyncio.create_task(translate(job, i, indexed_batch))
+                    pending[task] = (job, i, time.monotonic())
+                    item = scheduler.next_batch()
+                if not pending:
+                    if not scheduler.waiting_for_input:
+                        break
+                    await asyncio.sleep(INPUT_POLL_INTERVAL)
+                    continue
+
+                timeout = INPUT_POLL_INTERVAL if scheduler.waiting_for_input else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    job, i, submitted = pending.pop(task)
+                    scheduler.batch_done()
+                    on_result(job, i, task.result(), submitted)
+            # Losing hedged requests are tasks of this loop; they are counted once they are done.
+            if self.hedge_losers:
+                await asyncio.wait([loser for _, loser in self.hedge_losers])
+        finally:
+            for task in pending:
+                task.cancel()
+            self.translator.async_http.close()
+
+    def _count_hedge_losers(self):
+        """Adds the tokens billed for hedged requests that lost their race to their job and the run totals."""
+        for job, loser in self.hedge_losers:
+            if loser.cancelled() or loser.exception() is not None or not isinstance(loser.result(), dict):
+                continue
+            usage = loser.result().get('usage') or {}
+            input_tokens, output_tokens = usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+            job.add_tokens(input_tokens, output_tokens)
+            self.total_input_tokens += input_tokens
+            self.total_output_tokens += output_tokens
+            if self.metrics:
+                self.metrics.record_hedge_loser(job, input_tokens, output_tokens)
+        self.hedge_losers = []
+
+    def _record_batch_result(self, job, i, result_data, progress_bar):
+        """Records token usage and progress for a finished batch, in completion order."""
+        self.total_input_tokens += result_data['input_tokens']
+        self.total_output_tokens += result_data['output_tokens']
+        stats = self.prompt_stats.setdefault(self.translator.prompt_label, {'batches': 0, 'cues': 0, 'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'unvalidated': 0})
+        stats['batches'] += 1
+        stats['cues'] += len(result_data['translations'])
+        stats['requests'] += result_data['requests']
+        stats['input_tokens'] += result_data['input_tokens']
+        stats['output_tokens'] += result_data['output_tokens']
+        stats['unvalidated'] += not result_data['validated']
+        
+        token_info = f" | Tokens (In: {result_data['input_tokens']:,}, Out: {result_data['output_tokens']:,})"
         
         if progress_bar:
-            progress_bar.close()
+            progress_bar.set_postfix_str(token_info)
+            progress_bar.update(1)
+        else:
+            file_info = f" of '{job.name}'" if job.label else ""
+            total_batches = len(job.batches) if job.input_complete else "?"
+            cprint(Colors.INFO, f"Completed batch {i+1}/{total_batches}{file_info}{token_info}")
 
     def _print_token_summary(self):
         """Prints the total token usage for the session."""
@@ -148,6 +455,53 @@ class V2SrtProcessor:
         cprint(Colors.INFO, f"  Input:   {self.total_input_tokens:,} tokens")
         cprint(Colors.INFO, f"  Output:  {self.total_output_tokens:,} tokens")
         cprint(Colors.BOLD, f"  Total:   {total_tokens:,} tokens")
+        for name, stats in self.prompt_stats.items():
+            per_cue = stats['input_tokens'] / stats['cues'] if stats['cues'] else 0
+            cprint(Colors.INFO, f"  Prompt '{name}': {stats['input_tokens']:,} input tokens for {stats['cues']:,} subtitles ({per_cue:.1f}/subtitle), "
+                                f"{stats['requests']:,} requests for {stats['batches']:,} batches, {stats['unvalidated']:,} unvalidated")
+
+    def _print_file_summary(self):
+        """Prints tokens and wall time per translated file."""
+        cprint(Colors.OKGREEN, f"{Colors.BOLD}Per-File Summary:")
+        for job in self.jobs:
+            status = "" if job.completed and not job.failed_batches else " (incomplete)"
+            cprint(Colors.INFO, f"  {job.name}: {len(job.blocks):,} subtitles, {len(job.batches):,} batches, "
+                                f"{job.input_tokens:,} in / {job.output_tokens:,} out tokens, {job.elapsed:.1f}s{status}")
+
+    def _print_dedup_summary(self):
+        """Prints how many subtitles reused the translation of an identical line in the same file."""
+        if self.args.no_dedup:
+            return
+        total = sum(len(job.blocks) for job in self.jobs)
+        deduplicated = sum(job.deduplicated for job in self.jobs)
+        ratio = deduplicated / total if total else 0.0
+        cprint(Colors.OKGREEN, f"{Colors.BOLD}Deduplication:")
+        cprint(Colors.INFO, f"  Repeated: {deduplicated:,} of {total:,} subtitles ({ratio:.1%}) reused a translation from the same file")
+
+    def _print_cache_summary(self):
+        """Prints translation memory statistics for this run's jobs."""
+        if not self.memory:
+            return
+        hits = sum(job.memory_hits for job in self.jobs)
+        misses = sum(job.memory_misses for job in self.jobs)
+        stored = sum(job.memory_stored for job in self.jobs)
+        hit_rate = hits / (hits + misses) if hits + misses else 0.0
+        cprint(Colors.OKGREEN, f"{Colors.BOLD}Translation Memory ('{self.memory.path}'):")
+        cprint(Colors.INFO, f"  Hits:    {hits:,} ({hit_rate:.1%})")
+        cprint(Colors.INFO, f"  Misses:  {misses:,}")
+        cprint(Colors.INFO, f"  Stored:  {stored:,}")
+
+    def _print_endpoint_summary(self):
+        """Prints requests and tokens per endpoint when there is more than one or requests are hedged."""
+        endpoints = self.translator.endpoints
+        if len(endpoints) < 2 and not self.args.hedge_percentile:
+            return
+        cprint(Colors.OKGREEN, f"{Colors.BOLD}Endpoints:")
+        for stats in endpoints.summary():
+            latency = f", {stats['latency']:.2f}s latency" if stats['latency'] is not None else ""
+            hedges = f", {stats['hedges']:,} hedges ({stats['hedges_won']:,} won)" if stats['hedges'] else ""
+            cprint(Colors.INFO, f"  {stats['name']}: {stats['requests']:,} requests, {stats['failures']:,} failed, {stats['ejections']:,} ejections, "
+                                f"{stats['input_tokens']:,} in / {stats['output_tokens']:,} out tokens{latency}{hedges}")
 
 def main():
     """
@@ -156,9 +510,24 @@ def main():
     parser = setup_arg_parser()
     args = parser.parse_args()
 
-    if not args.api_key:
+    if not args.api_key and not args.endpoints:
         cprint(Colors.FAIL, "Error: API key not provided. Use -k/--api-key or set XAI_API_KEY env var.")
         exit(1)
+    if args.whisper_workers > 1 and args.whisper_backend == 'python':
+        cprint(Colors.WARNING, "Warning: --whisper-workers transcribes chunks with Whisper CLI processes; --whisper-backend python is not used.")
+    if not 0 <= args.hedge_percentile < 100:
+        cprint(Colors.FAIL, "Error: --hedge-percentile must be between 0 and 100.")
+        exit(1)
+    if args.endpoints:
+        try:
+            load_endpoints(args.endpoints, args.api_key)
+        except ValueError as e:
+            cprint(Colors.FAIL, f"Error: {e}")
+            exit(1)
+
+    if args.serve:
+        from .service import serve
+        exit(serve(args))
 
     try:
         processor = V2SrtProcessor(args)
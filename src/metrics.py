@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+Machine-readable run metrics, written with --metrics-out.
+
+Every finished batch is appended to a JSON-lines file as it completes,
+between a 'run_start' line (the settings that affect throughput) and a
+'run_end' line (the totals), so runs with different batch sizes or
+concurrency can be compared afterwards. At the end of a run the totals
+are also written as a Prometheus textfile (for node_exporter's textfile
+collector), replaced atomically so a scrape never sees half a file.
+"""
+
+import json
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency and wait histogram buckets.
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+RETRY_CAUSES = ('network', 'rate_limit', 'separator', 'language')
+
+
+class Histogram:
+    """A cumulative histogram in the Prometheus sense: counts per upper bound, plus sum and count."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def prometheus_lines(self, name):
+        lines = [f'{name}_bucket{{le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum {self.sum:.6f}')
+        lines.append(f'{name}_count {self.count}')
+        return lines
+
+
+class MetricsRecorder:
+    """
+    Collects per-batch and transcription metrics for one run. `path` is
+    the --metrics-out value; the JSON lines go to '<path>.jsonl' and the
+    Prometheus textfile to '<path>.prom' (an existing suffix is replaced).
+    """
+    def __init__(self, path, settings):
+        self.jsonl_path = path.with_suffix('.jsonl')
+        self.prom_path = path.with_suffix('.prom')
+        self.started_at = time.monotonic()
+        self.totals = {'batches': 0, 'subtitles': 0, 'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'unvalidated_batches': 0,
+                       'failed_batches': 0, 'stream_aborts': 0, 'hedged_requests': 0, 'throttle_seconds': 0.0, 'backoff_seconds': 0.0, 'validation_seconds': 0.0, 'write_seconds': 0.0}
+        self.retries = dict.fromkeys(RETRY_CAUSES, 0)
+        self.request_latency = Histogram()
+        self.queue_wait = Histogram()
+        self.batch_duration = Histogram()
+        self.transcription_seconds = None
+        self._lock = threading.Lock()
+        self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        # Appended to, so one file can hold a series of runs to compare.
+        self._file = open(self.jsonl_path, 'a', encoding='utf-8')
+        self._emit({'event': 'run_start', **settings})
+
+    def _emit(self, record):
+        record = {'time': round(time.time(), 3), **record}
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def record_batch(self, job, batch_number, result_data, queue_wait, write_seconds):
+        """Records one finished batch; `result_data['metrics']` comes from the translator."""
+        metrics = result_data['metrics']
+        duration = metrics['finished'] - metrics['started']
+        retries = {cause: metrics[f'{cause}_retries'] for cause in RETRY_CAUSES}
+        record = {
+            'event': 'batch',
+            'file': job.name,
+            'output_lang': job.output_lang,
+            'batch': batch_number + 1,
+            'subtitles': len(result_data['translations']),
+            'requests': result_data['requests'],
+            'input_tokens': result_data['input_tokens'],
+            'output_tokens': result_data['output_tokens'],
+            'validated': result_data['validated'],
+            'failed': result_data.get('failed', False),
+            'queue_wait': round(queue_wait, 4),
+            'duration': round(duration, 4),
+            'request_latencies': [round(latency, 4) for latency in metrics['latencies']],
+            'throttle_seconds': round(metrics['throttle_seconds'], 4),
+            'backoff_seconds': round(metrics['backoff_seconds'], 4),
+            'validation_seconds': round(metrics['validation_seconds'], 4),
+            'write_seconds': round(write_seconds, 4),
+            'retries': retries,
+            'stream_aborts': metrics['stream_aborts'],
+            'hedged_requests': metrics['hedged_requests'],
+        }
+        with self._lock:
+            totals = self.totals
+            totals['batches'] += 1
+            totals['subtitles'] += record['subtitles']
+            totals['requests'] += record['requests']
+            totals['input_tokens'] += record['input_tokens']
+            totals['output_tokens'] += record['output_tokens']
+            totals['unvalidated_batches'] += not record['validated']
+            totals['failed_batches'] += bool(record['failed'])
+            totals['stream_aborts'] += metrics['stream_aborts']
+            totals['hedged_requests'] += metrics['hedged_requests']
+            totals['throttle_seconds'] += metrics['throttle_seconds']
+            totals['backoff_seconds'] += metrics['backoff_seconds']
+            totals['validation_seconds'] += metrics['validation_seconds']
+            totals['write_seconds'] += write_seconds
+            for cause, count in retries.items():
+                self.retries[cause] += count
+            for latency in metrics['latencies']:
+                self.request_latency.observe(latency)
+            self.queue_wait.observe(queue_wait)
+            self.batch_duration.observe(duration)
+        self._emit(record)
+
+    def record_hedge_loser(self, job, input_tokens, output_tokens):
+        """Records the tokens of a hedged request whose reply was not used; they count toward the totals."""
+        with self._lock:
+            self.totals['input_tokens'] += input_tokens
+            self.totals['output_tokens'] += output_tokens
+        self._emit({'event': 'hedge_loser', 'file': job.name, 'output_lang': job.output_lang,
+                    'input_tokens': input_tokens, 'output_tokens': output_tokens})
+
+    def record_transcription(self, media_file, backend, workers, seconds, cached=False):
+        self.transcription_seconds = seconds
+        self._emit({'event': 'transcription', 'media': str(media_file), 'backend': backend, 'workers': workers,
+                    'seconds': round(seconds, 3), 'cached': cached})
+
+    def close(self, endpoints=None):
+        """
+        Writes the run totals to both outputs, with the request and token
+        counts of each endpoint in the translator's `endpoints` pool.
+        """
+        elapsed = time.monotonic() - self.started_at
+        endpoint_stats = endpoints.summary() if endpoints else []
+        self._emit({'event': 'run_end', 'seconds': round(elapsed, 3), 'transcription_seconds': self.transcription_seconds,
+                    **{key: round(value, 4) if isinstance(value, float) else value for key, value in self.totals.items()},
+                    'retries': self.retries, 'endpoints': endpoint_stats})
+        self._file.close()
+        self._write_prometheus(elapsed, endpoint_stats)
+
+    def _write_prometheus(self, elapsed, endpoint_stats):
+        totals = self.totals
+        lines = [
+            '# HELP v2srt_run_seconds Wall time of the last run.',
+            '# TYPE v2srt_run_seconds gauge',
+            f'v2srt_run_seconds {elapsed:.3f}',
+            '# HELP v2srt_last_run_timestamp_seconds Unix time the last run finished.',
+            '# TYPE v2srt_last_run_timestamp_seconds gauge',
+            f'v2srt_last_run_timestamp_seconds {time.time():.0f}',
+            '# HELP v2srt_subtitles_per_second Translated subtitles per second of run wall time.',
+            '# TYPE v2srt_subtitles_per_second gauge',
+            f'v2srt_subtitles_per_second {totals["subtitles"] / elapsed if elapsed else 0:.3f}',
+        ]
+        for key in ('batches', 'subtitles', 'requests', 'unvalidated_batches', 'failed_batches', 'stream_aborts', 'hedged_requests'):
+            lines += [f'# TYPE v2srt_{key}_total counter', f'v2srt_{key}_total {totals[key]}']
+        lines += ['# HELP v2srt_tokens_total Tokens reported by the API.', '# TYPE v2srt_tokens_total counter',
+                  f'v2srt_tokens_total{{direction="input"}} {totals["input_tokens"]}',
+                  f'v2srt_tokens_total{{direction="output"}} {totals["output_tokens"]}']
+        lines += ['# HELP v2srt_retries_total Retried requests by cause.', '# TYPE v2srt_retries_total counter']
+        lines += [f'v2srt_retries_total{{cause="{cause}"}} {count}' for cause, count in self.retries.items()]
+        for key, help_text in (('throttle_seconds', 'Time requests waited for the rate limiter or concurrency limit.'),
+                               ('backoff_seconds', 'Time spent sleeping before retries.'),
+                               ('validation_seconds', 'Time spent validating the output language.'),
+                               ('write_seconds', 'Time spent journaling and writing results.')):
+            lines += [f'# HELP v2srt_{key}_total {help_text}', f'# TYPE v2srt_{key}_total counter', f'v2srt_{key}_total {totals[key]:.6f}']
+        for key, help_text in (('requests', 'Requests sent to each endpoint, hedged duplicates included.'),
+                               ('failures', 'Requests to each endpoint that failed with a network error, 429 or 5xx.'),
+                               ('ejections', 'Times each endpoint was ejected for failing.'),
+                               ('input_tokens', 'Input tokens reported by each endpoint.'),
+                               ('output_tokens', 'Output tokens reported by each endpoint.'),
+                               ('hedges_won', 'Hedged duplicates sent to each endpoint that answered first.')):
+            if endpoint_stats:
+                lines += [f'# HELP v2srt_endpoint_{key}_total {help_text}', f'# TYPE v2srt_endpoint_{key}_total counter']
+                lines += [f'v2srt_endpoint_{key}_total{{endpoint="{stats["name"]}"}} {stats[key]}' for stats in endpoint_stats]
+        if self.transcription_seconds is not None:
+            lines += ['# HELP v2srt_transcription_seconds Wall time of the transcription.', '# TYPE v2srt_transcription_seconds gauge',
+                      f'v2srt_transcription_seconds {self.transcription_seconds:.3f}']
+        for name, histogram, help_text in (('v2srt_request_latency_seconds', self.request_latency, 'API request latency.'),
+                                           ('v2srt_batch_queue_wait_seconds', self.queue_wait, 'Time from dispatch until a worker picked the batch up.'),
+                                           ('v2srt_batch_duration_seconds', self.batch_duration, 'Time to translate a batch, retries included.')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram'] + histogram.prometheus_lines(name)
+
+        tmp_path = self.prom_path.with_name(self.prom_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.prom_path)
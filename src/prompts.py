@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Prompt strategies for separator-formatted translation requests, plus the
+prompt used by the JSON response format.
+
+A strategy is a function (text_batch, separator, from_lang, to_lang,
+retry_reason) -> prompt, where retry_reason is None for a first attempt,
+'language' after a language-validation failure and 'format' after a
+separator mismatch.
+
+'template' sends every batch twice, as plain lines and as a
+separator-joined template to copy; 'compact' sends each subtitle exactly
+once, already separator-joined, which roughly halves input tokens.
+"""
+
+import json
+
+_COMMON_RULES = "Your task is to translate a list of subtitles and format the output precisely. Do not add any extra explanations, introductory text, or markdown."
+
+
+def template_prompt(text_batch, separator, from_lang, to_lang, retry_reason=None):
+    """The original two-step prompt: translate the lines, then fill in the separator template."""
+    clean_text_to_translate = "\n".join(text_batch)
+    structure_template = f" {separator} ".join(text_batch)
+
+    if retry_reason == 'language':
+        return f"""You are an expert translator. Your previous translation attempt was WRONG because you used the wrong language.
+You MUST translate the following {from_lang} text into {to_lang}. Do not use any other language.
+{_COMMON_RULES}
+
+1. First, translate this block of text:
+{clean_text_to_translate}
+
+2. Second, take your translation and format it EXACTLY like this template, using '{separator}' as the separator:
+{structure_template}
+"""
+    elif retry_reason == 'format':
+        return f"""You are an expert translator. Your previous attempt FAILED because you did not format the output correctly.
+You MUST use the exact separator string '{separator}' between each and every translated subtitle.
+The number of separators in your output must be exactly one less than the number of subtitles.
+{_COMMON_RULES}
+
+1. First, translate this block of text:
+{clean_text_to_translate}
+
+2. Second, take your translation and format it EXACTLY like this template, using '{separator}' as the separator:
+{structure_template}
+"""
+    else:
+        return f"""You are a highly skilled translator specializing in subtitle files.
+You MUST translate the following {from_lang} text into {to_lang}. Do not use any other language.
+{_COMMON_RULES}
+
+1. First, translate the following text, where each line is a separate subtitle:
+{clean_text_to_translate}
+
+2. Second, you MUST format your entire response as a single block of text. Use the following template for structure, placing the exact separator string '{separator}' between each corresponding translated subtitle:
+{structure_template}
+"""
+
+
+def compact_prompt(text_batch, separator, from_lang, to_lang, retry_reason=None):
+    """Sends each subtitle once, separator-joined, and asks for the same shape back."""
+    count = len(text_batch)
+    if retry_reason == 'language':
+        intro = f"You are an expert translator. Your previous translation attempt was WRONG because you used the wrong language.\nYou MUST translate into {to_lang}. Do not use any other language."
+    elif retry_reason == 'format':
+        intro = f"You are an expert translator. Your previous attempt FAILED because the number of '{separator}' separators was wrong."
+    else:
+        intro = "You are a highly skilled translator specializing in subtitle files."
+    return f"""{intro}
+Translate the {count} {from_lang} subtitles below into {to_lang}. They are separated by '{separator}'.
+Reply with only the {count} translations in the same order, separated by '{separator}' (exactly {count - 1} separators). Do not merge, split or skip subtitles, and keep line breaks inside a subtitle.
+{_COMMON_RULES}
+
+{f" {separator} ".join(text_batch)}
+"""
+
+
+def json_prompt(texts_by_id, from_lang, to_lang, retry_reason=None):
+    """Asks for the subtitles in `texts_by_id` ({id: text}) to be returned as a JSON object keyed by the same ids."""
+    if retry_reason == 'language':
+        intro = f"You are an expert translator. Your previous translation attempt was WRONG because you used the wrong language.\nYou MUST translate every subtitle into {to_lang}. Do not use any other language."
+    elif retry_reason == 'format':
+        intro = "You are an expert translator. Your previous reply was not valid JSON or was missing some ids.\nYou MUST return every id below exactly once."
+    else:
+        intro = "You are a highly skilled translator specializing in subtitle files."
+    source = json.dumps(texts_by_id, ensure_ascii=False, indent=0)
+    return f"""{intro}
+Translate each {from_lang} subtitle in the JSON object below into {to_lang}. The keys are subtitle ids.
+Respond with ONLY a JSON object of the form {{"translations": {{"<id>": "<translated subtitle>"}}}} containing exactly the same ids.
+Do not merge, split or skip subtitles, keep line breaks inside a subtitle as \\n, and add no explanations or markdown.
+
+{source}
+"""
+
+
+PROMPT_STRATEGIES = {
+    'template': template_prompt,
+    'compact': compact_prompt,
+}
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Requests-per-minute and tokens-per-minute limiting for the translation API.
+
+Both quotas are token buckets that refill continuously. A request reserves
+one request plus its estimated prompt tokens *before* it is sent, and is
+told how long to wait; once the response arrives, the reservation is
+settled against the provider's reported `usage`, which also calibrates
+future estimates.
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    A thread-safe RPM/TPM limiter shared by all workers. A limit of 0
+    disables that quota. Reservations may drive a bucket negative; callers
+    then wait until it has refilled, which keeps ordering fair without
+    polling.
+    """
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        # Ratio of actual to estimated prompt tokens, learned from responses.
+        self.calibration = 1.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.rpm or self.tpm)
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def reserve(self, estimated_prompt_tokens):
+        """
+        Charges one request and its (calibrated) prompt tokens. Returns
+        (reserved_tokens, seconds_to_wait_before_sending).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            tokens = estimated_prompt_tokens * self.calibration
+            wait = 0.0
+            if self.rpm:
+                self._requests -= 1
+                if self._requests < 0:
+                    wait = max(wait, -self._requests * 60.0 / self.rpm)
+            if self.tpm:
+                self._tokens -= tokens
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens * 60.0 / self.tpm)
+            return tokens, wait
+
+    def settle(self, reserved_tokens, estimated_prompt_tokens, usage):
+        """
+        Corrects a reservation with the response's `usage` (prompt plus
+        completion tokens), or refunds the tokens if no usage was reported.
+        """
+        with self._lock:
+            if not usage:
+                actual = 0
+            else:
+                prompt_tokens = usage.get("prompt_tokens", 0)
+                actual = prompt_tokens + usage.get("completion_tokens", 0)
+                if prompt_tokens and estimated_prompt_tokens:
+                    ratio = prompt_tokens / estimated_prompt_tokens
+                    self.calibration += (ratio - self.calibration) * 0.2
+            if self.tpm:
+                self._tokens += reserved_tokens - actual
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+"""
+A reorder buffer that lets batches finish in any order while the output
+file is still written strictly in sequence.
+"""
+
+class ReorderBuffer:
+    """
+    Collects results keyed by a 0-based sequence number and releases them
+    as soon as the contiguous prefix starting at `next_index` is complete.
+    """
+    def __init__(self, start=0):
+        self.next_index = start
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def push(self, index, item):
+        """
+        Stores `item` under `index` and returns the list of (index, item)
+        pairs that are now ready, in order. Often empty.
+        """
+        if index < self.next_index or index in self._pending:
+            raise ValueError(f"Duplicate result for sequence number {index}")
+        self._pending[index] = item
+        ready = []
+        while self.next_index in self._pending:
+            ready.append((self.next_index, self._pending.pop(self.next_index)))
+            self.next_index += 1
+        return ready
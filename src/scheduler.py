@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fair dispatch of batches from several translation jobs to one worker pool.
+"""
+
+from collections import deque
+
+
+class FairScheduler:
+    """
+    Hands out batches round-robin across jobs, so every file makes progress
+    and none waits behind another's tail. At most `window` batches are in
+    flight in total, and each job is also held to `window` batches past its
+    first unwritten one.
+    """
+    def __init__(self, jobs, window):
+        self.window = window
+        self.in_flight = 0
+        self._jobs = deque(job for job in jobs if not job.exhausted)
+
+    def next_batch(self):
+        """Returns the next (job, batch_number, indexed_batch) to dispatch, or None if none may be sent now."""
+        if self.in_flight >= self.window:
+            return None
+        for _ in range(len(self._jobs)):
+            job = self._jobs[0]
+            self._jobs.rotate(-1)
+            item = job.next_batch(self.window)
+            if job.exhausted:
+                self._jobs.remove(job)
+            if item is not None:
+                self.in_flight += 1
+                return (job,) + item
+        return None
+
+    def batch_done(self):
+        self.in_flight -= 1
+
+    @property
+    def waiting_for_input(self):
+        """True while some job may still receive more cues (e.g. from a running transcription)."""
+        return any(not job.input_complete for job in self._jobs)
+
+    @property
+    def exhausted(self):
+        """True once every batch of every job has been dispatched."""
+        return not self._jobs
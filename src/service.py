@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+
+"""
+Service mode (--serve): a long-running process that takes translation
+jobs over a local HTTP API, on a TCP port or a Unix socket.
+
+Every job runs through the same V2SrtProcessor as a command-line run, but
+all of them share one translator (connection pool, rate limiter and
+concurrency limit, language validators), one translation memory and,
+with --whisper-backend python, one warm Whisper model, so a small job
+costs no start-up time. Jobs are kept as one JSON file each in
+--queue-dir; after a restart queued jobs run again and interrupted ones
+resume from their journal.
+
+    POST /jobs              submit {"input": "/path/ep1.srt", "output_lang": ["en"], ...}
+    GET  /jobs              all jobs
+    GET  /jobs/<id>         one job's status and progress
+    GET  /jobs/<id>/events  the same as server-sent events, whenever it changes, until the job ends
+    GET  /health            queue counts
+
+Paths are as seen by the service. Besides 'input', a job may set the
+options in JOB_OPTIONS; everything else comes from the service's own
+command line.
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .cli import setup_arg_parser
+from .main import V2SrtProcessor
+from .transcription import preload_whisper_model
+from .translation import Translator
+from .translation_memory import TranslationMemory
+from .utils import cprint, Colors
+
+# Job fields that override the service's arguments, with their types.
+JOB_OPTIONS = {
+    'input_lang': str,
+    'output_lang': list,
+    'output_dir': Path,
+    'output_translated': Path,
+    'output_srt': Path,
+    'model': str,
+    'batch_size': int,
+    'batching': str,
+    'response_format': str,
+    'prompt_strategy': str,
+    'whisper_model': str,
+    'pipeline': bool,
+}
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+# Seconds between status checks of an /events stream.
+EVENT_INTERVAL = 0.5
+
+
+def job_arguments(base_args, spec):
+    """
+    Builds the arguments of one job from the service's arguments and a
+    submitted spec. Raises ValueError for an unusable spec.
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get('input'), str):
+        raise ValueError("A job needs an 'input' path.")
+    unknown = sorted(set(spec) - set(JOB_OPTIONS) - {'input'})
+    if unknown:
+        raise ValueError(f"Unknown job option(s): {', '.join(unknown)}")
+    choices = {action.dest: action.choices for action in setup_arg_parser()._actions if action.choices}
+
+    args = argparse.Namespace(**vars(base_args))
+    args.serve = False
+    input_path = Path(spec['input']).expanduser()
+    if not input_path.is_file():
+        raise ValueError(f"Input file not found: '{input_path}'")
+    # Video and audio are handled alike; anything but an SRT is transcribed.
+    args.input_srt, args.input_video, args.input_audio = None, None, None
+    if input_path.suffix.lower() == '.srt':
+        args.input_srt = [input_path]
+    else:
+        args.input_video = input_path
+
+    for name, value in spec.items():
+        kind = JOB_OPTIONS.get(name)
+        if kind is None:
+            continue
+        if kind is list:
+            value = value.split(',') if isinstance(value, str) else value
+            if not isinstance(value, list) or not value or not all(isinstance(item, str) for item in value):
+                raise ValueError(f"'{name}' must be a language code or a list of them.")
+        elif kind is Path:
+            if not isinstance(value, str):
+                raise ValueError(f"'{name}' must be a path.")
+            value = Path(value).expanduser()
+        elif kind is int:
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                raise ValueError(f"'{name}' must be a positive integer.")
+        elif not isinstance(value, kind):
+            raise ValueError(f"'{name}' must be a {'boolean' if kind is bool else 'string'}.")
+        if name in choices and value not in choices[name]:
+            raise ValueError(f"'{name}' must be one of: {', '.join(choices[name])}")
+        setattr(args, name, value)
+    # A job that was interrupted by a restart picks up where it stopped.
+    args.resume = not args.pipeline
+    return args
+
+
+class ServiceJob:
+    """One submitted job: its spec and status, and its processor while it runs."""
+    def __init__(self, job_id, spec, status=QUEUED, created=None, started=None, finished=None, error=None, result=None):
+        self.id = job_id
+        self.spec = spec
+        self.status = status
+        self.created = created or time.time()
+        self.started = started
+        self.finished = finished
+        self.error = error
+        # The progress at the end of the job, kept once the processor is gone.
+        self.result = result
+        self.processor = None
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record['id'], record['spec'], record['status'], record['created'], record.get('started'),
+                   record.get('finished'), record.get('error'), record.get('result'))
+
+    def record(self):
+        """The job as stored in the queue directory."""
+        return {'id': self.id, 'spec': self.spec, 'status': self.status, 'created': self.created, 'started': self.started,
+                'finished': self.finished, 'error': self.error, 'result': self.result}
+
+    def progress(self):
+        """Per-output progress of a running job, read from its processor."""
+        processor = self.processor
+        if processor is None:
+            return self.result
+        files = []
+        for job in list(processor.jobs):
+            files.append({
+                'output': str(job.output_path),
+                'output_lang': job.output_lang,
+                'subtitles': len(job.blocks),
+                'written': job.writer.cursor if job.writer else 0,
+                'batches': len(job.batches),
+                'failed_batches': job.failed_batches,
+                'memory_hits': job.memory_hits,
+                'complete': job.completed,
+            })
+        return {'files': files, 'input_tokens': processor.total_input_tokens, 'output_tokens': processor.total_output_tokens}
+
+    def status_dict(self):
+        """The job as reported by the API."""
+        return {'id': self.id, 'status': self.status, 'spec': self.spec, 'created': self.created, 'started': self.started,
+                'finished': self.finished, 'error': self.error, 'progress': self.progress()}
+
+
+class JobStore:
+    """
+    The job queue, kept as one JSON file per job in `directory`. Jobs that
+    were running when the service stopped are queued again.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.jobs = {}
+        self._lock = threading.Lock()
+        records = []
+        for path in self.directory.glob('*.json'):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError) as e:
+                cprint(Colors.WARNING, f"Warning: Ignoring unreadable job file '{path}': {e}")
+        for record in sorted(records, key=lambda record: record['created']):
+            job = ServiceJob.from_record(record)
+            if job.status == RUNNING:
+                job.status = QUEUED
+            self.jobs[job.id] = job
+
+    def add(self, spec):
+        job = ServiceJob(uuid.uuid4().hex[:12], spec)
+        with self._lock:
+            self.jobs[job.id] = job
+        self.save(job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def counts(self):
+        counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+        for job in list(self.jobs.values()):
+            counts[job.status] += 1
+        return counts
+
+    def save(self, job):
+        """Writes the job's file atomically, so a crash never leaves half a record."""
+        path = self.directory / f"{job.id}.json"
+        tmp_path = path.with_name(path.name + '.tmp')
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(job.record(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+
+
+class TranslationService:
+    """Runs submitted jobs on `--max-jobs` worker threads with shared, long-lived resources."""
+    def __init__(self, args):
+        self.args = args
+        self.translator = Translator(args)
+        self.memory = None
+        if not args.no_cache:
+            self.memory = TranslationMemory.open(args.cache_path, args.cache_max_entries, args.cache_max_age_days)
+        self.store = JobStore(args.queue_dir)
+        self._queue = queue.Queue()
+        for job in self.store.jobs.values():
+            if job.status == QUEUED:
+                self._queue.put(job)
+
+    def start(self):
+        for n in range(self.args.max_jobs):
+            threading.Thread(target=self._work, name=f"job-runner-{n + 1}", daemon=True).start()
+
+    def submit(self, spec):
+        """Validates and queues a job; raises ValueError for an unusable spec."""
+        job_arguments(self.args, spec)
+        job = self.store.add(spec)
+        cprint(Colors.INFO, f"Queued job {job.id}: '{spec['input']}'")
+        self._queue.put(job)
+        return job
+
+    def _work(self):
+        while True:
+            self._run_job(self._queue.get())
+
+    def _run_job(self, job):
+        job.status, job.started, job.error = RUNNING, time.time(), None
+        self.store.save(job)
+        cprint(Colors.INFO, f"Starting job {job.id}: '{job.spec['input']}'")
+        try:
+            args = job_arguments(self.args, job.spec)
+            if args.metrics_out:
+                # Jobs run side by side, so each writes files of its own.
+                args.metrics_out = args.metrics_out.with_name(f"{args.metrics_out.stem}-{job.id}")
+            job.processor = V2SrtProcessor(args, self.translator.for_job(args), self.memory)
+            job.processor.run()
+            jobs = job.processor.jobs
+            if not jobs:
+                job.error = "Nothing was translated; see the service log."
+            elif not all(translation.completed and not translation.failed_batches for translation in jobs):
+                job.error = "Some batches failed; the journal is kept, so resubmitting the job retries only those."
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+        job.result = job.progress()
+        job.processor = None
+        if self.memory:
+            self.memory.evict()
+        job.status = FAILED if job.error else DONE
+        job.finished = time.time()
+        self.store.save(job)
+        color = Colors.FAIL if job.error else Colors.OKGREEN
+        cprint(color, f"Job {job.id} {job.status} after {job.finished - job.started:.1f}s{': ' + job.error if job.error else ''}")
+
+
+def _handler_class(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def address_string(self):
+            # Unix socket peers have no address.
+            return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+        def log_message(self, format, *args):
+            if service.args.debug:
+                cprint(Colors.INFO, f"Debug: {self.address_string()} {format % args}")
+
+        def _send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _job_or_404(self, job_id):
+            job = service.store.get(job_id)
+            if job is None:
+                self._send_json(404, {'error': f"No job '{job_id}'"})
+            return job
+
+        def do_GET(self):
+            parts = [part for part in self.path.split('?', 1)[0].split('/') if part]
+            if parts == ['health']:
+                self._send_json(200, {'status': 'ok', 'jobs': service.store.counts()})
+            elif parts == ['jobs']:
+                self._send_json(200, {'jobs': [job.status_dict() for job in list(service.store.jobs.values())]})
+            elif len(parts) == 2 and parts[0] == 'jobs':
+                job = self._job_or_404(parts[1])
+                if job:
+                    self._send_json(200, job.status_dict())
+            elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+                job = self._job_or_404(parts[1])
+                if job:
+                    self._stream_events(job)
+            else:
+                self._send_json(404, {'error': f"Unknown path '{self.path}'"})
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/jobs':
+                self._send_json(404, {'error': f"Unknown path '{self.path}'"})
+                return
+            try:
+                spec = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+                job = service.submit(spec)
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            self._send_json(202, job.status_dict())
+
+        def _stream_events(self, job):
+            """Sends the job's status whenever it changes, until the job has ended."""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            last = None
+            try:
+                while True:
+                    finished = job.status in (DONE, FAILED)
+                    data = json.dumps(job.status_dict(), ensure_ascii=False)
+                    if data != last:
+                        self.wfile.write(f"data: {data}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                        last = data
+                    if finished:
+                        return
+                    time.sleep(EVENT_INTERVAL)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(args, service):
+    """Binds the API to --socket, or to the --listen address."""
+    handler = _handler_class(service)
+    if args.socket:
+        if args.socket.exists():
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(args.socket))
+                raise OSError(f"Another service is listening on '{args.socket}'")
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Left behind by a service that did not shut down cleanly.
+                args.socket.unlink()
+            finally:
+                probe.close()
+        return _UnixHTTPServer(str(args.socket), handler)
+    host, _, port = args.listen.rpartition(':')
+    server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(args):
+    """Runs the service until interrupted; returns the process exit code."""
+    if args.whisper_backend == 'python':
+        cprint(Colors.INFO, f"Loading Whisper model '{args.whisper_model}' for media jobs...")
+        if not preload_whisper_model(args.whisper_model):
+            cprint(Colors.WARNING, "Warning: Media jobs will fail until the Whisper backend works.")
+    service = TranslationService(args)
+    try:
+        server = create_server(args, service)
+    except (OSError, ValueError) as e:
+        cprint(Colors.FAIL, f"Error: Could not listen on '{args.socket or args.listen}': {e}")
+        return 1
+    counts = service.store.counts()
+    service.start()
+    where = f"unix:{args.socket}" if args.socket else f"http://{args.listen}"
+    cprint(Colors.OKGREEN, f"{Colors.BOLD}v2srt service listening on {where} ({counts[QUEUED]} queued job(s), up to {args.max_jobs} at a time).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        cprint(Colors.WARNING, "\nStopping the service; unfinished jobs resume on the next start.")
+    finally:
+        server.server_close()
+        if args.socket:
+            args.socket.unlink(missing_ok=True)
+    return 0
@@ -4,28 +4,127 @@
 Handles parsing and writing of SRT (SubRip Text) files.
 """
 
+import re
 from .utils import cprint, Colors
 
+# A timing line: "00:01:02,345 --> 00:01:04,000" plus optional position settings.
+# Hours may be omitted and '.' is accepted in place of ',' as seen in the wild.
+# The pattern starts with the preceding newline because a literal first
+# character lets the regex engine skip ahead much faster than '^' would.
+_TIMING_LINE_RE = re.compile(
+    r'\n[ \t]*(?:(\d+):)?(\d{1,2}):(\d{1,2})[,.](\d{1,3})[ \t]*-->[ \t]*'
+    r'(?:(\d+):)?(\d{1,2}):(\d{1,2})[,.](\d{1,3})(.*)'
+)
+_TRAILING_SPACE_RE = re.compile(r'[ \t]+$', re.MULTILINE)
+
+# Input is read in chunks of this many characters, so memory stays flat for huge files.
+READ_CHUNK_SIZE = 1 << 20
+
+# Output buffer size for translated SRT files.
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+class Cue:
+    """A single subtitle cue with its timing parsed to integer milliseconds."""
+    __slots__ = ('index', 'start_ms', 'end_ms', 'text', 'settings')
+
+    def __init__(self, index, start_ms, end_ms, text, settings=''):
+        self.index = index
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.text = text
+        self.settings = settings
+
+    @property
+    def timestamp(self):
+        """The SRT timing line for this cue."""
+        return f"{format_timestamp(self.start_ms)} --> {format_timestamp(self.end_ms)}{self.settings}"
+
+    def __repr__(self):
+        return f"Cue({self.index!r}, {self.start_ms}, {self.end_ms}, {self.text!r})"
+
+
+def _to_ms(hours, minutes, seconds, millis):
+    if len(millis) < 3:
+        # A short fraction such as ",5" means 500 ms, not 5 ms.
+        millis = millis.ljust(3, '0')
+    return (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)) * 1000 + int(millis)
+
+
+def format_timestamp(ms):
+    """Formats milliseconds as an SRT timestamp (HH:MM:SS,mmm)."""
+    seconds, millis = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def _split_index(segment, expected):
+    """
+    Splits the index line of the next cue off the end of `segment` (the text
+    between two timing lines). The last line counts as an index if it is a
+    number that follows a blank line, starts the segment, or is `expected`.
+    Returns (text, index_or_None).
+    """
+    head, _, last = segment.rpartition('\n')
+    last = last.strip()
+    if last.isdigit():
+        index = int(last)
+        if not head or head.endswith('\n') or index == expected:
+            return head.rstrip('\n'), index
+    return segment, None
+
+
+def iter_srt(file_path):
+    """
+    Incrementally parses an SRT file, yielding one Cue at a time.
+
+    Handles a UTF-8 BOM, CRLF/CR line endings, stray whitespace, missing
+    index lines and blank lines inside a cue's text: a cue only ends where
+    the next timing line (optionally preceded by its index) begins.
+    """
+    with open(file_path, 'r', encoding='utf-8-sig', newline=None) as f:
+        pending = None
+        next_number = 1
+        # Scanned text always starts at a line boundary with a newline.
+        carry = '\n'
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            at_eof = not chunk
+            data = carry + chunk
+            # Only complete lines are scanned; a partial last line waits for the next chunk.
+            cut = len(data) if at_eof else data.rfind('\n') + 1
+            work = data[:cut]
+            if ' \n' in work or '\t\n' in work or work.endswith((' ', '\t')):
+                work = _TRAILING_SPACE_RE.sub('', work)
+
+            pos = 0
+            for match in _TIMING_LINE_RE.finditer(work):
+                text, index = _split_index(work[pos:match.start()].strip('\n'), next_number)
+                if pending is not None:
+                    yield Cue(pending[0], pending[1], pending[2], text, pending[3])
+                if index is None:
+                    index = next_number
+                next_number = index + 1
+                g = match.groups()
+                pending = (index, _to_ms(g[0], g[1], g[2], g[3]), _to_ms(g[4], g[5], g[6], g[7]), g[8])
+                pos = match.end()
+
+            carry = work[pos:] + data[cut:]
+            if at_eof:
+                break
+
+        if pending is not None:
+            yield Cue(pending[0], pending[1], pending[2], carry.strip('\n'), pending[3])
+
+
 def parse_srt(file_path):
     """
-    Parses an SRT file and returns a list of subtitle blocks.
-    Each block is a dictionary containing index, timestamp, and text.
+    Parses an SRT file and returns a list of Cue objects.
+    Returns an empty list (after printing the error) if the file cannot be read.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        blocks = content.strip().split('\n\n')
-        parsed_blocks = []
-        for block in blocks:
-            lines = block.split('\n')
-            if len(lines) >= 3:
-                parsed_blocks.append({
-                    'index': lines[0],
-                    'timestamp': lines[1],
-                    'text': '\n'.join(lines[2:])
-                })
-        return parsed_blocks
+        return [cue for cue in iter_srt(file_path) if cue.text]
     except FileNotFoundError:
         cprint(Colors.FAIL, f"Error: Could not find SRT file to parse at '{file_path}'")
         return []
@@ -33,9 +132,73 @@ def parse_srt(file_path):
         cprint(Colors.FAIL, f"An error occurred while parsing the SRT file: {e}")
         return []
 
-def write_srt_block(file_handle, block, translated_text):
+
+def _cue_text(text):
+    """
+    Drops blank lines from a cue's text (e.g. paragraphs in a model reply):
+    readers take a blank line as the end of the cue.
+    """
+    if '\n' not in text and '\r' not in text:
+        return text
+    return '\n'.join(line for line in text.splitlines() if line.strip())
+
+
+def format_srt_block(cue, translated_text):
+    """Returns the SRT text for one cue carrying `translated_text`."""
+    return f"{cue.index}\n{cue.timestamp}\n{_cue_text(translated_text)}\n\n"
+
+
+def write_srt_block(file_handle, cue, translated_text):
     """Writes a single translated subtitle block to the output file."""
-    file_handle.write(f"{block['index']}\n")
-    file_handle.write(f"{block['timestamp']}\n")
-    file_handle.write(f"{translated_text}\n\n")
+    file_handle.write(format_srt_block(cue, translated_text))
+
+
+def write_srt_blocks(file_handle, cues_and_texts):
+    """Writes many (cue, translated_text) pairs with a single write call."""
+    file_handle.write(''.join(format_srt_block(cue, text) for cue, text in cues_and_texts))
+
+
+def open_srt_output(file_path):
+    """Opens a translated SRT file for writing with a large write buffer."""
+    return open(file_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+
+
+class OrderedSrtWriter:
+    """
+    Writes translated cues strictly in source order. Translations may be
+    supplied in any order; each call to `flush_ready` writes the contiguous
+    run of cues that is complete. `blocks` may keep growing while writing.
+    """
+    _MISSING = object()
+
+    def __init__(self, file_handle, blocks):
+        self.file_handle = file_handle
+        self.blocks = blocks
+        self.translations = [self._MISSING] * len(blocks)
+        self.cursor = 0
+
+    def set(self, position, translated_text):
+        if position < self.cursor:
+            # Already written, e.g. a streamed subtitle set again with its batch.
+            return
+        if position >= len(self.translations):
+            self.translations.extend([self._MISSING] * (len(self.blocks) - len(self.translations)))
+        self.translations[position] = translated_text
+
+    def flush_ready(self):
+        """Writes every cue that is ready from the cursor onwards and returns how many were written."""
+        start = end = self.cursor
+        while end < len(self.translations) and self.translations[end] is not self._MISSING:
+            end += 1
+        if end == start:
+            return 0
+        write_srt_blocks(self.file_handle, zip(self.blocks[start:end], self.translations[start:end]))
+        # Drop written text so memory does not grow with the file.
+        self.translations[start:end] = [None] * (end - start)
+        self.cursor = end
+        self.file_handle.flush()
+        return end - start
 
+    @property
+    def done(self):
+        return self.cursor == len(self.blocks)
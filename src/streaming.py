@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+"""
+Incremental checks for streamed (SSE) chat completions.
+
+A monitor is fed the decoded stream events of one request. It collects
+the reply text and reported `usage`, and decides after every delta
+whether the generation is already doomed, so the request can be aborted
+instead of paid for in full:
+
+- with the separator format, once there are more separators than
+  subtitles in the batch;
+- with the JSON format, once the reply names an id that was not asked for;
+- with either, once the reply grows far longer than the source text.
+
+The JSON monitor also hands each subtitle on as soon as its string value
+is complete and passes validation. Separator replies are only handed on
+whole, because a dropped separator shifts every later subtitle and can
+only be noticed at the end.
+"""
+
+import json
+import re
+
+from .batching import estimate_tokens
+from .http_client import HttpError
+
+# A reply longer than this many times the source text (plus some slack
+# per subtitle) is a runaway generation.
+RUNAWAY_FACTOR = 4
+RUNAWAY_SLACK_CHARS = 40
+
+# A complete '"<id>": "<string>"' pair of a JSON reply.
+_JSON_PAIR_RE = re.compile(r'"(\d+)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class StreamMonitor:
+    """Collects one streamed reply; subclasses add format checks in `_check`."""
+    def __init__(self, source_texts):
+        self.max_chars = RUNAWAY_FACTOR * sum(len(text) for text in source_texts) + RUNAWAY_SLACK_CHARS * (len(source_texts) + 1)
+        self.on_cue = None
+        self.start()
+
+    def start(self, on_cue=None):
+        """Resets the monitor for a new attempt; `on_cue(index, text)` receives early subtitles."""
+        self.on_cue = on_cue
+        self.content = ''
+        self.usage = None
+        self.aborted = None
+        self.chunks = 0
+
+    def on_event(self, event):
+        """Handles one decoded stream event. Returns False to abort the request."""
+        if event.get('error'):
+            raise HttpError(f"Error in event stream: {event['error']}", body=json.dumps(event), retryable=True)
+        if event.get('usage'):
+            self.usage = event['usage']
+        for choice in event.get('choices') or []:
+            # A server that ignores `stream` sends the whole message at once.
+            delta = (choice.get('delta') or choice.get('message') or {}).get('content')
+            if delta:
+                self.content += delta
+                self.chunks += 1
+        if len(self.content) > self.max_chars:
+            self.aborted = 'runaway'
+        else:
+            self.aborted = self._check()
+        return self.aborted is None
+
+    def _check(self):
+        return None
+
+    def reply(self, prompt_tokens_estimate):
+        """
+        The reply in the shape of a non-streamed completion. An aborted
+        stream never reports usage, so its tokens are estimated.
+        """
+        usage = self.usage or {'prompt_tokens': prompt_tokens_estimate, 'completion_tokens': estimate_tokens(self.content)}
+        return {'choices': [{'message': {'content': self.content}}], 'usage': usage}
+
+
+class SeparatorStreamMonitor(StreamMonitor):
+    """
+    Aborts a separator-formatted reply once it holds more subtitles than
+    were sent. A single subtitle cannot be misaligned, so stray separators
+    in its reply are left alone.
+    """
+    def __init__(self, source_texts, separator):
+        self.expected = len(source_texts)
+        self.separator = separator
+        super().__init__(source_texts)
+
+    def _check(self):
+        if self.expected > 1 and self.content.count(self.separator) >= self.expected:
+            return 'too many subtitles'
+        return None
+
+
+class JsonStreamMonitor(StreamMonitor):
+    """
+    Watches a JSON reply for the subtitles with the given batch `indices`
+    (sent as ids index + 1). Each pair is passed to `accept(text)` as soon
+    as it is complete; accepted ones go to `on_cue` and are kept in
+    `emitted` ({id: text}), so they are final even if the rest fails.
+    """
+    def __init__(self, indices, source_texts, accept):
+        self.ids = {str(i + 1) for i in indices}
+        self.accept = accept
+        # Kept across attempts: what was handed on is already written.
+        self.emitted = {}
+        super().__init__(source_texts)
+
+    def start(self, on_cue=None):
+        super().start(on_cue)
+        self._scanned = 0
+
+    def _check(self):
+        for match in _JSON_PAIR_RE.finditer(self.content, self._scanned):
+            self._scanned = match.end()
+            key = match.group(1)
+            if key not in self.ids:
+                return f"unexpected id {key}"
+            if key in self.emitted:
+                continue
+            try:
+                text = json.loads(f'"{match.group(2)}"').strip()
+            except json.JSONDecodeError:
+                continue
+            if text and self.accept(text):
+                self.emitted[key] = text
+                if self.on_cue:
+                    self.on_cue(int(key) - 1, text)
+        return None
@@ -2,16 +2,67 @@
 
 """
 Handles audio/video transcription using the Whisper CLI tool.
+
+Long media can also be transcribed in parallel: the audio is cut into
+chunks at silences (found with ffmpeg's silencedetect filter), every chunk
+is transcribed by its own Whisper process, and the chunk SRTs are merged
+back with offset timestamps and renumbered cues.
+
+The 'python' backend runs Whisper in-process instead, loading each model
+once and reusing it for every file, and a transcript cache keyed by the
+media's content hash lets re-runs skip Whisper altogether.
 """
 
+import hashlib
 import os
+import re
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from .utils import cprint, Colors
 from .config import LANG_MAP
+from .srt_handler import Cue, open_srt_output, parse_srt, write_srt_blocks
+
+# A segment as Whisper prints it while transcribing: "[01:02.340 --> 01:04.000]  text".
+# Hours only appear once the media passes the one-hour mark.
+_SEGMENT_LINE_RE = re.compile(
+    r'^\[(?:(\d+):)?(\d+):(\d+)\.(\d{3}) --> (?:(\d+):)?(\d+):(\d+)\.(\d{3})\]\s*(.*)$'
+)
+
+
+_SILENCE_RE = re.compile(r'silence_(start|end): (-?[\d.]+)')
+
+# Chunk boundaries are moved to the middle of a silence within this
+# fraction of the chunk length from the even split point.
+SILENCE_SEARCH_FRACTION = 0.25
+# A boundary with no silence nearby cuts through speech; both neighbouring
+# chunks then get this much extra audio, and each cue is kept only by the
+# chunk that owns its midpoint, so nothing is duplicated or dropped.
+CHUNK_OVERLAP_SECONDS = 2.0
+# Chunks shorter than this are not worth a Whisper process of their own.
+MIN_CHUNK_SECONDS = 30.0
 
-def run_whisper(input_file, output_srt_path, whisper_model, input_lang, debug=False):
+
+# Whisper models loaded by the 'python' backend, by name, with a lock each:
+# loading is slow, so a model is kept for the life of the process.
+_MODELS = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def _segment_ms(hours, minutes, seconds, millis):
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis)
+
+
+def run_whisper(input_file, output_srt_path, whisper_model, input_lang, debug=False, on_segment=None):
     """
     Executes the Whisper command-line tool to transcribe a media file.
+    If `on_segment` is given, it is called with (start_ms, end_ms, text) for
+    every segment as soon as Whisper prints it, long before the SRT file is
+    written.
     
     Returns the path to the generated SRT file on success, or None on failure.
     """
@@ -34,11 +85,20 @@ def run_whisper(input_file, output_srt_path, whisper_model, input_lang, debug=Fa
         cprint(Colors.WARNING, f"Debug: Executing command: {' '.join(command)}")
 
     try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
+        # Unbuffered, so each segment line arrives as Whisper prints it rather than in 8 KB bursts.
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8',
+                                   env={**os.environ, 'PYTHONUNBUFFERED': '1'})
         
         # Print Whisper's output in real-time
         for line in iter(process.stdout.readline, ''):
             print(line.strip())
+            if on_segment:
+                match = _SEGMENT_LINE_RE.match(line.strip())
+                if match:
+                    g = match.groups()
+                    # Same text clean-up as Whisper's own SRT writer, so both agree.
+                    text = g[8].strip().replace('-->', '->')
+                    on_segment(_segment_ms(*g[0:4]), _segment_ms(*g[4:8]), text)
         
         process.wait()
 
@@ -63,3 +123,309 @@ def run_whisper(input_file, output_srt_path, whisper_model, input_lang, debug=Fa
     except Exception as e:
         cprint(Colors.FAIL, f"An unexpected error occurred while running Whisper: {e}")
         return None
+
+
+def _load_model(whisper_model):
+    """Returns (model, lock) for `whisper_model`, loading it on first use."""
+    with _MODELS_LOCK:
+        if whisper_model not in _MODELS:
+            import whisper
+            cprint(Colors.INFO, f"Loading Whisper model '{whisper_model}'...")
+            _MODELS[whisper_model] = (whisper.load_model(whisper_model), threading.Lock())
+        return _MODELS[whisper_model]
+
+
+def preload_whisper_model(whisper_model):
+    """Loads a model for the 'python' backend ahead of its first use; returns False if that fails."""
+    try:
+        _load_model(whisper_model)
+        return True
+    except ImportError:
+        cprint(Colors.FAIL, "Error: The 'whisper' Python package is not installed. Run 'pip install openai-whisper' or use --whisper-backend cli.")
+    except Exception as e:
+        cprint(Colors.FAIL, f"An unexpected error occurred while loading Whisper model '{whisper_model}': {e}")
+    return False
+
+
+def run_whisper_in_process(input_file, output_srt_path, whisper_model, input_lang, debug=False, on_segment=None):
+    """
+    Transcribes a media file with the Whisper Python package, reusing an
+    already loaded model. `on_segment` is called for every segment once
+    the transcription is done (the Python API has no per-segment hook).
+
+    Returns the path to the generated SRT file on success, or None on failure.
+    """
+    cprint(Colors.INFO, f"\nRunning Whisper (in-process) on '{input_file}'...")
+    try:
+        model, lock = _load_model(whisper_model)
+        # One transcription per model at a time; the model is not thread-safe.
+        with lock:
+            result = model.transcribe(str(input_file), language=LANG_MAP.get(input_lang, input_lang), verbose=debug)
+    except ImportError:
+        cprint(Colors.FAIL, "Error: The 'whisper' Python package is not installed. Run 'pip install openai-whisper' or use --whisper-backend cli.")
+        return None
+    except Exception as e:
+        cprint(Colors.FAIL, f"An unexpected error occurred while running Whisper: {e}")
+        return None
+
+    cues = []
+    for segment in result['segments']:
+        # Same text clean-up as Whisper's own SRT writer.
+        text = segment['text'].strip().replace('-->', '->')
+        start_ms, end_ms = round(segment['start'] * 1000), round(segment['end'] * 1000)
+        if on_segment:
+            on_segment(start_ms, end_ms, text)
+        cues.append(Cue(len(cues) + 1, start_ms, end_ms, text))
+    with open_srt_output(output_srt_path) as f:
+        write_srt_blocks(f, ((cue, cue.text) for cue in cues))
+
+    cprint(Colors.OKGREEN, f"Successfully generated SRT file: '{output_srt_path}'")
+    return output_srt_path
+
+
+def run_transcription(input_file, output_srt_path, whisper_model, input_lang, backend='cli', workers=1, debug=False):
+    """
+    Transcribes a media file with the chosen backend: chunked parallel
+    Whisper CLI processes if `workers` > 1, else the in-process 'python'
+    backend or a single Whisper CLI run.
+
+    Returns the path to the generated SRT file on success, or None on failure.
+    """
+    if workers > 1:
+        return run_whisper_parallel(input_file, output_srt_path, whisper_model, input_lang, workers, debug)
+    if backend == 'python':
+        return run_whisper_in_process(input_file, output_srt_path, whisper_model, input_lang, debug)
+    return run_whisper(input_file, output_srt_path, whisper_model, input_lang, debug)
+
+
+class TranscriptCache:
+    """
+    Finished transcripts stored as SRT files, keyed by the media's content
+    hash plus the Whisper model and language, so re-running a file with
+    other translation settings skips Whisper entirely.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def key(media_file, whisper_model, input_lang):
+        digest = hashlib.blake2b(digest_size=20)
+        with open(media_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(f"\0{whisper_model}\0{input_lang}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.srt"
+
+    def fetch(self, key, output_srt_path):
+        """Copies a cached transcript to `output_srt_path`. Returns True on a hit."""
+        cached = self._path(key)
+        if not cached.is_file():
+            return False
+        shutil.copyfile(cached, output_srt_path)
+        return True
+
+    def store(self, key, srt_path):
+        """Stores a finished transcript; failures only cost a future cache miss."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path(key).with_suffix('.tmp')
+            shutil.copyfile(srt_path, tmp_path)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            cprint(Colors.WARNING, f"Warning: Could not store the transcript in the cache: {e}")
+
+
+class TranscriptionFeed:
+    """
+    Runs Whisper in a background thread and collects its segments as Cues
+    while it is still transcribing, so translation can start right away.
+    `cues` only ever grows; `snapshot` tells consumers how much of it is
+    ready and whether transcription has ended.
+    """
+    def __init__(self, input_file, output_srt_path, whisper_model, input_lang, debug=False, backend='cli'):
+        self.input_file = input_file
+        self.output_srt_path = output_srt_path
+        self.whisper_model = whisper_model
+        self.input_lang = input_lang
+        self.debug = debug
+        self.backend = backend
+        self.cues = []
+        self.closed = False
+        # The SRT written by Whisper once done, or None if it failed.
+        self.srt_path = None
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="whisper-feed", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        self.started_at = time.monotonic()
+        try:
+            transcribe = run_whisper_in_process if self.backend == 'python' else run_whisper
+            self.srt_path = transcribe(self.input_file, self.output_srt_path, self.whisper_model, self.input_lang, self.debug, on_segment=self._add)
+        finally:
+            self.finished_at = time.monotonic()
+            with self._lock:
+                self.closed = True
+
+    def _add(self, start_ms, end_ms, text):
+        # Empty segments are dropped, as parse_srt drops empty cues.
+        if not text:
+            return
+        with self._lock:
+            self.cues.append(Cue(len(self.cues) + 1, start_ms, end_ms, text))
+
+    def snapshot(self):
+        """Returns (number_of_cues_ready, transcription_finished)."""
+        with self._lock:
+            return len(self.cues), self.closed
+
+    @property
+    def elapsed(self):
+        """Wall time of the transcription so far."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+def _media_duration(input_file):
+    """Returns the media duration in seconds, using ffprobe."""
+    output = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', str(input_file)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip())
+
+
+def _detect_silences(input_file, noise_db=-30, min_silence=0.5):
+    """Returns (start, end) pairs in seconds of the silences ffmpeg finds in the audio."""
+    stderr = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-nostats', '-i', str(input_file), '-vn',
+         '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}', '-f', 'null', '-'],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    silences, start = [], None
+    for kind, value in _SILENCE_RE.findall(stderr):
+        if kind == 'start':
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+
+def plan_chunks(duration, silences, count):
+    """
+    Splits [0, duration) into up to `count` chunks, moving each boundary to
+    the middle of the nearest silence if one is close enough. Returns
+    (own_start, own_end, overlap_before, overlap_after) tuples in seconds,
+    where the overlaps are the extra audio to transcribe around the part
+    the chunk owns.
+    """
+    count = max(1, min(count, int(duration // MIN_CHUNK_SECONDS) or 1))
+    length = duration / count
+    cuts = []
+    for k in range(1, count):
+        target = k * length
+        nearby = [(abs((a + b) / 2 - target), (a + b) / 2) for a, b in silences if abs((a + b) / 2 - target) <= length * SILENCE_SEARCH_FRACTION]
+        cuts.append((min(nearby)[1], True) if nearby else (target, False))
+
+    bounds = [(0.0, True)] + cuts + [(duration, True)]
+    chunks = []
+    for (start, start_silent), (end, end_silent) in zip(bounds, bounds[1:]):
+        chunks.append((start, end, 0.0 if start_silent else CHUNK_OVERLAP_SECONDS, 0.0 if end_silent else CHUNK_OVERLAP_SECONDS))
+    return chunks
+
+
+def _transcribe_chunk(input_file, chunk, workdir, index, whisper_model, language, threads, debug=False):
+    """
+    Cuts one chunk out of the media as 16 kHz mono audio and transcribes it.
+    Returns its cues with timestamps relative to the whole file, keeping
+    only cues whose midpoint lies in the part of the media the chunk owns.
+    """
+    own_start, own_end, before, after = chunk
+    # Whole milliseconds, so the cut ffmpeg makes and the offset added below agree exactly.
+    start_ms = round(max(0.0, own_start - before) * 1000)
+    end_ms = round((own_end + after) * 1000)
+    audio_path = Path(workdir) / f"chunk_{index:04d}.wav"
+    subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-ss', f'{start_ms / 1000:.3f}', '-t', f'{(end_ms - start_ms) / 1000:.3f}',
+         '-i', str(input_file), '-vn', '-ac', '1', '-ar', '16000', str(audio_path)],
+        capture_output=True, check=True,
+    )
+    command = [
+        'whisper', str(audio_path),
+        '--model', whisper_model,
+        '--language', language,
+        '--output_format', 'srt',
+        '--output_dir', str(workdir),
+        '--verbose', 'False',
+        '--threads', str(threads),
+    ]
+    if debug:
+        cprint(Colors.WARNING, f"Debug: Executing command: {' '.join(command)}")
+    subprocess.run(command, capture_output=True, check=True)
+
+    own_start_ms, own_end_ms = round(own_start * 1000), round(own_end * 1000)
+    cues = []
+    for cue in parse_srt(audio_path.with_suffix('.srt')):
+        cue.start_ms += start_ms
+        cue.end_ms += start_ms
+        if own_start_ms <= (cue.start_ms + cue.end_ms) // 2 < own_end_ms:
+            cues.append(cue)
+    return cues
+
+
+def run_whisper_parallel(input_file, output_srt_path, whisper_model, input_lang, workers, debug=False):
+    """
+    Transcribes a media file as up to `workers` chunks cut at silences, each
+    in its own Whisper process, and merges them into one SRT.
+
+    Returns the path to the generated SRT file on success, or None on failure.
+    """
+    cprint(Colors.INFO, f"\nRunning Whisper on '{input_file}' with {workers} parallel workers...")
+    language = LANG_MAP.get(input_lang, input_lang)
+    try:
+        duration = _media_duration(input_file)
+        chunks = plan_chunks(duration, _detect_silences(input_file), workers)
+        cprint(Colors.INFO, f"Split {duration:.0f}s of audio into {len(chunks)} chunk(s).")
+        # Share the CPU cores between the Whisper processes instead of oversubscribing them.
+        threads = max(1, (os.cpu_count() or 1) // len(chunks))
+
+        with tempfile.TemporaryDirectory(prefix='v2srt-whisper-') as workdir:
+            with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+                futures = [
+                    executor.submit(_transcribe_chunk, input_file, chunk, workdir, index, whisper_model, language, threads, debug)
+                    for index, chunk in enumerate(chunks)
+                ]
+                merged = []
+                for index, future in enumerate(futures):
+                    merged.extend(future.result())
+                    cprint(Colors.INFO, f"Chunk {index + 1}/{len(chunks)} transcribed.")
+
+        for number, cue in enumerate(merged, 1):
+            cue.index = number
+        with open_srt_output(output_srt_path) as f:
+            write_srt_blocks(f, ((cue, cue.text) for cue in merged))
+
+        cprint(Colors.OKGREEN, f"Successfully generated SRT file: '{output_srt_path}'")
+        return output_srt_path
+
+    except FileNotFoundError as e:
+        cprint(Colors.FAIL, f"Error: '{e.filename}' command not found. Parallel transcription needs ffmpeg, ffprobe and whisper in your PATH.")
+        return None
+    except subprocess.CalledProcessError as e:
+        cprint(Colors.FAIL, f"'{e.cmd[0]}' failed with exit code {e.returncode}.")
+        if debug and e.stderr:
+            print(e.stderr if isinstance(e.stderr, str) else e.stderr.decode('utf-8', 'replace'))
+        return None
+    except Exception as e:
+        cprint(Colors.FAIL, f"An unexpected error occurred while running Whisper: {e}")
+        return None
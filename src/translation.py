@@ -5,172 +5,728 @@ Handles the translation of text batches using an external API,
 including language validation and retry mechanisms.
 """
 
+import asyncio
+import copy
 import json
 import re
-import subprocess
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeoutError, wait
 from .utils import cprint, Colors
+from .batching import estimate_tokens
+from .concurrency import AimdController, RequestGate
 from .config import Config, LANG_MAP
-
-try:
-    from langdetect import detect_langs, LangDetectException
-    LANGDETECT_AVAILABLE = True
-except ImportError:
-    LANGDETECT_AVAILABLE = False
+from .endpoints import EndpointPool, is_endpoint_failure
+from .http_client import AsyncHttpClient, HttpClient, HttpError
+from .language_check import LANGDETECT_AVAILABLE, LanguageValidator
+from .prompts import PROMPT_STRATEGIES, json_prompt
+from .rate_limit import RateLimiter
+from .streaming import JsonStreamMonitor, SeparatorStreamMonitor
 
 class Translator:
     """
     Manages API calls to the translation service.
     """
     def __init__(self, args):
-        self.api_url = args.api_url
-        self.api_key = args.api_key
-        self.model = args.model
-        self.separator = args.separator
-        self.input_lang = args.input_lang
-        self.output_lang = args.output_lang
         self.debug = args.debug
+        self.endpoints = EndpointPool.from_args(args)
+        self.hedge_percentile = args.hedge_percentile
+        self.json_mode_supported = True
+        self.stream_usage_supported = True
+        # Validators by input language; shared with the translators made by for_job.
+        self._validators = {}
+        self._validators_lock = threading.Lock()
+        self._configure(args)
+        self.http = HttpClient(
+            max_connections=args.concurrency,
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+        )
+        self.async_http = AsyncHttpClient(
+            max_connections=args.concurrency,
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+        )
+        # --concurrency is both the starting point and the ceiling of the adaptive limit.
+        # Shared with the translators made by for_job, so service jobs together stay within --concurrency.
+        self.concurrency_controller = RequestGate(args.concurrency)
+        if args.adaptive_concurrency:
+            self.concurrency_controller = AimdController(args.concurrency, args.concurrency, args.min_concurrency, args.debug)
+        self.rate_limiter = RateLimiter(args.rpm, args.tpm)
         if not LANGDETECT_AVAILABLE:
-            cprint(Colors.WARNING, "Warning: 'langdetect' library not found. Language validation will be skipped.")
+            cprint(Colors.WARNING, "Warning: 'langdetect' library not found. Only script-based language validation is available.")
             cprint(Colors.WARNING, "To enable this feature, please run: pip install langdetect")
 
-    def _validate_language(self, text_batch, batch_index):
+    def _configure(self, args):
+        """Applies the settings that may differ from job to job."""
+        self.model = args.model
+        self.separator = args.separator
+        self.input_lang = args.input_lang
+        self.mismatch_recovery = args.mismatch_recovery
+        self.response_format = args.response_format
+        self.stream = args.stream
+        self.build_prompt = PROMPT_STRATEGIES[args.prompt_strategy]
+        # The JSON format has a single prompt of its own; stats are reported under this name.
+        self.prompt_label = 'json' if self.response_format == 'json' else args.prompt_strategy
+        with self._validators_lock:
+            if args.input_lang not in self._validators:
+                self._validators[args.input_lang] = LanguageValidator(args.input_lang, self.debug)
+            self.language_validator = self._validators[args.input_lang]
+
+    def for_job(self, args):
         """
-        Validates language using a multi-layered defense strategy.
+        A translator for one job's settings (model, languages, format) that
+        shares this one's connection pool, rate limiter, concurrency limit
+        and language validators. The async engine's pool is per job, as its
+        connections belong to the job's event loop; the shared concurrency
+        limit still caps the requests of all jobs together.
         """
-        if not LANGDETECT_AVAILABLE:
-            return True
+        translator = copy.copy(self)
+        translator._configure(args)
+        translator.async_http = AsyncHttpClient(
+            max_connections=args.concurrency,
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+        )
+        return translator
 
+    def close(self):
+        """Releases pooled API connections."""
+        self.http.close()
+        self.async_http.close()
+
+    def _validate_language(self, text_batch, batch_index, output_lang):
+        """
+        Returns the positions of the subtitles in `text_batch` that are not
+        in `output_lang`; empty if the whole batch passes. A step generator,
+        so the time spent is recorded in the batch's metrics.
+        """
+        started = time.perf_counter()
+        failing = self.language_validator.failing_cues(text_batch, output_lang, batch_index)
+        yield ('record', ('validation_seconds', time.perf_counter() - started))
+        return failing
+
+    def translate_batch(self, indexed_batch, output_lang, on_cue=None):
+        """
+        Translates one (batch_index, texts) pair into `output_lang`, blocking
+        the calling thread for requests and retry back-off. When streaming,
+        `on_cue(position, text)` may receive final subtitles of the batch
+        before it is done; it is called from the calling thread.
+        """
+        steps = self._translation_steps(indexed_batch, output_lang)
+        metrics = self._new_metrics()
+        # Endpoints that failed this batch; retries go elsewhere while there is an elsewhere.
+        avoid = set()
+        reply, error = None, None
+        while True:
+            try:
+                action, arg = steps.throw(error) if error else steps.send(reply)
+            except StopIteration as stop:
+                return self._with_metrics(stop.value, metrics)
+            reply, error = None, None
+            if action == 'record':
+                metrics[arg[0]] += arg[1]
+                continue
+            if action == 'sleep':
+                metrics['backoff_seconds'] += arg
+                time.sleep(arg)
+                continue
+            try:
+                if action == 'stream':
+                    reply = self._post(arg[0], metrics, avoid, arg[1], on_cue)
+                else:
+                    reply = self._post(arg, metrics, avoid)
+            except HttpError as e:
+                error = e
+
+    async def translate_batch_async(self, indexed_batch, output_lang, on_cue=None):
+        """
+        Coroutine version of translate_batch: requests and back-off are
+        awaited, so many batches can be in flight on a single thread.
+        """
+        steps = self._translation_steps(indexed_batch, output_lang)
+        metrics = self._new_metrics()
+        # Endpoints that failed this batch; retries go elsewhere while there is an elsewhere.
+        avoid = set()
+        reply, error = None, None
+        while True:
+            try:
+                action, arg = steps.throw(error) if error else steps.send(reply)
+            except StopIteration as stop:
+                return self._with_metrics(stop.value, metrics)
+            reply, error = None, None
+            if action == 'record':
+                metrics[arg[0]] += arg[1]
+                continue
+            if action == 'sleep':
+                metrics['backoff_seconds'] += arg
+                await asyncio.sleep(arg)
+                continue
+            try:
+                if action == 'stream':
+                    reply = await self._post_async(arg[0], metrics, avoid, arg[1], on_cue)
+                else:
+                    reply = await self._post_async(arg, metrics, avoid)
+            except HttpError as e:
+                error = e
+
+    @staticmethod
+    def _new_metrics():
+        """Per-batch timings and retry counts, filled in by the driver and by ('record', ...) steps."""
+        return {'started': time.monotonic(), 'latencies': [], 'throttle_seconds': 0.0, 'backoff_seconds': 0.0, 'validation_seconds': 0.0,
+                'network_retries': 0, 'rate_limit_retries': 0, 'separator_retries': 0, 'language_retries': 0, 'stream_aborts': 0,
+                'hedged_requests': 0, 'models': set(), 'hedge_losers': []}
+
+    @staticmethod
+    def _with_metrics(result, metrics):
+        """
+        Attaches the batch's `metrics` to its result, along with the 'model'
+        that answered it (None if answers came from several models). A
+        hedged duplicate that lost its race may still be running; its
+        Future or task is in metrics['hedge_losers'].
+        """
+        metrics['finished'] = time.monotonic()
+        result['metrics'] = metrics
+        result['model'] = next(iter(metrics['models'])) if len(metrics['models']) == 1 else None
+        return result
+
+    @staticmethod
+    def _estimate_prompt_tokens(payload):
+        return sum(estimate_tokens(message["content"]) for message in payload["messages"])
+
+    def _before_request(self, payload, endpoint):
+        """
+        Charges the shared rate limiter and the endpoint's own for a request;
+        returns (reservations, seconds_to_wait).
+        """
+        reservations, wait = [], 0
+        for limiter in (self.rate_limiter, endpoint.rate_limiter):
+            if not limiter.enabled:
+                continue
+            estimated = self._estimate_prompt_tokens(payload)
+            reserved, limiter_wait = limiter.reserve(estimated)
+            reservations.append((limiter, reserved, estimated))
+            wait = max(wait, limiter_wait)
+        if wait and self.debug:
+            cprint(Colors.WARNING, f"Debug: Rate limit reached; delaying request by {wait:.2f}s")
+        return reservations, wait
+
+    @staticmethod
+    def _settle(reservations, reply):
+        usage = reply.get("usage") if isinstance(reply, dict) else None
+        for limiter, reserved, estimated in reservations:
+            limiter.settle(reserved, estimated, usage)
+
+    def _after_request(self, reservations, started, reply, error):
+        """Feeds a request's outcome back to the rate limiters and concurrency controller."""
+        self._settle(reservations, reply)
+        self.concurrency_controller.release(time.monotonic() - started, error)
+
+    def _post(self, payload, metrics, avoid, monitor=None, on_cue=None):
+        """
+        Sends one chat-completion request from a worker thread, timing it
+        into the batch's `metrics`. The endpoint is chosen by the pool,
+        passing over those in `avoid`, to which it is added if it fails.
+        With a stream `monitor`, the reply is read as it is generated and
+        may be cut short by the monitor.
+        """
+        entered = time.monotonic()
+        endpoint = self.endpoints.choose(avoid)
+        reservations, wait = self._before_request(payload, endpoint)
+        if wait:
+            time.sleep(wait)
+        self.concurrency_controller.acquire()
+        started, reply, error = time.monotonic(), None, None
+        metrics['throttle_seconds'] += started - entered
         try:
-            combined_text = " ".join(text_batch).strip()
-            if not combined_text: return True
+            served = endpoint
+            if monitor:
+                reply = self._send(endpoint, payload, monitor, on_cue)
+                metrics['stream_aborts'] += monitor.aborted is not None
+            elif self.hedge_percentile:
+                reply, served = self._send_hedged(endpoint, payload, metrics, avoid)
+            else:
+                reply = self._send(endpoint, payload)
+            metrics['models'].add(served.payload_for(payload)['model'])
+            return reply
+        except HttpError as e:
+            error = e
+            if is_endpoint_failure(e):
+                avoid.add(endpoint)
+            raise
+        finally:
+            metrics['latencies'].append(time.monotonic() - started)
+            self._after_request(reservations, started, reply, error)
 
-            if self.debug:
-                cprint(Colors.INFO, f"--- Debug: Validating language for Batch #{batch_index} ---")
-                cprint(Colors.INFO, f"Text for detection (first 200 chars): '{combined_text[:200]}...'")
-
-            detected_results = detect_langs(combined_text)
-            if not detected_results:
-                if self.debug: cprint(Colors.WARNING, f"Language detection returned no results for Batch #{batch_index}. Skipping validation.")
-                return True
-
-            top_lang = detected_results[0].lang
-
-            # 1st Defense: Check if the AI returned the original language.
-            if top_lang.startswith(self.input_lang):
-                if self.debug: cprint(Colors.FAIL, f"Language validation FAILED for Batch #{batch_index}! AI returned the original language '{self.input_lang}'.")
-                return False
-
-            # 2nd Defense: Check if the top guess is the target language.
-            if top_lang.startswith(self.output_lang):
-                if self.debug: cprint(Colors.OKGREEN, f"Language validation PASSED for Batch #{batch_index} (Top Guess: '{top_lang}')")
-                return True
-
-            # 3rd Defense (Heuristic): For CJK confusion, check possibilities.
-            # This rule is now more robust, triggering if the target is any 'zh' variant.
-            if self.output_lang.startswith('zh') and top_lang in ['ko', 'ja']:
-                all_detected_langs = {result.lang for result in detected_results}
-                if 'zh-cn' in all_detected_langs or 'zh-tw' in all_detected_langs:
-                    if self.debug:
-                        cprint(Colors.WARNING, f"Heuristic Pass for Batch #{batch_index}: Top guess was '{top_lang}', but a 'zh' variant was also detected. Accepting.")
-                        cprint(Colors.WARNING, f"Full detection list: {detected_results}")
-                    return True
-            
-            # If all defenses are passed, it's a definitive failure.
-            if self.debug:
-                cprint(Colors.FAIL, f"Language validation FAILED for Batch #{batch_index}! (Expected: '{self.output_lang}', Top Guess: '{top_lang}')")
-                cprint(Colors.FAIL, f"Full detection list: {detected_results}")
-            return False
+    def _send(self, endpoint, payload, monitor=None, on_cue=None, hedge=False):
+        """Sends one request to `endpoint` and accounts its outcome to it."""
+        started, reply, error = time.monotonic(), None, None
+        try:
+            if monitor:
+                monitor.start(on_cue)
+                self.http.post_stream(endpoint.url, endpoint.payload_for(payload), monitor.on_event, headers=endpoint.headers)
+                reply = monitor.reply(self._estimate_prompt_tokens(payload))
+            else:
+                reply = self.http.post_json(endpoint.url, endpoint.payload_for(payload), headers=endpoint.headers)
+            return reply
+        except HttpError as e:
+            error = e
+            raise
+        finally:
+            self.endpoints.record(endpoint, time.monotonic() - started, error, reply, hedge)
 
-        except LangDetectException:
-            if self.debug: cprint(Colors.WARNING, f"Could not detect language for Batch #{batch_index}. Skipping validation.")
-            return True
+    def _send_hedge(self, endpoint, payload):
+        """
+        Sends a duplicate request in a concurrency slot already taken for
+        it; it is charged to the rate limiters but never waits for them.
+        """
+        reservations = self._before_request(payload, endpoint)[0]
+        started, reply, error = time.monotonic(), None, None
+        try:
+            reply = self._send(endpoint, payload, hedge=True)
+            return reply
+        except HttpError as e:
+            error = e
+            raise
+        finally:
+            self._after_request(reservations, started, reply, error)
 
-    def translate_batch(self, indexed_batch, network_retry_count=0, validation_retry_count=0, separator_retry_count=0):
-        batch_index, text_batch = indexed_batch
-        if not text_batch: return {'translations': [], 'input_tokens': 0, 'output_tokens': 0}
-        error_result = {'translations': [f"---TRANSLATION_ERROR---\n{text}" for text in text_batch], 'input_tokens': 0, 'output_tokens': 0}
-        clean_text_to_translate = "\n".join(text_batch)
-        structure_template = f" {self.separator} ".join(text_batch)
-        from_lang, to_lang = LANG_MAP.get(self.input_lang, self.input_lang), LANG_MAP.get(self.output_lang, self.output_lang)
-        common_rules = "Your task is to translate a list of subtitles and format the output precisely. Do not add any extra explanations, introductory text, or markdown."
-
-        if validation_retry_count > 0:
-            prompt = f"""You are an expert translator. Your previous translation attempt was WRONG because you used the wrong language.
-You MUST translate the following {from_lang} text into {to_lang}. Do not use any other language.
-{common_rules}
-
-1. First, translate this block of text:
-{clean_text_to_translate}
-
-2. Second, take your translation and format it EXACTLY like this template, using '{self.separator}' as the separator:
-{structure_template}
-"""
-        elif separator_retry_count > 0:
-            prompt = f"""You are an expert translator. Your previous attempt FAILED because you did not format the output correctly.
-You MUST use the exact separator string '{self.separator}' between each and every translated subtitle.
-The number of separators in your output must be exactly one less than the number of subtitles.
-{common_rules}
+    @staticmethod
+    def _in_thread(function, *args):
+        """
+        Runs `function` on a daemon thread and returns a Future for its
+        result; a request that lost a race must not hold up the exit.
+        """
+        future = Future()
 
-1. First, translate this block of text:
-{clean_text_to_translate}
+        def run():
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
 
-2. Second, take your translation and format it EXACTLY like this template, using '{self.separator}' as the separator:
-{structure_template}
-"""
-        else:
-            prompt = f"""You are a highly skilled translator specializing in subtitle files.
-You MUST translate the following {from_lang} text into {to_lang}. Do not use any other language.
-{common_rules}
+        threading.Thread(target=run, name="api-request", daemon=True).start()
+        return future
 
-1. First, translate the following text, where each line is a separate subtitle:
-{clean_text_to_translate}
+    def _send_hedged(self, endpoint, payload, metrics, avoid):
+        """
+        Sends a request and, once it has run longer than the
+        --hedge-percentile of recent latencies, the same request to a second
+        endpoint, if the concurrency limit has a slot free for it. The first
+        good reply wins and is returned with the endpoint that sent it; the
+        other request finishes in the background, accounted to its
+        endpoint, and is left in metrics['hedge_losers'] so the job can
+        count its tokens.
+        """
+        delay = self.endpoints.hedge_delay(self.hedge_percentile)
+        if delay is None:
+            return self._send(endpoint, payload), endpoint
+        primary = self._in_thread(self._send, endpoint, payload)
+        try:
+            return primary.result(timeout=delay), endpoint
+        except FutureTimeoutError:
+            pass
+        if not self.concurrency_controller.try_acquire():
+            return primary.result(), endpoint
+        second = self.endpoints.choose(avoid | {endpoint})
+        metrics['hedged_requests'] += 1
+        hedge = self._in_thread(self._send_hedge, second, payload)
+        pending = [primary, hedge]
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    if future is hedge:
+                        self.endpoints.record_hedge_won(second)
+                    metrics['hedge_losers'].append(primary if future is hedge else hedge)
+                    return future.result(), (second if future is hedge else endpoint)
+        return primary.result()
 
-2. Second, you MUST format your entire response as a single block of text. Use the following template for structure, placing the exact separator string '{self.separator}' between each corresponding translated subtitle:
-{structure_template}
-"""
+    async def _post_async(self, payload, metrics, avoid, monitor=None, on_cue=None):
+        """Sends one chat-completion request from the event loop."""
+        entered = time.monotonic()
+        endpoint = self.endpoints.choose(avoid)
+        reservations, wait = self._before_request(payload, endpoint)
+        if wait:
+            await asyncio.sleep(wait)
+        await self.concurrency_controller.acquire_async()
+        started, reply, error = time.monotonic(), None, None
+        metrics['throttle_seconds'] += started - entered
+        try:
+            served = endpoint
+            if monitor:
+                reply = await self._send_async(endpoint, payload, monitor, on_cue)
+                metrics['stream_aborts'] += monitor.aborted is not None
+            elif self.hedge_percentile:
+                reply, served = await self._send_hedged_async(endpoint, payload, metrics, avoid)
+            else:
+                reply = await self._send_async(endpoint, payload)
+            metrics['models'].add(served.payload_for(payload)['model'])
+            return reply
+        except HttpError as e:
+            error = e
+            if is_endpoint_failure(e):
+                avoid.add(endpoint)
+            raise
+        finally:
+            metrics['latencies'].append(time.monotonic() - started)
+            self._after_request(reservations, started, reply, error)
 
-        data = {"messages": [{"role": "user", "content": prompt}], "model": self.model}
-        if self.debug: cprint(Colors.WARNING, f"\n--- Debug: Sending Batch #{batch_index} (Network: {network_retry_count + 1}, Lang-Validation: {validation_retry_count + 1}, Format-Validation: {separator_retry_count + 1}) ---")
+    async def _send_async(self, endpoint, payload, monitor=None, on_cue=None, hedge=False):
+        """Coroutine version of _send."""
+        started, reply, error = time.monotonic(), None, None
+        try:
+            if monitor:
+                monitor.start(on_cue)
+                await self.async_http.post_stream(endpoint.url, endpoint.payload_for(payload), monitor.on_event, headers=endpoint.headers)
+                reply = monitor.reply(self._estimate_prompt_tokens(payload))
+            else:
+                reply = await self.async_http.post_json(endpoint.url, endpoint.payload_for(payload), headers=endpoint.headers)
+            return reply
+        except HttpError as e:
+            error = e
+            raise
+        finally:
+            self.endpoints.record(endpoint, time.monotonic() - started, error, reply, hedge)
+
+    async def _send_hedge_async(self, endpoint, payload):
+        """Coroutine version of _send_hedge."""
+        reservations = self._before_request(payload, endpoint)[0]
+        started, reply, error = time.monotonic(), None, None
+        try:
+            reply = await self._send_async(endpoint, payload, hedge=True)
+            return reply
+        except HttpError as e:
+            error = e
+            raise
+        finally:
+            self._after_request(reservations, started, reply, error)
 
+    async def _send_hedged_async(self, endpoint, payload, metrics, avoid):
+        """Coroutine version of _send_hedged; the losing request is left to finish as a task in metrics['hedge_losers']."""
+        delay = self.endpoints.hedge_delay(self.hedge_percentile)
+        if delay is None:
+            return await self._send_async(endpoint, payload), endpoint
+        primary = asyncio.ensure_future(self._send_async(endpoint, payload))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.concurrency_controller.try_acquire():
+            return await primary, endpoint
+        second = self.endpoints.choose(avoid | {endpoint})
+        metrics['hedged_requests'] += 1
+        hedge = asyncio.ensure_future(self._send_hedge_async(second, payload))
+        pending = {primary, hedge}
         try:
-            response = subprocess.run(
-                ['curl', '-s', '-X', 'POST', self.api_url, '-H', f"Authorization: Bearer {self.api_key}", '-H', 'Content-Type: application/json', '-d', json.dumps(data)],
-                capture_output=True, text=True, check=True, encoding='utf-8'
-            )
-            response_json = json.loads(response.stdout)
-            usage = response_json.get("usage", {})
-            input_tokens, output_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
-            translated_content = re.sub(r'^```(json|text)?\s*|\s*```$', '', response_json["choices"][0]["message"]["content"].strip())
-            translated_batch = [text.strip() for text in translated_content.split(self.separator)]
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.endpoints.record_hedge_won(second)
+                        metrics['hedge_losers'].append(primary if task is hedge else hedge)
+                        return task.result(), (second if task is hedge else endpoint)
+            return primary.result()
+        finally:
+            for task in pending:
+                # Nobody awaits the loser; fetch its outcome so a failure is not reported as unhandled.
+                task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    def _translation_steps(self, indexed_batch, output_lang):
+        """
+        The I/O-free translation and retry logic shared by both engines.
+
+        This generator yields ('post', payload) to request an API call, which
+        the driver answers by sending back the decoded JSON or throwing the
+        HttpError in, ('stream', (payload, monitor)) for the same as a
+        streamed request watched by a StreamMonitor, ('sleep', seconds) for
+        back-off and ('record', (name, amount)) to add to one of the batch's
+        metrics. It returns
+        {'translations', 'requests', 'input_tokens', 'output_tokens',
+        'validated'}, where 'requests' counts answered API calls, 'validated'
+        is False if any check was given up on and 'failed' is set when some
+        subtitle got no usable translation at all.
+        """
+        if self.response_format == 'json':
+            return (yield from self._json_steps(indexed_batch, output_lang))
+        return (yield from self._separator_steps(indexed_batch, output_lang))
+
+    def _request_steps(self, batch_index, data, tally, monitor=None):
+        """
+        Sends one request, retrying network errors, throttling and malformed
+        responses. Returns the reply's message content, or None once the
+        request has failed for good. Token usage and retry counters are kept
+        in `tally`, which is shared by all requests of a batch. With a
+        `monitor` the request is streamed; an aborted stream returns the
+        content received so far and leaves the reason in `monitor.aborted`.
+        """
+        if monitor:
+            data = {**data, "stream": True}
+            if self.stream_usage_supported:
+                data["stream_options"] = {"include_usage": True}
+        while True:
+            try:
+                response_json = yield (('stream', (data, monitor)) if monitor else ('post', data))
+                usage = response_json.get("usage") or {}
+                tally['requests'] += 1
+                tally['input_tokens'] += usage.get("prompt_tokens", 0)
+                tally['output_tokens'] += usage.get("completion_tokens", 0)
+                return re.sub(r'^```(json|text)?\s*|\s*```$', '', response_json["choices"][0]["message"]["content"].strip())
+            except (HttpError, IndexError, KeyError, TypeError, AttributeError) as e:
+                cprint(Colors.FAIL, f"\nError during translation of Batch #{batch_index}: {e}")
+                if isinstance(e, HttpError) and e.body: cprint(Colors.FAIL, f"Response from API: {e.body}")
+                if isinstance(e, HttpError) and e.status == 400 and 'response_format' in data and 'response_format' in (e.body or ''):
+                    cprint(Colors.WARNING, "The API does not support JSON mode; continuing with prompt-only JSON.")
+                    self.json_mode_supported = False
+                    data = {key: value for key, value in data.items() if key != 'response_format'}
+                    continue
+                if isinstance(e, HttpError) and e.status == 400 and 'stream_options' in data and 'stream_options' in (e.body or ''):
+                    cprint(Colors.WARNING, "The API does not report usage for streamed replies; estimating their tokens.")
+                    self.stream_usage_supported = False
+                    data = {key: value for key, value in data.items() if key != 'stream_options'}
+                    continue
+                retryable = not isinstance(e, HttpError) or e.retryable
+                if isinstance(e, HttpError) and e.status == 429 and tally['rate_limit_retries'] < Config.MAX_RATE_LIMIT_RETRIES:
+                    # Throttling is expected under load: back off exponentially rather than give up.
+                    delay = e.retry_after if e.retry_after is not None else 2 ** tally['rate_limit_retries']
+                    delay = min(delay, Config.MAX_RETRY_AFTER)
+                    cprint(Colors.WARNING, f"Rate limited; retrying Batch #{batch_index} in {delay:.1f}s... (Attempt {tally['rate_limit_retries'] + 2}/{Config.MAX_RATE_LIMIT_RETRIES + 1})")
+                    tally['rate_limit_retries'] += 1
+                    yield ('record', ('rate_limit_retries', 1))
+                    yield ('sleep', delay)
+                    continue
+                # Every extra endpoint is one more retry, so an outage of one fails over to the others.
+                if retryable and tally['network_retries'] < Config.MAX_NETWORK_RETRIES + len(self.endpoints) - 1:
+                    delay = 1
+                    if isinstance(e, HttpError) and e.retry_after is not None:
+                        delay = min(e.retry_after, Config.MAX_RETRY_AFTER)
+                    cprint(Colors.WARNING, f"Retrying after network/API error in {delay:.1f}s...")
+                    tally['network_retries'] += 1
+                    yield ('record', ('network_retries', 1))
+                    yield ('sleep', delay)
+                    continue
+                return None
+
+    @staticmethod
+    def _new_tally():
+        return {'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'network_retries': 0, 'rate_limit_retries': 0}
+
+    def _separator_steps(self, indexed_batch, output_lang, validation_retry_count=0):
+        """
+        Translates a batch using the '[|||]' separator protocol. When only
+        some subtitles come back in the wrong language, just those are sent
+        again, as a smaller batch.
+        """
+        batch_index, text_batch = indexed_batch
+        if not text_batch: return {'translations': [], 'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'validated': True}
+        from_lang, to_lang = LANG_MAP.get(self.input_lang, self.input_lang), LANG_MAP.get(output_lang, output_lang)
+        separator_retry_count = 0
+        # Tokens are billed for every attempt, including the ones we retry.
+        tally = self._new_tally()
+
+        while True:
+            retry_reason = 'language' if validation_retry_count else 'format' if separator_retry_count else None
+            prompt = self.build_prompt(text_batch, self.separator, from_lang, to_lang, retry_reason)
+            data = {"messages": [{"role": "user", "content": prompt}], "model": self.model}
+            if self.debug: cprint(Colors.WARNING, f"\n--- Debug: Sending Batch #{batch_index} (Network: {tally['network_retries'] + 1}, Lang-Validation: {validation_retry_count + 1}, Format-Validation: {separator_retry_count + 1}) ---")
+
+            monitor = SeparatorStreamMonitor(text_batch, self.separator) if self.stream else None
+            translated_content = yield from self._request_steps(batch_index, data, tally, monitor)
+            if translated_content is None:
+                return {'translations': [f"---TRANSLATION_ERROR---\n{text}" for text in text_batch], 'requests': tally['requests'], 'input_tokens': tally['input_tokens'], 'output_tokens': tally['output_tokens'], 'validated': False, 'failed': True}
+            if len(text_batch) == 1:
+                # A single subtitle cannot be misaligned; stray separators are just noise.
+                translated_batch = [" ".join(part.strip() for part in translated_content.split(self.separator)).strip()]
+            else:
+                translated_batch = [text.strip() for text in translated_content.split(self.separator)]
 
             if self.debug:
                 cprint(Colors.WARNING, f"\n--- Debug: Received Response for Batch #{batch_index} ---")
                 for i, text in enumerate(translated_batch): print(f"  {batch_index}-{i+1}: {text.strip()}")
             
-            if len(translated_batch) != len(text_batch):
+            validated = True
+            if monitor and monitor.aborted:
+                cprint(Colors.FAIL, f"Stopped the reply for Batch #{batch_index} early: {monitor.aborted}.")
+            if len(translated_batch) != len(text_batch) or (monitor and monitor.aborted):
+                validated = False
+                # A single subtitle cannot be split further; it is retried like any other batch.
+                if self.mismatch_recovery == 'bisect' and len(text_batch) > 1:
+                    cprint(Colors.FAIL, f"Splitting Batch #{batch_index} in half due to separator mismatch (Expected: {len(text_batch)}, Got: {len(translated_batch)})...")
+                    yield ('record', ('separator_retries', 1))
+                    result = yield from self._bisect_steps(batch_index, text_batch, output_lang)
+                    result['requests'] += tally['requests']
+                    result['input_tokens'] += tally['input_tokens']
+                    result['output_tokens'] += tally['output_tokens']
+                    return result
                 if separator_retry_count < Config.MAX_VALIDATION_RETRIES:
                     cprint(Colors.FAIL, f"Retrying Batch #{batch_index} due to separator mismatch (Expected: {len(text_batch)}, Got: {len(translated_batch)})... (Attempt {separator_retry_count + 2}/{Config.MAX_VALIDATION_RETRIES + 1})")
-                    time.sleep(1)
-                    return self.translate_batch(indexed_batch, network_retry_count, validation_retry_count, separator_retry_count + 1)
+                    separator_retry_count += 1
+                    yield ('record', ('separator_retries', 1))
+                    yield ('sleep', 1)
+                    continue
                 else:
                     cprint(Colors.FAIL, f"Max format retries reached for Batch #{batch_index}. Accepting translation as is.")
             
-            if not self._validate_language(translated_batch, batch_index):
+            failing = yield from self._validate_language(translated_batch, batch_index, output_lang)
+            if failing and validated and len(failing) < len(text_batch) and validation_retry_count < Config.MAX_VALIDATION_RETRIES:
+                cprint(Colors.FAIL, f"Retrying {len(failing)} of {len(text_batch)} subtitles of Batch #{batch_index} due to language mismatch... (Attempt {validation_retry_count + 2}/{Config.MAX_VALIDATION_RETRIES + 1})")
+                yield ('record', ('language_retries', 1))
+                retry = yield from self._separator_steps((f"{batch_index}r", [text_batch[i] for i in failing]), output_lang, validation_retry_count + 1)
+                if len(retry['translations']) == len(failing) and not retry.get('failed'):
+                    for i, text in zip(failing, retry['translations']):
+                        translated_batch[i] = text
+                return {
+                    'translations': translated_batch,
+                    'requests': tally['requests'] + retry['requests'],
+                    'input_tokens': tally['input_tokens'] + retry['input_tokens'],
+                    'output_tokens': tally['output_tokens'] + retry['output_tokens'],
+                    'validated': retry['validated'],
+                }
+            if failing:
+                validated = False
                 if validation_retry_count < Config.MAX_VALIDATION_RETRIES:
                     cprint(Colors.FAIL, f"Retrying Batch #{batch_index} due to language mismatch... (Attempt {validation_retry_count + 2}/{Config.MAX_VALIDATION_RETRIES + 1})")
-                    time.sleep(1)
-                    return self.translate_batch(indexed_batch, network_retry_count, validation_retry_count + 1, 0)
+                    validation_retry_count += 1
+                    separator_retry_count = 0
+                    yield ('record', ('language_retries', 1))
+                    yield ('sleep', 1)
+                    continue
+                else:
+                    cprint(Colors.FAIL, f"Max language validation retries reached for Batch #{batch_index}. Accepting translation as is.")
+
+            return {'translations': translated_batch, 'requests': tally['requests'], 'input_tokens': tally['input_tokens'], 'output_tokens': tally['output_tokens'], 'validated': validated}
+
+    def _bisect_steps(self, batch_index, text_batch, output_lang):
+        """
+        Recovers a misaligned batch by translating each half on its own,
+        recursing down to single subtitles, so every half that aligns is
+        kept instead of re-sending (or losing) the whole batch.
+        """
+        mid = len(text_batch) // 2
+        first = yield from self._translation_steps((f"{batch_index}.1", text_batch[:mid]), output_lang)
+        second = yield from self._translation_steps((f"{batch_index}.2", text_batch[mid:]), output_lang)
+        return {
+            'translations': first['translations'] + second['translations'],
+            'requests': first['requests'] + second['requests'],
+            'input_tokens': first['input_tokens'] + second['input_tokens'],
+            'output_tokens': first['output_tokens'] + second['output_tokens'],
+            'validated': first['validated'] and second['validated'],
+            'failed': first.get('failed', False) or second.get('failed', False),
+        }
+
+    def _build_json_request(self, text_batch, ids, retry_reason, output_lang):
+        """Builds a request asking for the subtitles with the given 0-based ids as a JSON object."""
+        from_lang, to_lang = LANG_MAP.get(self.input_lang, self.input_lang), LANG_MAP.get(output_lang, output_lang)
+        prompt = json_prompt({str(i + 1): text_batch[i] for i in ids}, from_lang, to_lang, retry_reason)
+        data = {"messages": [{"role": "user", "content": prompt}], "model": self.model}
+        if self.json_mode_supported:
+            data["response_format"] = {"type": "json_object"}
+        return data
+
+    @staticmethod
+    def _parse_json_translations(content, pending):
+        """
+        Extracts {id_string: text} from a JSON reply to a request for the
+        batch indices in `pending`. Accepts the requested {"translations":
+        {...}} shape, a bare object or a list of strings; a list carries no
+        ids, so it is only used when it has exactly one item per pending
+        subtitle. Returns None if the reply is not usable JSON.
+        """
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError:
+            # Some models wrap the object in prose; fall back to the outermost braces.
+            start, end = content.find('{'), content.rfind('}')
+            if start < 0 or end <= start:
+                return None
+            try:
+                parsed = json.loads(content[start:end + 1])
+            except json.JSONDecodeError:
+                return None
+        if isinstance(parsed, dict) and isinstance(parsed.get('translations'), (dict, list)):
+            parsed = parsed['translations']
+        if isinstance(parsed, list):
+            if len(parsed) != len(pending):
+                return None
+            parsed = {str(i + 1): text for i, text in zip(pending, parsed)}
+        if not isinstance(parsed, dict):
+            return None
+        return {str(key).strip(): value.strip() for key, value in parsed.items() if isinstance(value, str) and value.strip()}
+
+    def _json_steps(self, indexed_batch, output_lang):
+        """
+        Translates a batch whose subtitles are sent and returned keyed by id.
+        Alignment is checked per subtitle, and only missing or rejected ids
+        are requested again.
+        """
+        batch_index, text_batch = indexed_batch
+        if not text_batch: return {'translations': [], 'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'validated': True}
+        tally = self._new_tally()
+        translations = [None] * len(text_batch)
+        pending = list(range(len(text_batch)))
+        format_retry_count = validation_retry_count = 0
+        retry_reason = None
+        validated = True
+
+        while pending:
+            data = self._build_json_request(text_batch, pending, retry_reason, output_lang)
+            if self.debug: cprint(Colors.WARNING, f"\n--- Debug: Sending Batch #{batch_index} as JSON ({len(pending)} of {len(text_batch)} subtitles) ---")
+            monitor = None
+            if self.stream:
+                # Subtitles that pass validation while the reply is still streaming are final at once.
+                accept = lambda text: not self.language_validator.failing_cues([text], output_lang, batch_index)
+                monitor = JsonStreamMonitor(pending, [text_batch[i] for i in pending], accept)
+            content = yield from self._request_steps(batch_index, data, tally, monitor)
+            if content is None:
+                break
+
+            parsed = self._parse_json_translations(content, pending) or {}
+            if monitor:
+                if monitor.aborted:
+                    cprint(Colors.FAIL, f"Stopped the reply for Batch #{batch_index} early: {monitor.aborted}.")
+                    parsed = {}
+                parsed.update(monitor.emitted)
+            received = {i: parsed[str(i + 1)] for i in pending if str(i + 1) in parsed}
+            if self.debug:
+                cprint(Colors.WARNING, f"\n--- Debug: Received Response for Batch #{batch_index} ---")
+                for i, text in received.items(): print(f"  {batch_index}-{i+1}: {text}")
+
+            emitted = {int(key) - 1 for key in monitor.emitted} if monitor else set()
+            unchecked = [i for i in received if i not in emitted]
+            failing = [unchecked[pos] for pos in (yield from self._validate_language([received[i] for i in unchecked], batch_index, output_lang))]
+            if failing:
+                if validation_retry_count < Config.MAX_VALIDATION_RETRIES:
+                    # Only the subtitles in the wrong language are asked for again.
+                    for i in failing:
+                        del received[i]
                 else:
                     cprint(Colors.FAIL, f"Max language validation retries reached for Batch #{batch_index}. Accepting translation as is.")
+                    validated = False
 
-            return {'translations': translated_batch, 'input_tokens': input_tokens, 'output_tokens': output_tokens}
+            for i, text in received.items():
+                translations[i] = text
+            missing = [i for i in pending if i not in received and i not in failing]
+            pending = [i for i in pending if translations[i] is None]
+            if failing and validation_retry_count < Config.MAX_VALIDATION_RETRIES:
+                cprint(Colors.FAIL, f"Retrying {len(failing)} subtitle(s) of Batch #{batch_index} due to language mismatch... (Attempt {validation_retry_count + 2}/{Config.MAX_VALIDATION_RETRIES + 1})")
+                validation_retry_count += 1
+                retry_reason = 'language'
+                yield ('record', ('language_retries', 1))
+            elif missing:
+                if format_retry_count >= Config.MAX_VALIDATION_RETRIES:
+                    cprint(Colors.FAIL, f"Max format retries reached for Batch #{batch_index}; {len(pending)} subtitle(s) left untranslated.")
+                    break
+                cprint(Colors.FAIL, f"Re-requesting {len(pending)} missing subtitle(s) of Batch #{batch_index}... (Attempt {format_retry_count + 2}/{Config.MAX_VALIDATION_RETRIES + 1})")
+                format_retry_count += 1
+                retry_reason = 'format'
+                yield ('record', ('separator_retries', 1))
 
-        except (subprocess.CalledProcessError, json.JSONDecodeError, IndexError, KeyError) as e:
-            cprint(Colors.FAIL, f"\nError during translation of Batch #{batch_index}: {e}")
-            if 'response' in locals(): cprint(Colors.FAIL, f"Response from API: {response.stdout}")
-            if network_retry_count < 1:
-                cprint(Colors.WARNING, "Retrying after network/API error...")
-                time.sleep(1)
-                return self.translate_batch(indexed_batch, network_retry_count + 1, validation_retry_count, separator_retry_count)
-            return error_result
+        for i in pending:
+            translations[i] = f"---TRANSLATION_ERROR---\n{text_batch[i]}"
+        return {
+            'translations': translations,
+            'requests': tally['requests'],
+            'input_tokens': tally['input_tokens'],
+            'output_tokens': tally['output_tokens'],
+            'validated': validated and not pending,
+            'failed': bool(pending),
+        }
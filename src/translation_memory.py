@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+A persistent translation memory backed by SQLite.
+
+Validated translations are stored per (normalized source line, input
+language, output language, model), so recurring lines (recaps, openings,
+re-encoded releases) are never sent to the API twice.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from .utils import cprint, Colors
+
+# SQLite limits the number of bound parameters per statement.
+_LOOKUP_CHUNK = 500
+
+
+def normalize_source(text):
+    """
+    Normalizes a source cue so trivially different copies share one memory
+    entry, and are translated once per file (see job.dedup_key).
+    """
+    text = unicodedata.normalize('NFKC', text)
+    return '\n'.join(' '.join(line.split()) for line in text.strip().splitlines())
+
+
+class TranslationMemory:
+    """
+    On-disk cache of cue translations with LRU and age-based eviction.
+    Tracks hit/miss statistics over its lifetime. Safe to share between
+    threads (a service runs several jobs against one memory).
+    """
+    def __init__(self, path, max_entries, max_age_days):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400 if max_age_days else None
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " translation TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self._db.commit()
+        self._evict()
+
+    @staticmethod
+    def _key(text, input_lang, output_lang, model):
+        material = "\x1f".join((model, input_lang, output_lang, normalize_source(text)))
+        return hashlib.blake2b(material.encode('utf-8'), digest_size=16).hexdigest()
+
+    def lookup(self, texts, input_lang, output_lang, models):
+        """
+        Returns {source_text: translation} for every text found in the memory.
+        `models` lists the models whose entries may be used, most preferred first.
+        """
+        keys = {}
+        for text in texts:
+            for model in models:
+                keys.setdefault(self._key(text, input_lang, output_lang, model), []).append(text)
+
+        found = {}
+        key_list = list(keys)
+        with self._lock:
+            for i in range(0, len(key_list), _LOOKUP_CHUNK):
+                chunk = key_list[i:i + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for key, translation in self._db.execute(f"SELECT key, translation FROM entries WHERE key IN ({placeholders})", chunk):
+                    found[key] = translation
+
+            result = {}
+            used = set()
+            for key, key_texts in keys.items():
+                if key in found:
+                    for text in key_texts:
+                        if text not in result:
+                            result[text] = found[key]
+                            used.add(key)
+
+            if used:
+                now = time.time()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in used])
+                self._db.commit()
+
+            self.hits += len(result)
+            self.misses += len(set(texts)) - len(result)
+        return result
+
+    def store(self, pairs, input_lang, output_lang, model):
+        """Saves (source_text, translation) pairs, replacing older entries."""
+        now = time.time()
+        rows = [(self._key(text, input_lang, output_lang, model), translation, now, now) for text, translation in pairs]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO entries (key, translation, created, last_used) VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+            self.stored += len(rows)
+
+    def evict(self):
+        """Applies the size and age limits now; a long-running service calls this between jobs."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        """Drops entries older than the age limit, then least recently used ones above the size limit."""
+        if self.max_age_seconds:
+            self._db.execute("DELETE FROM entries WHERE last_used < ?", (time.time() - self.max_age_seconds,))
+        if self.max_entries:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._db.close()
+
+    @classmethod
+    def open(cls, path, max_entries, max_age_days):
+        """Opens the memory, or returns None (with a warning) if it cannot be used."""
+        try:
+            return cls(path, max_entries, max_age_days)
+        except (sqlite3.Error, OSError) as e:
+            cprint(Colors.WARNING, f"Warning: Could not open translation memory at '{path}': {e}. Continuing without it.")
+            return None
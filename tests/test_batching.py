@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from src.batching import estimate_tokens, plan_batches
+from src.cli import setup_arg_parser
+from src.srt_handler import Cue
+
+
+def _args(*extra):
+    return setup_arg_parser().parse_args(['-i', 'in.srt', '-k', 'test', '-il', 'ja', *extra])
+
+
+def _cues(count, gaps=None, text='line'):
+    """`count` cues, each 500 ms long and starting 1 s after the last; `gaps` maps a position to a longer pause before it."""
+    cues, start = [], 0
+    for pos in range(count):
+        start += (gaps or {}).get(pos, 0)
+        cues.append(Cue(pos + 1, start, start + 500, text))
+        start += 1000
+    return cues
+
+
+class FixedBatchingTests(unittest.TestCase):
+    def test_splits_every_batch_size(self):
+        positions = [0, 1, 2, 4, 5, 6, 7]
+        self.assertEqual(plan_batches(_cues(8), positions, _args('-b', '3')), [[0, 1, 2], [4, 5, 6], [7]])
+
+
+class AdaptiveBatchingTests(unittest.TestCase):
+    def _plan(self, cues, positions=None, *extra):
+        args = _args('--batching', 'adaptive', '--min-batch-cues', '2', *extra)
+        return plan_batches(cues, list(range(len(cues))) if positions is None else positions, args)
+
+    def test_max_cues_caps_a_batch(self):
+        batches = self._plan(_cues(10), None, '--max-batch-cues', '4', '--scene-gap', '0')
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+
+    def test_token_budget_caps_a_batch(self):
+        cues = _cues(6, text='x' * 40)
+        per_cue = estimate_tokens(cues[0].text)
+        batches = self._plan(cues, None, '--max-batch-tokens', str(per_cue * 3), '--scene-gap', '0')
+        self.assertEqual([len(batch) for batch in batches], [3, 3])
+
+    def test_oversized_cue_gets_a_batch_of_its_own(self):
+        cues = _cues(3)
+        cues[1].text = 'x' * 400
+        batches = self._plan(cues, None, '--min-batch-cues', '1', '--max-batch-tokens', '20', '--scene-gap', '0')
+        self.assertEqual(batches, [[0], [1], [2]])
+
+    def test_full_batch_is_cut_at_a_scene_change(self):
+        batches = self._plan(_cues(10, gaps={6: 5000}), None, '--max-batch-cues', '8', '--scene-gap', '2')
+        self.assertEqual(batches, [[0, 1, 2, 3, 4, 5], [6, 7, 8, 9]])
+
+    def test_skipped_cues_do_not_make_a_scene_change(self):
+        # Cues 3-6 are cached; cue 7 still follows cue 6 by an ordinary pause.
+        batches = self._plan(_cues(12), [0, 1, 2, 7, 8, 9], '--max-batch-cues', '4', '--scene-gap', '2')
+        self.assertEqual(batches, [[0, 1, 2, 7], [8, 9]])
+
+    def test_pause_before_a_skipped_run_still_counts(self):
+        batches = self._plan(_cues(12, gaps={7: 5000}), [0, 1, 2, 7, 8, 9], '--max-batch-cues', '4', '--scene-gap', '2')
+        self.assertEqual(batches, [[0, 1, 2], [7, 8, 9]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+import unittest
+
+from src.concurrency import AimdController, RequestGate
+
+
+async def _contend(gate, holders, hold=0.02):
+    """Runs `holders` tasks that each take a slot of `gate` for `hold` seconds."""
+    async def hold_slot():
+        await gate.acquire_async()
+        await asyncio.sleep(hold)
+        gate.release(hold)
+    await asyncio.wait_for(asyncio.gather(*(hold_slot() for _ in range(holders))), 5)
+
+
+class AcquireAsyncTests(unittest.TestCase):
+    def test_controller_survives_several_event_loops(self):
+        # A service runs each job with its own asyncio.run on the shared controller.
+        controller = AimdController(1, 1)
+        asyncio.run(_contend(controller, 3))
+        asyncio.run(_contend(controller, 3))
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_release_from_another_thread_wakes_the_loop(self):
+        gate = RequestGate(1)
+        gate.acquire()
+        releaser = threading.Timer(0.05, gate.release, args=(0.05,))
+
+        async def wait_for_slot():
+            releaser.start()
+            started = time.monotonic()
+            await asyncio.wait_for(gate.acquire_async(), 5)
+            return time.monotonic() - started
+
+        waited = asyncio.run(wait_for_slot())
+        releaser.join()
+        self.assertLess(waited, 1)
+        self.assertEqual(gate.in_flight, 1)
+
+    def test_gate_is_shared_between_loops_in_threads(self):
+        gate = RequestGate(2)
+        peak = []
+
+        async def job():
+            async def request():
+                await gate.acquire_async()
+                peak.append(gate.in_flight)
+                await asyncio.sleep(0.01)
+                gate.release(0.01)
+            await asyncio.gather(*(request() for _ in range(5)))
+
+        threads = [threading.Thread(target=asyncio.run, args=(job(),)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(peak), 15)
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(gate.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
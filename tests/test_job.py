@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.cli import setup_arg_parser
+from src.job import TranslationJob
+from src.srt_handler import Cue, iter_srt
+
+REPEATED = "Previously on the show"
+
+
+class _Feed:
+    """A transcription feed whose cues are added by the test."""
+    def __init__(self):
+        self.cues = []
+        self.closed = False
+
+    def snapshot(self):
+        return len(self.cues), self.closed
+
+
+def _cues(*texts):
+    return [Cue(i + 1, i * 1000, i * 1000 + 500, text) for i, text in enumerate(texts)]
+
+
+def _ok(texts):
+    return {'translations': [f"T({text})" for text in texts], 'input_tokens': 1, 'output_tokens': 1, 'validated': True}
+
+
+def _failed(texts):
+    return {'translations': [f"---TRANSLATION_ERROR---\n{text}" for text in texts], 'input_tokens': 1, 'output_tokens': 0, 'validated': False, 'failed': True}
+
+
+class DedupTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.source = self.dir / 'in.srt'
+        self.source.write_text('', encoding='utf-8')
+        self.output = self.dir / 'out.srt'
+
+    def _job(self, blocks, *extra, feed=None):
+        args = setup_arg_parser().parse_args(['-i', str(self.source), '-k', 'test', '-il', 'en', '--no-cache', '-b', '2', *extra])
+        job = TranslationJob(self.source, self.output, 'fr', blocks, args, feed=feed)
+        job.prepare()
+        job.open()
+        self.addCleanup(job.finish, False)
+        return job
+
+    def _run(self, job, answer):
+        while True:
+            item = job.next_batch(window=100)
+            if item is None:
+                break
+            i, (_, texts) = item
+            job.on_result(i, answer(i, texts))
+
+    def _written(self):
+        return [cue.text for cue in iter_srt(self.output)]
+
+    def test_repeats_are_translated_once(self):
+        job = self._job(_cues(REPEATED, "Line two", f"  {REPEATED} ", "Line four", REPEATED))
+        sent = []
+        self._run(job, lambda i, texts: sent.extend(texts) or _ok(texts))
+        self.assertTrue(job.completed)
+        self.assertEqual(sent, [REPEATED, "Line two", "Line four"])
+        self.assertEqual(job.deduplicated, 2)
+        self.assertEqual(self._written(), [f"T({REPEATED})", "T(Line two)", f"T({REPEATED})", "T(Line four)", f"T({REPEATED})"])
+
+    def test_short_lines_are_sent_every_time(self):
+        job = self._job(_cues("Yes", "Yes", REPEATED, REPEATED))
+        sent = []
+        self._run(job, lambda i, texts: sent.extend(texts) or _ok(texts))
+        self.assertEqual(sent, ["Yes", "Yes", REPEATED])
+
+    def test_no_dedup_sends_every_repeat(self):
+        job = self._job(_cues(REPEATED, REPEATED), '--no-dedup')
+        sent = []
+        self._run(job, lambda i, texts: sent.extend(texts) or _ok(texts))
+        self.assertEqual(sent, [REPEATED, REPEATED])
+        self.assertEqual(job.deduplicated, 0)
+
+    def test_failed_first_occurrence_is_not_reused(self):
+        job = self._job(_cues(REPEATED, "Line two", REPEATED))
+        self._run(job, lambda i, texts: _failed(texts) if i == 0 else _ok(texts))
+        # Its waiting repeat shares the error; nothing takes the error for a translation.
+        written = self._written()
+        self.assertTrue(written[0].startswith("---TRANSLATION_ERROR---"))
+        self.assertEqual(written[2], written[0])
+        self.assertEqual(job.failed_batches, 1)
+        self.assertNotIn(REPEATED, job._translated_by_key)
+
+    def test_repeat_after_a_failed_first_occurrence_is_translated_itself(self):
+        feed = _Feed()
+        job = self._job(None, feed=feed)
+        # The last, short batch waits for more cues, so only the first is sent.
+        feed.cues.extend(_cues(REPEATED, "Line two", "Line three"))
+        sent = []
+
+        def answer(i, texts):
+            sent.append(texts)
+            return _failed(texts) if i == 0 else _ok(texts)
+
+        self._run(job, answer)
+        self.assertEqual(sent, [[REPEATED, "Line two"]])
+        feed.cues.extend(_cues(REPEATED, "Line two", "Line three", REPEATED, "Line five")[3:])
+        feed.closed = True
+        self._run(job, answer)
+        self.assertTrue(job.completed)
+        self.assertEqual(sent, [[REPEATED, "Line two"], ["Line three", REPEATED], ["Line five"]])
+        self.assertEqual(self._written()[2:], ["T(Line three)", f"T({REPEATED})", "T(Line five)"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.cli import setup_arg_parser
+from src.job import TranslationJob
+from src.journal import JobJournal
+
+SETTINGS = {'input_lang': 'ja', 'output_lang': 'zh-cn', 'model': 'm'}
+
+
+class JobJournalTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.source = self.dir / 'in.srt'
+        self.source.write_text("1\n00:00:01,000 --> 00:00:02,000\nA\n", encoding='utf-8')
+        self.output = self.dir / 'out.srt'
+
+    def _journal(self, settings=SETTINGS):
+        return JobJournal.for_output(self.output, self.source, settings)
+
+    def _write(self, *batches):
+        journal = self._journal()
+        journal.start(keep_existing=False)
+        for positions, translations in batches:
+            journal.record(positions, translations, 10, 20)
+        journal.close()
+        return journal
+
+    def test_recorded_batches_are_loaded(self):
+        self._write(([0, 1], ['早上好', '谢谢']), ([3], ['再见']))
+        self.assertEqual(self._journal().load(), ({0: '早上好', 1: '谢谢', 3: '再见'}, 20, 40))
+
+    def test_resume_appends_to_the_journal(self):
+        self._write(([0], ['a']))
+        journal = self._journal()
+        journal.start(keep_existing=True)
+        journal.record([1], ['b'], 1, 2)
+        journal.close()
+        self.assertEqual(self._journal().load(), ({0: 'a', 1: 'b'}, 11, 22))
+
+    def test_fresh_start_replaces_the_journal(self):
+        self._write(([0], ['a']))
+        self._write()
+        self.assertEqual(self._journal().load(), ({}, 0, 0))
+
+    def test_torn_last_line_is_ignored(self):
+        journal = self._write(([0], ['a']))
+        with open(journal.path, 'a', encoding='utf-8') as f:
+            f.write('{"positions": [1], "transl')
+        self.assertEqual(self._journal().load(), ({0: 'a'}, 10, 20))
+
+    def test_other_settings_or_source_do_not_resume(self):
+        self._write(([0], ['a']))
+        self.assertIsNone(self._journal(dict(SETTINGS, model='other')).load())
+        self.source.write_text("1\n00:00:01,000 --> 00:00:02,000\nB\n", encoding='utf-8')
+        self.assertIsNone(self._journal().load())
+
+    def test_missing_or_discarded_journal_loads_nothing(self):
+        self.assertIsNone(self._journal().load())
+        journal = self._write(([0], ['a']))
+        journal.discard()
+        self.assertFalse(journal.path.exists())
+        self.assertIsNone(self._journal().load())
+
+
+class JournalSettingsTests(unittest.TestCase):
+    def _settings(self, *extra, models=None):
+        args = setup_arg_parser().parse_args(['-i', 'in.srt', '-k', 'test', '-il', 'ja', *extra])
+        return TranslationJob.journal_settings(args, 'zh-cn', models)
+
+    def test_response_format_and_prompt_change_the_settings(self):
+        base = self._settings()
+        self.assertNotEqual(self._settings('--response-format', 'json'), base)
+        self.assertNotEqual(self._settings('--prompt-strategy', 'compact'), base)
+
+    def test_endpoint_models_count_only_when_they_differ(self):
+        args = setup_arg_parser().parse_args(['-i', 'in.srt', '-k', 'test', '-il', 'ja'])
+        self.assertEqual(self._settings(models=[args.model]), self._settings())
+        self.assertIn('models', self._settings(models=[args.model, 'other']))
+
+
+if __name__ == '__main__':
+    unittest.main()
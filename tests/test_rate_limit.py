@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import mock
+
+from src import rate_limit
+from src.rate_limit import RateLimiter
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        clock = mock.patch.object(rate_limit.time, 'monotonic', return_value=100.0)
+        self.now = clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_no_limits_disable_the_limiter(self):
+        self.assertFalse(RateLimiter().enabled)
+        self.assertTrue(RateLimiter(requests_per_minute=1).enabled)
+
+    def test_requests_past_the_bucket_wait_for_the_refill(self):
+        limiter = RateLimiter(requests_per_minute=60)
+        self.assertEqual([limiter.reserve(10)[1] for _ in range(60)], [0.0] * 60)
+        self.assertAlmostEqual(limiter.reserve(10)[1], 1.0)
+        self.assertAlmostEqual(limiter.reserve(10)[1], 2.0)
+        self.now.return_value = 103.0
+        self.assertEqual(limiter.reserve(10)[1], 0.0)
+
+    def test_tokens_past_the_bucket_wait_for_the_refill(self):
+        limiter = RateLimiter(tokens_per_minute=600)
+        self.assertEqual(limiter.reserve(500), (500, 0.0))
+        self.assertAlmostEqual(limiter.reserve(200)[1], 10.0)
+
+    def test_refill_stops_at_the_limit(self):
+        limiter = RateLimiter(requests_per_minute=2)
+        self.now.return_value = 1000.0
+        waits = [limiter.reserve(0)[1] for _ in range(3)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 30.0)
+
+    def test_settling_charges_the_reported_usage(self):
+        limiter = RateLimiter(tokens_per_minute=1000)
+        reserved, _ = limiter.reserve(500)
+        limiter.settle(reserved, 500, {'prompt_tokens': 400, 'completion_tokens': 500})
+        # 900 used of 1000; the next 200 tokens overdraw the bucket by 100.
+        self.assertAlmostEqual(limiter.reserve(200 / limiter.calibration)[1], 6.0)
+
+    def test_settling_without_usage_refunds_the_reservation(self):
+        limiter = RateLimiter(tokens_per_minute=600)
+        reserved, _ = limiter.reserve(600)
+        limiter.settle(reserved, 600, None)
+        self.assertEqual(limiter.reserve(600)[1], 0.0)
+
+    def test_reported_usage_calibrates_later_estimates(self):
+        limiter = RateLimiter(tokens_per_minute=10000)
+        for _ in range(30):
+            reserved, _ = limiter.reserve(100)
+            limiter.settle(reserved, 100, {'prompt_tokens': 200, 'completion_tokens': 0})
+        self.assertAlmostEqual(limiter.calibration, 2.0, places=2)
+        self.assertAlmostEqual(limiter.reserve(100)[0], 200, delta=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
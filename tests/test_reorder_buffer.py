@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from src.reorder_buffer import ReorderBuffer
+
+
+class ReorderBufferTests(unittest.TestCase):
+    def test_releases_the_contiguous_prefix_in_order(self):
+        buffer = ReorderBuffer()
+        self.assertEqual(buffer.push(1, 'b'), [])
+        self.assertEqual(buffer.push(3, 'd'), [])
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.push(0, 'a'), [(0, 'a'), (1, 'b')])
+        self.assertEqual(buffer.push(2, 'c'), [(2, 'c'), (3, 'd')])
+        self.assertEqual((buffer.next_index, len(buffer)), (4, 0))
+
+    def test_any_completion_order_comes_out_in_sequence(self):
+        order = list(range(50))
+        random.Random(7).shuffle(order)
+        buffer = ReorderBuffer()
+        released = [index for i in order for index, _ in buffer.push(i, str(i))]
+        self.assertEqual(released, list(range(50)))
+
+    def test_starts_at_a_given_index(self):
+        buffer = ReorderBuffer(start=5)
+        self.assertEqual(buffer.push(5, 'f'), [(5, 'f')])
+
+    def test_duplicates_are_rejected(self):
+        buffer = ReorderBuffer()
+        buffer.push(0, 'a')
+        buffer.push(2, 'c')
+        with self.assertRaises(ValueError):
+            buffer.push(0, 'again')
+        with self.assertRaises(ValueError):
+            buffer.push(2, 'again')
+
+
+if __name__ == '__main__':
+    unittest.main()
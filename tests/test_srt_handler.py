@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src import srt_handler
+from src.srt_handler import Cue, OrderedSrtWriter, format_srt_block, iter_srt, parse_srt
+
+SAMPLE = (
+    "1\n00:00:01,000 --> 00:00:02,500\nHello\n\n"
+    "2\n00:00:03,000 --> 00:00:04,000\nTwo\nlines\n\n"
+    "3\n00:01:05,250 --> 01:00:00,000 X1:10\nLast\n"
+)
+
+
+class ParseTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _parse(self, content, encoding='utf-8'):
+        path = self.dir / 'in.srt'
+        path.write_bytes(content.encode(encoding))
+        return [(cue.index, cue.start_ms, cue.end_ms, cue.text, cue.settings) for cue in iter_srt(path)]
+
+    def test_plain_file(self):
+        self.assertEqual(self._parse(SAMPLE), [
+            (1, 1000, 2500, 'Hello', ''),
+            (2, 3000, 4000, 'Two\nlines', ''),
+            (3, 65250, 3600000, 'Last', ' X1:10'),
+        ])
+
+    def test_crlf_and_bom_parse_like_lf(self):
+        self.assertEqual(self._parse(SAMPLE.replace('\n', '\r\n'), 'utf-8-sig'), self._parse(SAMPLE))
+
+    def test_blank_line_inside_a_cue_is_kept_in_its_text(self):
+        cues = self._parse("1\n00:00:01,000 --> 00:00:02,000\nA\n\nB\n\n2\n00:00:03,000 --> 00:00:04,000\nC\n")
+        self.assertEqual([text for _, _, _, text, _ in cues], ['A\n\nB', 'C'])
+
+    def test_missing_index_and_loose_timestamps(self):
+        cues = self._parse("00:00:01.5 --> 00:00:02,000  \nA\n\n0:03,000 --> 0:04,000\nB\n")
+        self.assertEqual([cue[:3] for cue in cues], [(1, 1500, 2000), (2, 3000, 4000)])
+
+    def test_cues_are_the_same_across_chunk_boundaries(self):
+        content = SAMPLE.replace('\n', '\r\n') * 3
+        expected = self._parse(content)
+        for size in (1, 2, 7, 31):
+            with mock.patch.object(srt_handler, 'READ_CHUNK_SIZE', size):
+                self.assertEqual(self._parse(content), expected, size)
+
+    def test_parse_srt_drops_empty_cues_and_reports_missing_files(self):
+        path = self.dir / 'in.srt'
+        path.write_text("1\n00:00:01,000 --> 00:00:02,000\n\n2\n00:00:03,000 --> 00:00:04,000\nB\n", encoding='utf-8')
+        self.assertEqual([cue.text for cue in parse_srt(path)], ['B'])
+        with mock.patch.object(srt_handler, 'cprint'):
+            self.assertEqual(parse_srt(self.dir / 'missing.srt'), [])
+
+
+class WriteTests(unittest.TestCase):
+    def test_block_drops_blank_lines_inside_the_text(self):
+        cue = Cue(7, 1000, 2000, 'source')
+        self.assertEqual(format_srt_block(cue, 'A\n\n \nB\r\nC\n'), "7\n00:00:01,000 --> 00:00:02,000\nA\nB\nC\n\n")
+
+    def test_writer_writes_in_source_order(self):
+        blocks = [Cue(i + 1, i * 1000, i * 1000 + 500, f's{i}') for i in range(3)]
+        out = io.StringIO()
+        writer = OrderedSrtWriter(out, blocks)
+        writer.set(1, 'b')
+        self.assertEqual(writer.flush_ready(), 0)
+        writer.set(0, 'a')
+        self.assertEqual(writer.flush_ready(), 2)
+        writer.set(0, 'late')
+        writer.set(2, 'c')
+        self.assertEqual(writer.flush_ready(), 1)
+        self.assertTrue(writer.done)
+        self.assertEqual([cue.text for cue in _reparse(out.getvalue())], ['a', 'b', 'c'])
+
+    def test_writer_follows_growing_blocks(self):
+        blocks = [Cue(1, 0, 500, 's0')]
+        writer = OrderedSrtWriter(io.StringIO(), blocks)
+        blocks.append(Cue(2, 1000, 1500, 's1'))
+        writer.set(1, 'b')
+        writer.set(0, 'a')
+        self.assertEqual(writer.flush_ready(), 2)
+        self.assertTrue(writer.done)
+
+
+def _reparse(content):
+    directory = Path(tempfile.mkdtemp())
+    try:
+        path = directory / 'out.srt'
+        path.write_text(content, encoding='utf-8')
+        return list(iter_srt(path))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
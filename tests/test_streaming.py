@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from src.http_client import HttpError, _EventStreamParser
+from src.streaming import JsonStreamMonitor, SeparatorStreamMonitor, StreamMonitor
+
+
+def _delta(text):
+    return {'choices': [{'delta': {'content': text}}]}
+
+
+class EventStreamParserTests(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.parser = _EventStreamParser(self.events.append)
+
+    def _feed(self, body):
+        return [self.parser.feed_line(line) for line in body.splitlines(keepends=True)]
+
+    def test_events_end_at_blank_lines(self):
+        self._feed(b'data: {"n": 1}\r\n\r\n: keep-alive\n\nevent: x\ndata:{"n": 2}\n\n')
+        self.assertEqual(self.events, [{'n': 1}, {'n': 2}])
+
+    def test_data_lines_of_one_event_are_joined(self):
+        self._feed(b'data: {"n":\ndata: 3}\n\n')
+        self.assertEqual(self.events, [{'n': 3}])
+
+    def test_done_sentinel_is_skipped(self):
+        self._feed(b'data: {"n": 1}\n\ndata: [DONE]\n\n')
+        self.assertEqual(self.events, [{'n': 1}])
+
+    def test_flush_dispatches_an_unterminated_event(self):
+        self._feed(b'data: {"n": 4}\n')
+        self.assertEqual(self.events, [])
+        self.assertTrue(self.parser.flush())
+        self.assertEqual(self.events, [{'n': 4}])
+
+    def test_invalid_json_is_a_retryable_error(self):
+        with self.assertRaises(HttpError) as raised:
+            self._feed(b'data: {"n": \n\n')
+        self.assertTrue(raised.exception.retryable)
+
+    def test_handler_can_stop_the_stream(self):
+        parser = _EventStreamParser(lambda event: False)
+        self.assertEqual([parser.feed_line(line) for line in (b'data: {}\n', b'\n')], [True, False])
+
+
+class StreamMonitorTests(unittest.TestCase):
+    def test_reply_collects_deltas_and_usage(self):
+        monitor = StreamMonitor(['hello'])
+        monitor.on_event(_delta('bon'))
+        monitor.on_event(_delta('jour'))
+        monitor.on_event({'choices': [], 'usage': {'prompt_tokens': 5, 'completion_tokens': 2}})
+        self.assertEqual(monitor.reply(99), {'choices': [{'message': {'content': 'bonjour'}}], 'usage': {'prompt_tokens': 5, 'completion_tokens': 2}})
+        self.assertEqual(monitor.chunks, 2)
+
+    def test_reply_without_usage_is_estimated(self):
+        monitor = StreamMonitor(['hello'])
+        monitor.on_event(_delta('bonjour'))
+        self.assertEqual(monitor.reply(7)['usage']['prompt_tokens'], 7)
+
+    def test_runaway_reply_is_aborted(self):
+        monitor = StreamMonitor(['hi'])
+        self.assertTrue(monitor.on_event(_delta('x' * monitor.max_chars)))
+        self.assertFalse(monitor.on_event(_delta('x')))
+        self.assertEqual(monitor.aborted, 'runaway')
+
+    def test_error_event_raises(self):
+        with self.assertRaises(HttpError):
+            StreamMonitor(['hi']).on_event({'error': {'message': 'overloaded'}})
+
+    def test_start_resets_the_attempt(self):
+        monitor = StreamMonitor(['hi'])
+        monitor.on_event(_delta('x' * (monitor.max_chars + 1)))
+        monitor.start()
+        self.assertEqual((monitor.content, monitor.aborted), ('', None))
+
+
+class SeparatorStreamMonitorTests(unittest.TestCase):
+    def test_too_many_subtitles_abort(self):
+        monitor = SeparatorStreamMonitor(['a', 'b'], '[|||]')
+        self.assertTrue(monitor.on_event(_delta('A[|||]B')))
+        self.assertFalse(monitor.on_event(_delta('[|||]C')))
+        self.assertEqual(monitor.aborted, 'too many subtitles')
+
+    def test_single_subtitle_is_never_misaligned(self):
+        monitor = SeparatorStreamMonitor(['a'], '[|||]')
+        self.assertTrue(monitor.on_event(_delta('A[|||]A[|||]')))
+
+
+class JsonStreamMonitorTests(unittest.TestCase):
+    def test_subtitles_are_handed_on_as_they_complete(self):
+        cues = []
+        monitor = JsonStreamMonitor([0, 1], ['a', 'b'], accept=lambda text: True)
+        monitor.start(lambda index, text: cues.append((index, text)))
+        for piece in ('{"1": "Bon', 'jour \\"x\\"", ', '"2": "Salut"}'):
+            self.assertTrue(monitor.on_event(_delta(piece)))
+        self.assertEqual(cues, [(0, 'Bonjour "x"'), (1, 'Salut')])
+        self.assertEqual(monitor.emitted, {'1': 'Bonjour "x"', '2': 'Salut'})
+
+    def test_rejected_subtitles_are_not_handed_on(self):
+        monitor = JsonStreamMonitor([0, 1], ['a', 'b'], accept=lambda text: text != 'bad')
+        monitor.on_event(_delta('{"1": "bad", "2": "good"}'))
+        self.assertEqual(monitor.emitted, {'2': 'good'})
+
+    def test_unexpected_id_aborts(self):
+        monitor = JsonStreamMonitor([1], ['a', 'b'], accept=lambda text: True)
+        self.assertFalse(monitor.on_event(_delta('{"1": "A"')))
+        self.assertEqual(monitor.aborted, 'unexpected id 1')
+
+    def test_emitted_subtitles_survive_a_retry(self):
+        cues = []
+        monitor = JsonStreamMonitor([0, 1], ['a', 'b'], accept=lambda text: True)
+        monitor.start(lambda index, text: cues.append(index))
+        monitor.on_event(_delta('{"1": "A"'))
+        monitor.start(lambda index, text: cues.append(index))
+        monitor.on_event(_delta('{"1": "A", "2": "B"}'))
+        self.assertEqual(cues, [0, 1])
+        self.assertEqual(monitor.emitted, {'1': 'A', '2': 'B'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+from src.cli import setup_arg_parser
+from src.config import Config
+from src.translation import Translator
+
+SOURCE = ["おはよう", "ありがとう", "さようなら", "すみません"]
+
+
+def _translator(*extra):
+    args = setup_arg_parser().parse_args(['-i', 'in.srt', '-k', 'test', '-il', 'ja', *extra])
+    return Translator(args)
+
+
+def _reply(content):
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    return {'choices': [{'message': {'content': content}}]}
+
+
+def _run_steps(translator, replies, texts=SOURCE):
+    """
+    Drives the step generator of one batch, answering its requests with
+    `replies` in order; a streamed request gets its reply as one delta.
+    Returns (result, payloads of the requests sent).
+    """
+    steps = translator._translation_steps((1, texts), 'zh-cn')
+    replies, requests = list(replies), []
+    reply = None
+    while True:
+        try:
+            action, arg = steps.send(reply)
+        except StopIteration as stop:
+            return stop.value, requests
+        reply = None
+        if action == 'post':
+            requests.append(arg)
+            reply = replies.pop(0)
+        elif action == 'stream':
+            payload, monitor = arg
+            requests.append(payload)
+            monitor.start()
+            monitor.on_event({'choices': [{'delta': {'content': replies.pop(0)}}]})
+            reply = monitor.reply(0)
+
+
+class JsonListReplyTests(unittest.TestCase):
+    def setUp(self):
+        self.translator = _translator('--response-format', 'json')
+        self.addCleanup(self.translator.close)
+
+    def test_list_reply_to_a_retry_maps_to_the_pending_ids(self):
+        result, requests = _run_steps(self.translator, [
+            _reply({'translations': {'1': '早上好', '3': '再见'}}),
+            _reply(['谢谢', '对不起']),
+        ])
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(result['translations'], ['早上好', '谢谢', '再见', '对不起'])
+        self.assertFalse(result['failed'])
+
+    def test_list_reply_of_the_wrong_length_is_rejected(self):
+        result, requests = _run_steps(self.translator, [
+            _reply(['早上好', '谢谢', '再见']),
+            _reply({'translations': {'1': '早上好', '2': '谢谢', '3': '再见', '4': '对不起'}}),
+        ])
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(result['translations'], ['早上好', '谢谢', '再见', '对不起'])
+
+    def test_parser_only_numbers_a_list_by_pending_ids(self):
+        self.assertEqual(Translator._parse_json_translations('["T2", "T5"]', [1, 4]), {'2': 'T2', '5': 'T5'})
+        self.assertIsNone(Translator._parse_json_translations('["T2"]', [1, 4]))
+
+
+class StreamedSingleCueTests(unittest.TestCase):
+    def setUp(self):
+        self.translator = _translator('--stream', '--mismatch-recovery', 'bisect')
+        self.addCleanup(self.translator.close)
+
+    def test_stray_separator_does_not_abort_a_single_cue(self):
+        result, requests = _run_steps(self.translator, ['早上[|||]好'], texts=["おはよう"])
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(result['translations'], ['早上 好'])
+        self.assertTrue(result['validated'])
+
+    def test_aborted_single_cue_is_retried_not_bisected(self):
+        runaway = '好' * 1000
+        result, requests = _run_steps(self.translator, [runaway] * (Config.MAX_VALIDATION_RETRIES + 1), texts=["おはよう"])
+        self.assertEqual(len(requests), Config.MAX_VALIDATION_RETRIES + 1)
+        self.assertEqual(len(result['translations']), 1)
+        self.assertFalse(result['validated'])
+
+
+class BisectRecoveryTests(unittest.TestCase):
+    def setUp(self):
+        self.translator = _translator('--mismatch-recovery', 'bisect')
+        self.addCleanup(self.translator.close)
+
+    def test_misaligned_batch_is_split_in_half(self):
+        result, requests = _run_steps(self.translator, [
+            _reply('早上好[|||]谢谢再见[|||]对不起'),
+            _reply('早上好[|||]谢谢'),
+            _reply('再见[|||]对不起'),
+        ])
+        self.assertEqual(result['translations'], ['早上好', '谢谢', '再见', '对不起'])
+        self.assertEqual(result['requests'], 3)
+        self.assertTrue(result['validated'])
+        first_half = requests[1]['messages'][0]['content']
+        self.assertIn(SOURCE[1], first_half)
+        self.assertNotIn(SOURCE[2], first_half)
+
+    def test_halves_recurse_down_to_single_subtitles(self):
+        result, requests = _run_steps(self.translator, [
+            _reply('早上好谢谢再见对不起'),
+            _reply('早上好谢谢'),
+            _reply('早上好'),
+            _reply('谢谢'),
+            _reply('再见[|||]对不起'),
+        ])
+        self.assertEqual(result['translations'], ['早上好', '谢谢', '再见', '对不起'])
+        self.assertEqual(len(requests), 5)
+
+    def test_failed_half_keeps_the_other(self):
+        broken = {'choices': []}
+        result, _ = _run_steps(self.translator, [
+            _reply('早上好谢谢再见对不起'),
+            _reply('早上好[|||]谢谢'),
+        ] + [broken] * (Config.MAX_NETWORK_RETRIES + 1))
+        self.assertEqual(result['translations'][:2], ['早上好', '谢谢'])
+        self.assertTrue(result['translations'][2].startswith('---TRANSLATION_ERROR---'))
+        self.assertTrue(result['failed'])
+        self.assertFalse(result['validated'])
+
+
+if __name__ == '__main__':
+    unittest.main()
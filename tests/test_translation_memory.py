@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src import translation_memory
+from src.translation_memory import TranslationMemory, normalize_source
+
+
+class TranslationMemoryTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.clock = mock.patch.object(translation_memory.time, 'time', return_value=1000.0)
+        self.now = self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def _memory(self, max_entries=0, max_age_days=0):
+        memory = TranslationMemory(self.dir / 'memory.sqlite3', max_entries, max_age_days)
+        self.addCleanup(memory.close)
+        return memory
+
+    def _count(self, memory):
+        return memory._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def test_stored_pairs_are_found_under_their_languages_and_model(self):
+        memory = self._memory()
+        memory.store([('おはよう', '早上好'), ('ありがとう', '谢谢')], 'ja', 'zh-cn', 'm')
+        self.assertEqual(memory.lookup({'おはよう', 'さようなら'}, 'ja', 'zh-cn', ['m']), {'おはよう': '早上好'})
+        self.assertEqual(memory.lookup({'おはよう'}, 'ja', 'en', ['m']), {})
+        self.assertEqual(memory.lookup({'おはよう'}, 'ja', 'zh-cn', ['other']), {})
+        self.assertEqual((memory.hits, memory.misses, memory.stored), (1, 3, 2))
+
+    def test_lookup_prefers_the_first_model(self):
+        memory = self._memory()
+        memory.store([('a', 'A from m2'), ('b', 'B from m2')], 'ja', 'en', 'm2')
+        memory.store([('a', 'A from m1')], 'ja', 'en', 'm1')
+        found = memory.lookup({'a', 'b', 'c'}, 'ja', 'en', ['m1', 'm2'])
+        self.assertEqual(found, {'a': 'A from m1', 'b': 'B from m2'})
+        # Each text counts once, however many models were tried.
+        self.assertEqual((memory.hits, memory.misses), (2, 1))
+
+    def test_trivially_different_sources_share_an_entry(self):
+        memory = self._memory()
+        memory.store([(' Hello   world \n', 'Bonjour')], 'en', 'fr', 'm')
+        self.assertEqual(memory.lookup({'Ｈｅｌｌｏ world'}, 'en', 'fr', ['m']), {'Ｈｅｌｌｏ world': 'Bonjour'})
+        self.assertEqual(normalize_source(' a \t b \n c '), 'a b\nc')
+
+    def test_lookups_beyond_one_statement(self):
+        memory = self._memory()
+        pairs = [(f'line {i}', f'ligne {i}') for i in range(translation_memory._LOOKUP_CHUNK * 2 + 1)]
+        memory.store(pairs, 'en', 'fr', 'm')
+        self.assertEqual(memory.lookup({text for text, _ in pairs}, 'en', 'fr', ['m']), dict(pairs))
+
+    def test_entries_survive_reopening(self):
+        memory = TranslationMemory(self.dir / 'memory.sqlite3', 0, 0)
+        memory.store([('a', 'A')], 'ja', 'en', 'm')
+        memory.close()
+        self.assertEqual(self._memory().lookup({'a'}, 'ja', 'en', ['m']), {'a': 'A'})
+
+    def test_least_recently_used_entries_are_evicted_over_the_limit(self):
+        memory = self._memory(max_entries=2)
+        memory.store([('a', 'A'), ('b', 'B')], 'ja', 'en', 'm')
+        self.now.return_value = 1001.0
+        memory.lookup({'a'}, 'ja', 'en', ['m'])
+        self.now.return_value = 1002.0
+        memory.store([('c', 'C')], 'ja', 'en', 'm')
+        memory.evict()
+        self.assertEqual(memory.lookup({'a', 'b', 'c'}, 'ja', 'en', ['m']), {'a': 'A', 'c': 'C'})
+
+    def test_entries_unused_for_too_long_are_evicted(self):
+        memory = self._memory(max_age_days=1)
+        memory.store([('old', 'OLD')], 'ja', 'en', 'm')
+        self.now.return_value = 1000.0 + 86400 + 1
+        memory.store([('new', 'NEW')], 'ja', 'en', 'm')
+        memory.evict()
+        self.assertEqual(self._count(memory), 1)
+        self.assertEqual(memory.lookup({'old', 'new'}, 'ja', 'en', ['m']), {'new': 'NEW'})
+
+    def test_unusable_path_opens_nothing(self):
+        blocker = self.dir / 'file'
+        blocker.write_text('')
+        with mock.patch.object(translation_memory, 'cprint'):
+            self.assertIsNone(TranslationMemory.open(blocker / 'memory.sqlite3', 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()